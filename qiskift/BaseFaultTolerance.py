@@ -5,97 +5,329 @@ For specific quantum codes, see the Codes page. Note that only the Steane code i
 """
 
 from qiskit.transpiler.basepasses import TransformationPass
-from qiskit.transpiler.passes.basis.unroller import Unroller
-from qiskit.dagcircuit import DAGCircuit
-from qiskit.circuit import QuantumCircuit,QuantumRegister,ClassicalRegister,AncillaRegister,Qubit,Reset
-from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.transpiler.exceptions import TranspilerError
+from qiskit.dagcircuit import DAGCircuit, DAGCircuitError
+from qiskit.circuit import QuantumCircuit,QuantumRegister,ClassicalRegister,AncillaRegister,Qubit,Reset,Measure,Barrier,Clbit,CircuitInstruction
+from qiskit.circuit.library import XGate
+from qiskit.circuit.quantumcircuit import BitLocations
 from abc import ABC, abstractmethod
+import collections
+import copy
+import functools
+import inspect
+import itertools
+import weakref
+
+from Instrumentation import _event, _operation, _timed
+
+class _RegisterIndex:
+    """
+    The register names used by a single circuit or DAG, together with the next suffix to try for each name prefix.
+    Every register allocator shares this index, so finding a fresh name does not require scanning the registers.
+    Registers added to the circuit or DAG by other means are picked up the next time the index is used.
+    Every fresh name ends with ``suffix``, so that fragments of a circuit built separately can be given disjoint register names.
+    """
+    def __init__(self, owner):
+        self.suffix = ""
+        self._names = set()
+        self._counters = {}
+        self._numQregs = 0
+        self._numCregs = 0
+
+    def sync(self, qregs, cregs):
+        if len(qregs) < self._numQregs or len(cregs) < self._numCregs:
+            self._names = set()
+            self._numQregs = 0
+            self._numCregs = 0
+
+        if len(qregs) > self._numQregs:
+            self._names.update(register.name for register in itertools.islice(qregs, self._numQregs, None))
+            self._numQregs = len(qregs)
+
+        if len(cregs) > self._numCregs:
+            self._names.update(register.name for register in itertools.islice(cregs, self._numCregs, None))
+            self._numCregs = len(cregs)
+
+    def freshName(self, prefix):
+        n = self._counters.get(prefix, 0)
+        while prefix+str(n)+self.suffix in self._names:
+            n += 1
+        self._counters[prefix] = n+1
+        self._names.add(prefix+str(n)+self.suffix)
+        return prefix+str(n)+self.suffix
+
+    def added(self, quantum):
+        if quantum:
+            self._numQregs += 1
+        else:
+            self._numCregs += 1
+
+
+def _attached(registry, owner, factory):
+    """
+    Returns the object attached to ``owner`` in ``registry``, creating it with ``factory(owner)`` on first use.
+    Attachments are kept outside of ``owner`` so that they are not shared by copies of it, and are dropped when ``owner`` is garbage collected.
+    """
+    entry = registry.get(id(owner))
+    if entry == None or entry[0]() is not owner:
+        entry = (weakref.ref(owner), factory(owner))
+        registry[id(owner)] = entry
+        weakref.finalize(owner, registry.pop, id(owner), None)
+    return entry[1]
+
+_registerIndices = {}
+
+def _registerIndex(owner, qregs, cregs):
+    index = _attached(_registerIndices, owner, _RegisterIndex)
+    index.sync(qregs, cregs)
+    return index
+
+def _registerIndexCircuit(circuit):
+    return _registerIndex(circuit, circuit.qregs, circuit.cregs)
+
+def _registerIndexDag(dag):
+    return _registerIndex(dag, dag.qregs.values(), dag.cregs.values())
 
 def _checkNameCircuit(circuit,name):
-    for register in circuit.qregs:
-        if register.name == name:
-            return False
-    for register in circuit.cregs:
-        if register.name == name:
-            return False
-    return True
+    return name not in _registerIndexCircuit(circuit)._names
 
 def _checkNameDag(dag,name):
-    for register in dag.qregs:
-        if dag.qregs[register].name == name:
-            return False
-    for register in dag.cregs:
-        if dag.cregs[register].name == name:
-            return False
-    return True
+    return name not in _registerIndexDag(dag)._names
 
-def _makeQregsCircuit(circuit, numRegs, numBits, name = "q"):
-    qregs = []
-    n=0
+@_event("registers")
+def _makeRegistersCircuit(circuit, numRegs, numBits, name, registerType):
+    index = _registerIndexCircuit(circuit)
+    registers = []
     for i in range(numRegs):
-        while not _checkNameCircuit(circuit,name+str(i+n)):
-            n+=1
-        qregs.append(QuantumRegister(size=numBits,name=name+str(i+n)))
-        circuit.add_register(qregs[-1])
-    return qregs
+        registers.append(registerType(size=numBits,name=index.freshName(name)))
+        circuit.add_register(registers[-1])
+        index.added(registerType != ClassicalRegister)
+    return registers
 
-def _makeQregsDag(dag, numRegs, numBits, name = "q"):
-    qregs = []
-    n=0
+def _addCregDag(dag, creg):
+    """
+    Adds a classical register to a DAG in time proportional to its size.
+    ``DAGCircuit.add_creg`` checks the bits of the register against a set of every clbit of the DAG, which it builds anew for each register, so adding one register per round of syndrome detection takes time quadratic in the number of clbits. The same checks are made here against the index of the DAG's clbits.
+    """
+    clbitIndices = getattr(dag, "_clbit_indices", None)
+    if clbitIndices == None:
+        dag.add_creg(creg)
+        return
+    if creg.name in dag.cregs:
+        raise DAGCircuitError("duplicate register %s" % creg.name)
+
+    dag.cregs[creg.name] = creg
+    for j, clbit in enumerate(creg):
+        if clbit in clbitIndices:
+            clbitIndices[clbit].registers.append((creg, j))
+        else:
+            dag.clbits.append(clbit)
+            clbitIndices[clbit] = BitLocations(len(dag.clbits)-1, registers=[(creg, j)])
+            dag._add_wire(clbit)
+
+@_event("registers")
+def _makeRegistersDag(dag, numRegs, numBits, name, registerType):
+    index = _registerIndexDag(dag)
+    registers = []
     for i in range(numRegs):
-        while not _checkNameDag(dag,name+str(i+n)):
-            n+=1
-        qregs.append(QuantumRegister(size=numBits,name=name+str(i+n)))
-        dag.add_qreg(qregs[-1])
-    return qregs
+        registers.append(registerType(size=numBits,name=index.freshName(name)))
+        if registerType == ClassicalRegister:
+            _addCregDag(dag, registers[-1])
+        else:
+            dag.add_qreg(registers[-1])
+        index.added(registerType != ClassicalRegister)
+    return registers
+
+def _makeQregsCircuit(circuit, numRegs, numBits, name = "q"):
+    return _makeRegistersCircuit(circuit, numRegs, numBits, name, QuantumRegister)
+
+def _makeQregsDag(dag, numRegs, numBits, name = "q"):
+    return _makeRegistersDag(dag, numRegs, numBits, name, QuantumRegister)
 
 def _makeAncillasCircuit(circuit, numRegs, numBits, name = "ancilla"):
     if numBits < 1:
         return [[] for i in range(numRegs)]
-    ancillas = []
-    n=0
-    for i in range(numRegs):
-        while not _checkNameCircuit(circuit,name+str(i+n)):
-            n+=1
-        ancillas.append(AncillaRegister(size=numBits,name=name+str(i+n)))
-        circuit.add_register(ancillas[-1])
-    return ancillas
+    return _makeRegistersCircuit(circuit, numRegs, numBits, name, AncillaRegister)
 
 def _makeAncillasDag(dag, numRegs, numBits, name = "ancilla"):
     if numBits < 1:
         return [[] for i in range(numRegs)]
-    ancillas = []
-    n=0
-    for i in range(numRegs):
-        while not _checkNameDag(dag,name+str(i+n)):
-            n+=1
-        ancillas.append(AncillaRegister(size=numBits,name=name+str(i+n)))
-        dag.add_qreg(ancillas[-1])
-    return ancillas
+    return _makeRegistersDag(dag, numRegs, numBits, name, AncillaRegister)
 
 def _makeCregsCircuit(circuit, numRegs, numBits, name = "measure"):
     if numBits < 1:
         return [[] for i in range(numRegs)]
-    cregs = []
-    n=0
-    for i in range(numRegs):
-        while not _checkNameCircuit(circuit,name+str(i+n)):
-            n+=1
-        cregs.append(ClassicalRegister(size=numBits,name=name+str(i+n)))
-        circuit.add_register(cregs[-1])
-    return cregs
+    return _makeRegistersCircuit(circuit, numRegs, numBits, name, ClassicalRegister)
 
 def _makeCregsDag(dag, numRegs, numBits, name = "measure"):
     if numBits < 1:
         return [[] for i in range(numRegs)]
-    cregs = []
-    n=0
-    for i in range(numRegs):
-        while not _checkNameDag(dag,name+str(i+n)):
-            n+=1
-        cregs.append(ClassicalRegister(size=numBits,name=name+str(i+n)))
-        dag.add_creg(cregs[-1])
-    return cregs
+    return _makeRegistersDag(dag, numRegs, numBits, name, ClassicalRegister)
+
+class AncillaPool:
+    """
+    The ancilla registers of a single circuit or DAG which have been reset and can be reused.
+    Components which allocate their own ancillas lease them from the pool of the circuit or DAG they are adding gates to, and give them back once they have reset them, so repeated rounds of syndrome detection reuse the same ancillas and the number of qubits does not grow with every round.
+
+    A reused ancilla orders the components using it one after the other, so a released register is only leased again by a component acting on one of the code blocks it was last used with. That component has to wait for the block anyway, so reusing the ancilla does not delay it, and components on independent blocks are never serialized by the pool. The number of ancillas is therefore bounded by the number needed by the blocks at once, which is the peak concurrent demand when every block is corrected in parallel. Ancillas passed to a component explicitly are never added to the pool.
+    The pool of a circuit or DAG is given by :func:`ancillaPool`. Copies of a circuit or DAG start with an empty pool.
+
+    Attributes
+    ----------
+    enabled : bool
+        If ``False``, every lease allocates new ancilla registers and released registers are discarded.
+
+    Methods
+    -------
+    lease :
+        Takes ancilla registers from the pool, allocating new ones if not enough are free.
+    release :
+        Returns reset ancilla registers to the pool.
+    clear :
+        Forgets every free register.
+    """
+    def __init__(self):
+        self.enabled = True
+        self._free = collections.defaultdict(list)
+        self._blocks = {}
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def _take(self, numBits, blocks):
+        for block in blocks:
+            free = self._free.get((numBits, block))
+            if free:
+                register = free[-1]
+                for other in self._blocks.pop(register):
+                    self._free[(numBits, other)].remove(register)
+                return register
+        return None
+
+    def lease(self, numRegs, numBits, allocate, blocks):
+        """
+        Takes ``numRegs`` distinct free ancilla registers of ``numBits`` qubits from the pool.
+
+        Parameters
+        ----------
+        numRegs : int
+            The number of registers to lease.
+        numBits : int
+            The size of each register.
+        allocate : function
+            A function called as ``allocate(n)`` to add ``n`` new registers of ``numBits`` qubits to the circuit or DAG if fewer than ``numRegs`` are free.
+        blocks : list(list(QuantumRegister))
+            The code blocks each leased register will be used with. ``blocks[i]`` only receives a free register last used with one of the blocks it contains.
+
+        Returns
+        -------
+        list(AncillaRegister)
+            The leased registers, whose qubits are all in the :math:`|0\\rangle` state.
+        """
+        registers = [self._take(numBits, blocks[i]) if self.enabled else None for i in range(numRegs)]
+        missing = [i for i in range(numRegs) if registers[i] == None]
+        for i, register in zip(missing, allocate(len(missing)) if missing else []):
+            registers[i] = register
+        return registers
+
+    def release(self, registers, blocks):
+        """
+        Returns ancilla registers to the pool. Every qubit of the registers must have been reset.
+
+        Parameters
+        ----------
+        registers : list(AncillaRegister)
+            The registers to return.
+        blocks : list(list(QuantumRegister))
+            The code blocks each register was used with, as given to :meth:`lease`.
+        """
+        if self.enabled:
+            for register, registerBlocks in zip(registers, blocks):
+                registerBlocks = list(dict.fromkeys(registerBlocks))
+                self._blocks[register] = registerBlocks
+                for block in registerBlocks:
+                    self._free[(len(register), block)].append(register)
+
+    def clear(self):
+        """
+        Forgets every free register, so that later leases allocate new ones.
+        """
+        self._free.clear()
+        self._blocks.clear()
+
+_ancillaPools = {}
+
+def ancillaPool(owner):
+    """
+    Returns the :class:`AncillaPool` of a circuit or DAG, creating an empty one on first use.
+
+    Parameters
+    ----------
+    owner : QuantumCircuit, DAGCircuit
+        The circuit or DAG.
+
+    Returns
+    -------
+    AncillaPool
+        The pool of ``owner``.
+    """
+    return _attached(_ancillaPools, owner, lambda owner: AncillaPool())
+
+def _leaseAncillasCircuit(circuit, numRegs, numBits, blocks):
+    if numBits < 1:
+        return [[] for i in range(numRegs)]
+    return ancillaPool(circuit).lease(numRegs, numBits, lambda n: _makeAncillasCircuit(circuit, n, numBits), blocks)
+
+def _leaseAncillasDag(dag, numRegs, numBits, blocks):
+    if numBits < 1:
+        return [[] for i in range(numRegs)]
+    return ancillaPool(dag).lease(numRegs, numBits, lambda n: _makeAncillasDag(dag, n, numBits), blocks)
+
+_templateDags = {}
+
+@_event("circuitToDag")
+def _circuitToDag(circuit):
+    from qiskit.converters import circuit_to_dag
+    return circuit_to_dag(circuit)
+
+def _templateDag(circuit):
+    """
+    Returns the DAG of a template circuit, converting the circuit on first use.
+    The conversion is shared by every component using the same template, so a template must not be modified once it is in use.
+    """
+    if circuit is None:
+        return None
+    return _attached(_templateDags, circuit, _circuitToDag)
+
+def _mapCondition(dag, condition, wires, clbits):
+    target, value = condition
+    if isinstance(target, Clbit):
+        return (wires[target], value)
+
+    bits = [wires[bit] for bit in target]
+    if isinstance(clbits, ClassicalRegister) and list(clbits) == bits:
+        return (clbits, value)
+    for register in dag.cregs.values():
+        if list(register) == bits:
+            return (register, value)
+    raise DAGCircuitError("No register containing the mapped bits of the condition on " + target.name)
+
+def _composeDag(dag, other, qubits, clbits = None):
+    """
+    Appends the operations of ``other`` to ``dag``, mapping the qubits and clbits of ``other`` to ``qubits`` and ``clbits``.
+    Unlike ``DAGCircuit.compose``, conditions on a whole register are mapped directly onto ``clbits`` when it is a register, rather than by searching every register of ``dag``, and the operations are not re-validated against every bit of ``dag``, so the cost only depends on the size of ``other``.
+    """
+    wires = dict(zip(other.qubits, qubits))
+    if clbits:
+        wires.update(zip(other.clbits, clbits))
+
+    for node in other.topological_op_nodes():
+        op = node.op
+        condition = getattr(op, "condition", None)
+        if condition != None:
+            op = copy.copy(op)
+            op.condition = _mapCondition(dag, condition, wires, clbits)
+        dag.apply_operation_back(op, [wires[qbit] for qbit in node.qargs], [wires[cbit] for cbit in node.cargs], check=False)
 
 def _combineQregsAncillas(qregs,ancillas,singleQbit=True):
     if singleQbit:
@@ -112,23 +344,352 @@ def _combineQregsAncillas(qregs,ancillas,singleQbit=True):
         qbits.append(qbitList)
     return qbits
 
+def _addBody(circuit, body, qargs, flat = False):
+    """
+    Adds the body of a template to ``circuit``, either wrapped in a single gate labelled with the name of ``body``, for drawing, or, if ``flat``, as the gates of ``body`` themselves, so the template can be run without ``decompose``.
+    """
+    if flat:
+        circuit.compose(body, qargs, inplace=True)
+    else:
+        circuit.append(body.to_gate(), qargs = qargs)
+
+
+class TemplateCache:
+    """
+    A bounded cache of expanded templates, shared by the DAG methods of every component.
+    Adding a template to a DAG for a list of blocks expands the template into a flat list of operations on the blocks' qubits and clbits.
+    The cache stores that list, keyed by the template, the name of the template, the number of blocks and the relative layout of the blocks' qubits and clbits, so that adding the same template to an equivalent list of blocks again only remaps the qubits and clbits.
+    Since components of the same code share their templates, the entries are shared between components too.
+    The least recently used entries are evicted once the cache is full.
+
+    Parameters
+    ----------
+    maxSize : int, Optional
+        The maximum number of expanded templates to keep. If ``maxSize`` is 0, templates are always expanded from scratch.
+
+    Attributes
+    ----------
+    hits : int
+        The number of expansions which reused a cached entry.
+    misses : int
+        The number of expansions which had to expand the template.
+
+    Methods
+    -------
+    expand :
+        Adds a template to a DAG for a list of blocks.
+    clear :
+        Removes every entry and resets the counters.
+    """
+    def __init__(self, maxSize = 256):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """
+        Removes every entry from the cache and resets the hit and miss counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    @_event("compose")
+    def expand(self, dag, component, name, template, qbits, clbits = None):
+        """
+        Adds ``template`` to ``dag`` once for each block, mapping its qubits to ``qbits[i]`` and its clbits to ``clbits[i]`` for the ith block.
+
+        Parameters
+        ----------
+        dag : DAGCircuit
+            The DAG to add the template to.
+        component : object
+            The component the template belongs to.
+        name : str
+            The name of the template within the component.
+        template : DAGCircuit
+            The template to add.
+        qbits : list(list(Qubit))
+            The qubits of each block.
+        clbits : list(ClassicalRegister), list(list(Clbit)), Optional
+            The clbits of each block. If ``clbits`` is ``None``, the template must not use any clbits.
+        """
+        if clbits == None:
+            clbits = [[] for i in range(len(qbits))]
+
+        qubits, qubitLayout = _relativeLayout(qbits)
+        cbits, clbitLayout = _relativeLayout(clbits)
+        registers = tuple(isinstance(blockClbits, ClassicalRegister) for blockClbits in clbits)
+        key = (id(template), name, len(qbits), qubitLayout, clbitLayout, registers)
+
+        entry = self._entries.get(key)
+        if entry == None or entry[0] is not template:
+            self.misses += 1
+            entry = (template, _expandTemplate(template, qubitLayout, clbitLayout, clbits))
+            if entry[1] == None:
+                for i in range(len(qbits)):
+                    _composeDag(dag, template, qbits[i], clbits[i])
+                return
+            if self.maxSize > 0:
+                self._entries[key] = entry
+                if len(self._entries) > self.maxSize:
+                    self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        for op, qargs, cargs, condition in entry[1]:
+            if condition != None:
+                op = copy.copy(op)
+                if condition[0]:
+                    op.condition = (clbits[condition[1]], condition[2])
+                else:
+                    op.condition = (cbits[condition[1]], condition[2])
+            dag.apply_operation_back(op, [qubits[i] for i in qargs], [cbits[i] for i in cargs], check=False)
+
+def _relativeLayout(blocks):
+    bits = []
+    indices = {}
+    layout = []
+    for block in blocks:
+        blockLayout = []
+        for bit in block:
+            if bit not in indices:
+                indices[bit] = len(bits)
+                bits.append(bit)
+            blockLayout.append(indices[bit])
+        layout.append(tuple(blockLayout))
+    return bits, tuple(layout)
+
+def _expandTemplate(template, qubitLayout, clbitLayout, clbits):
+    nodes = list(template.topological_op_nodes())
+    qubitIndices = {qbit: i for i, qbit in enumerate(template.qubits)}
+    clbitIndices = {cbit: i for i, cbit in enumerate(template.clbits)}
+
+    ops = []
+    for block in range(len(qubitLayout)):
+        for node in nodes:
+            condition = getattr(node.op, "condition", None)
+            if condition != None:
+                target, value = condition
+                if isinstance(target, Clbit):
+                    condition = (False, clbitLayout[block][clbitIndices[target]], value)
+                elif isinstance(clbits[block], ClassicalRegister) and list(target) == template.clbits:
+                    condition = (True, block, value)
+                else:
+                    return None
+            ops.append((
+                node.op,
+                tuple(qubitLayout[block][qubitIndices[qbit]] for qbit in node.qargs),
+                tuple(clbitLayout[block][clbitIndices[cbit]] for cbit in node.cargs),
+                condition
+            ))
+    return ops
+
+templateCache = TemplateCache()
+
 
 class FaultTolerance(TransformationPass):
     """
-    A Transpiler pass that converts a given quantum computation into an equivalent one with error correction. NOT YET IMPLEMENTED
+    A Transpiler pass that converts a given quantum computation into an equivalent fault tolerant one.
+    Each logical qubit is encoded in its own code block, each logical gate is replaced by its fault tolerant implementation, and the blocks a gate acts on are error corrected after the gate.
+    The logical DAG is walked once in topological order and everything is added to a single output DAG, so the pass runs in time linear in the size of the logical circuit.
+
+    Logical measurements measure every qubit of the block into a new classical register named ``logical``.
+    After the pass has run, ``property_set["blockLayout"]`` maps each logical qubit to its code block and ``property_set["logicalMeasurements"]`` maps each logical clbit to the register holding its last measurement.
+    If ``optimize`` is set, the logical circuit is first simplified by :class:`LogicalOptimization`, and its ``logicalGatesRemoved`` and ``encodedOperationsSaved`` properties are copied to ``property_set``.
+
+    Parameters
+    ----------
+    encoder : Encoder, FaultTolerantEncoder
+        An object implementing the encoding of the :math:`|0\\rangle` state.
+    errorCorrector : ErrorCorrector
+        An object implementing error correction. If ``None``, no error correction is added.
+    gates : FaultTolerantGates
+        An object implementing the fault tolerant gates. Single-qubit Clifford gates without a fault tolerant implementation, such as :math:`Z` or :math:`S^\\dagger`, are rewritten as the shortest product of the single-qubit gates which have one, and other logical gates without one are unrolled into gates which have one. A ``TranspilerError`` is raised for a gate which can be neither.
+    numRounds : int, Optional
+        The number of rounds of error correction to perform after each gate.
+    optimize : bool, Optional
+        If ``True``, redundant logical gates are cancelled and merged by :class:`LogicalOptimization` before the circuit is made fault tolerant.
     """
-    def __init__(self, encoder, syndromeDetector, gates, measurement):
+    def __init__(self, encoder, errorCorrector, gates, numRounds = 1, optimize = False):
         super().__init__()
         self._encoder = encoder
-        self._syndromeDetector = syndromeDetector
+        self._errorCorrector = errorCorrector
         self._gates = gates
-        self._measurement = measurement
+        self._numRounds = numRounds
+        self._optimize = optimize
+
+    def _rewriteCliffords(self, dag):
+        """
+        Replaces every single-qubit Clifford gate of ``dag`` without a fault tolerant implementation by the shortest product of the single-qubit gates which have one, adding the difference in global phase to ``dag``.
+        """
+        from LogicalOptimization import _SINGLE_QUBIT_GATES, _shortestWords, _cliffordWord
+        words = None
+        for node in dag.op_nodes():
+            op = node.op
+            if op.name in self._gates._byName or op.num_qubits != 1 or op.num_clbits != 0 or getattr(op, "condition", None) != None:
+                continue
+            try:
+                matrix = op.to_matrix()
+            except Exception:
+                continue
+
+            if words == None:
+                words = _shortestWords(tuple(name for name in _SINGLE_QUBIT_GATES if name in self._gates._byName))
+            result = _cliffordWord(matrix, words)
+            if result == None:
+                continue
+
+            word, phase = result
+            replacement = DAGCircuit()
+            qreg = QuantumRegister(1)
+            replacement.add_qreg(qreg)
+            for name in word:
+                replacement.apply_operation_back(_SINGLE_QUBIT_GATES[name], [qreg[0]])
+            replacement.global_phase = phase
+            dag.substitute_node_with_dag(node, replacement)
+        return dag
+
+    def _unrollable(self, op, basis):
+        from qiskit.exceptions import QiskitError
+        from qiskit.transpiler.passes.basis.unroller import Unroller
+        single = DAGCircuit()
+        qreg = QuantumRegister(op.num_qubits)
+        creg = ClassicalRegister(op.num_clbits)
+        single.add_qreg(qreg)
+        single.add_creg(creg)
+        if getattr(op, "condition", None) != None:
+            op = copy.copy(op)
+            op.condition = None
+        single.apply_operation_back(op, list(qreg), list(creg))
+        try:
+            Unroller(basis).run(single)
+        except QiskitError:
+            return False
+        return True
+
+    def _unroll(self, dag):
+        from qiskit.exceptions import QiskitError
+        from qiskit.transpiler.passes.basis.unroller import Unroller
+        basis = self._gates._gates + ["measure", "reset", "barrier"]
+        dag = self._rewriteCliffords(dag)
+        try:
+            dag = Unroller(basis).run(dag)
+        except QiskitError as error:
+            # Find the logical gate which could not be unrolled, to name it rather than the gate of its definition at which unrolling failed.
+            for node in dag.op_nodes():
+                if node.op.name not in basis and not self._unrollable(node.op, basis):
+                    raise TranspilerError("No fault tolerant implementation of the gate " + node.op.name + ", and it cannot be unrolled into the gates " + ", ".join(self._gates._gates)) from error
+            raise TranspilerError("The logical circuit cannot be unrolled into the gates " + ", ".join(self._gates._gates)) from error
+        if not self._optimize:
+            return dag
+
+        from LogicalOptimization import LogicalOptimization
+        optimization = LogicalOptimization(self._gates, self._errorCorrector, self._numRounds)
+        dag = optimization.run(dag)
+        for name in ("logicalGatesRemoved", "encodedOperationsSaved"):
+            self.property_set[name] = optimization.property_set[name]
+        return dag
+
+    def _blockSize(self):
+        encoder = self._encoder._encoder if isinstance(self._encoder, FaultTolerantEncoder) else self._encoder
+        return encoder._encoderCircuit.num_qubits - encoder._numAncillas
+
+    def _addOperationCircuit(self, ftCircuit, op, qregs, cargs, measurements):
+        """
+        Adds the fault tolerant implementation of a single logical operation acting on the blocks ``qregs`` to ``ftCircuit``, recording the register holding the result of a logical measurement in ``measurements``.
+        """
+        blockSize = self._blockSize()
+
+        if getattr(op, "condition", None) != None:
+            raise TranspilerError("Conditional logical operations are not supported: " + op.name)
+
+        if op.name == "barrier":
+            ftCircuit.barrier(*qregs)
+
+        elif op.name == "measure":
+            cregs = _makeCregsCircuit(ftCircuit, 1, blockSize, name = "logical")
+            ftCircuit.barrier(qregs[0])
+            ftCircuit.measure(qregs[0], cregs[0])
+            measurements[cargs[0]] = cregs[0]
+
+        elif op.name == "reset":
+            ftCircuit.reset(qregs[0])
+            self._encoder.getEncoderCircuit(ftCircuit, qregs)
+
+        else:
+            self._gates.addGateCircuit(ftCircuit, op, [[qreg] for qreg in qregs])
+            if self._errorCorrector != None:
+                for i in range(self._numRounds):
+                    self._errorCorrector.errorCorrectCircuit(ftCircuit, qregs)
+
+    def _addOperationDag(self, ftDag, op, qregs, cargs, measurements):
+        """
+        Adds the fault tolerant implementation of a single logical operation acting on the blocks ``qregs`` to ``ftDag``, recording the register holding the result of a logical measurement in ``measurements``.
+        """
+        blockSize = self._blockSize()
+
+        if getattr(op, "condition", None) != None:
+            raise TranspilerError("Conditional logical operations are not supported: " + op.name)
+
+        if op.name == "barrier":
+            ftDag.apply_operation_back(Barrier(blockSize*len(qregs)), [qbit for qreg in qregs for qbit in qreg])
+
+        elif op.name == "measure":
+            cregs = _makeCregsDag(ftDag, 1, blockSize, name = "logical")
+            ftDag.apply_operation_back(Barrier(blockSize), qregs[0])
+            for i in range(blockSize):
+                ftDag.apply_operation_back(Measure(), [qregs[0][i]], [cregs[0][i]])
+            measurements[cargs[0]] = cregs[0]
+
+        elif op.name == "reset":
+            for qbit in qregs[0]:
+                ftDag.apply_operation_back(Reset(), [qbit])
+            self._encoder.getEncoderDag(ftDag, qregs)
+
+        else:
+            self._gates.addGateDag(ftDag, op, [[qreg] for qreg in qregs])
+            if self._errorCorrector != None:
+                for i in range(self._numRounds):
+                    self._errorCorrector.errorCorrectDag(ftDag, qregs)
+
+    @_operation
+    def run(self, dag):
+        """
+        Converts the given DAG into an equivalent fault tolerant DAG.
 
-    def run(dag):
-        if self._encoder == None or self._syndromeDetector == None or self._gates == None or self._measurement == None:
+        Parameters
+        ----------
+        dag : DAGCircuit
+            The logical computation to make fault tolerant.
+        """
+        if self._encoder == None or self._gates == None:
             return None
 
-        dag = Unroller(self._gates.gates).run(dag)
+        dag = self._unroll(dag)
+
+        ftDag = DAGCircuit()
+        ftDag.name = dag.name
+        ftDag.metadata = dag.metadata
+        ftDag.global_phase = dag.global_phase
+
+        blocks = dict(zip(dag.qubits, _makeQregsDag(ftDag, dag.num_qubits(), self._blockSize())))
+        measurements = {}
+
+        self._encoder.getEncoderDag(ftDag, list(blocks.values()))
+
+        for node in dag.topological_op_nodes():
+            self._addOperationDag(ftDag, node.op, [blocks[qubit] for qubit in node.qargs], node.cargs, measurements)
+
+        self.property_set["blockLayout"] = blocks
+        self.property_set["logicalMeasurements"] = measurements
+
+        return ftDag
 
 
 class Encoder():
@@ -149,9 +710,13 @@ class Encoder():
     def __init__(self, encoderCircuit, numAncillas):
         super().__init__()
         self._encoderCircuit = encoderCircuit
-        self._encoderDag = circuit_to_dag(encoderCircuit)
         self._numAncillas = numAncillas
 
+    @property
+    def _encoderDag(self):
+        return _templateDag(self._encoderCircuit)
+
+    @_operation
     def createEncoderCircuit(self, numQubits):
         """
         Creates a circuit encoding the specified number of qubits to the encoded :math:`|0\\rangle` state.
@@ -172,10 +737,11 @@ class Encoder():
         qbits = _combineQregsAncillas(qregs,ancillas)
 
         for i in range(numQubits):
-            circuit = circuit.compose(self._encoderCircuit, qbits[i], cregs[i])
+            _timed("compose", circuit.compose, self._encoderCircuit, qbits[i], cregs[i], inplace=True)
 
         return circuit
 
+    @_operation
     def createEncoderDag(self, numQubits):
         """
         Creates a DAG encoding the specified number of qubits to the encoded :math:`|0\\rangle` state.
@@ -196,18 +762,18 @@ class Encoder():
         cregs = _makeCregsDag(dag, numQubits, self._encoderDag.num_clbits())
         qbits = _combineQregsAncillas(qregs,ancillas)
         
-        for i in range(numQubits):
-            dag.compose(self._encoderDag, qubits = qbits[i], clbits = cregs[i])
+        templateCache.expand(dag, self, "encoder", self._encoderDag, qbits, cregs)
 
         return dag
 
-    def getEncoderCircuit(self, circuit, qregs, cregs = None, ancillas = None):
+    @_operation
+    def getEncoderCircuit(self, circuit, qregs, cregs = None, ancillas = None, copy = False):
         """
         Encodes the specified Quantum Registers to the encoded :math:`|0\\rangle` state for the given circuit.
 
         Parameters
         ----------
-        dag : DAGCircuit
+        circuit : QuantumCircuit
             The circuit for which to create the encoding.
         qregs : list(QuantumRegister)
             The Quantum Registers to encode to the :math:`|0\\rangle`.
@@ -215,23 +781,29 @@ class Encoder():
             The Classical Registers used to encode to the :math:`|0\\rangle`, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
         ancillas : list(AncillaRegister), list(QuantumRegister), Optional
             The Ancilla Registers used to encode to the :math:`|0\\rangle`, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register.
+        copy : bool, Optional
+            If ``True``, the encoding is added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the encoding is added to ``circuit`` in place.
         """
         if type(self._encoderCircuit) == type(None):
             return None
 
+        if copy:
+            circuit = _timed("copy", circuit.copy)
+
         if ancillas == None:
-            ancillas = _makeAncillasCircuit(circuit, numQubits, self._numAncillas)
+            ancillas = _makeAncillasCircuit(circuit, len(qregs), self._numAncillas)
 
         if cregs == None:
-            cregs = _makeCregsCircuit(circuit, numQubits, self._encoderCircuit.num_clbits)
-        
+            cregs = _makeCregsCircuit(circuit, len(qregs), self._encoderCircuit.num_clbits)
+
         qbits = _combineQregsAncillas(qregs,ancillas)
 
         for i in range(len(qregs)):
-            circuit = circuit.compose(self._encoderCircuit, qbits[i], cregs[i])
+            _timed("compose", circuit.compose, self._encoderCircuit, qbits[i], cregs[i], inplace=True)
 
         return circuit
 
+    @_operation
     def getEncoderDag(self, dag, qregs, cregs = None, ancillas = None):
         """
         Encodes the specified Quantum Registers to the encoded :math:`|0\\rangle` state for the given DAG.
@@ -252,15 +824,14 @@ class Encoder():
             return None
 
         if ancillas == None:
-            ancillas = _makeAncillasDag(dag, numQubits, self._numAncillas)
-        
+            ancillas = _makeAncillasDag(dag, len(qregs), self._numAncillas)
+
         if cregs == None:
-            cregs = _makeCregsDag(dag, numQubits, self._encoderDag.num_clbits())
+            cregs = _makeCregsDag(dag, len(qregs), self._encoderDag.num_clbits())
         
         qbits = _combineQregsAncillas(qregs,ancillas)
         
-        for i in range(len(qregs)):
-            dag.compose(self._encoderDag, qubits = qbits[i], clbits = cregs[i])
+        templateCache.expand(dag, self, "encoder", self._encoderDag, qbits, cregs)
 
         return dag
 
@@ -268,6 +839,7 @@ class Encoder():
 class FaultTolerantEncoder:
     """
     A class for implementing an fault tolerant ecoding of the :math:`|0\\rangle` state for an arbitrary quantum code.
+    After the :math:`|0\\rangle` state is encoded, the checker circuit is run, and while it reports a failure the block is reset and encoded again, up to ``numRepeats`` attempts in total.
 
     Parameters
     ----------
@@ -278,10 +850,16 @@ class FaultTolerantEncoder:
     numAncillas : int
         The number of ancilla qubits used to check the encoded effect. 
         Note: the ancilla qubits must be at the end of the list of qubits for the circuit.
-    correctVal : int
-        The classical register value corresponding to the correct initialization of the encoded :math:`|0\\rangle` state.
+    correctVal : int, list(int)
+        The classical register value, or list of values, corresponding to the correct initialization of the encoded :math:`|0\\rangle` state.
     numRepeats : int
         The number of times to attempt to create the encoded :math:`|0\\rangle` state.
+    form : str, Optional
+        How the repeated attempts are written out. If ``"compact"``, the default, each failed check triggers a single conditional instruction resetting and re-encoding the block. When the checker has a single failing value, the instruction is conditioned on the checker's register directly; otherwise each failing value flips a flag qubit, which is measured into a one-bit ``flag`` register that the instruction is conditioned on.
+        If ``"loop"``, the attempts are written as a ``for_loop`` containing an ``if_test`` on the failure, so the circuit has a single copy of the encoder and checker whatever the value of ``numRepeats``, and no further checks are run once one has passed. This requires a version of Qiskit supporting control flow.
+        If ``"unrolled"``, every failing checker value triggers its own conditional reset and conditional copy of the encoder, so the number of operations grows exponentially with the number of checker bits.
+    flat : bool, Optional
+        If ``True``, each reset and re-encoding of a block is written out as the resets and gates of the encoder, each with the condition of the attempt, rather than as a single conditional instruction, so the circuit can be run without ``decompose``. The encoder and checker should then be flat as well. The gates of the encoder must not be conditional themselves.
 
     Methods
     -------
@@ -294,14 +872,63 @@ class FaultTolerantEncoder:
     getEncoderDag :
         Adds gates encoding the :math:`|0\\rangle` state to a DAG
     """
-    def __init__(self, encoder, checkerCircuit, numAncillas, correctVal, numRepeats):
+    def __init__(self, encoder, checkerCircuit, numAncillas, correctVal, numRepeats, form = "compact", flat = False):
+        if form not in ("compact", "loop", "unrolled"):
+            raise ValueError("Unknown form of fault tolerant encoding: " + str(form))
+        if form == "loop" and not hasattr(QuantumCircuit, "for_loop"):
+            raise ValueError("The loop form of fault tolerant encoding requires a version of Qiskit supporting control flow")
+
         self._encoder = encoder
         self._checkerCircuit = checkerCircuit
-        self._checkerDag = circuit_to_dag(checkerCircuit)
         self._numAncillas = numAncillas
         self._correctVal = correctVal
         self._numRepeats = numRepeats
-
+        self._form = form
+        self._flat = flat
+
+        correctVals = set(correctVal) if isinstance(correctVal, (list, tuple, set, frozenset)) else {correctVal}
+        self._failVals = [k for k in range(2**checkerCircuit.num_clbits) if k not in correctVals]
+        self._retry = None
+
+    @property
+    def _checkerDag(self):
+        return _templateDag(self._checkerCircuit)
+
+    @property
+    def _needsFlag(self):
+        return self._form != "unrolled" and len(self._failVals) > 1
+
+    def _retryInstruction(self):
+        if self._retry == None:
+            encoderCircuit = self._encoder._encoderCircuit
+            retry = QuantumCircuit(encoderCircuit.num_qubits, encoderCircuit.num_clbits, name = "Retry")
+            retry.reset(retry.qubits)
+            retry.compose(encoderCircuit, inplace=True)
+            self._retry = retry.to_instruction()
+        return self._retry.copy()
+
+    def _retryOperations(self, qbits1, creg1, condition = None):
+        """
+        Returns the operations resetting and re-encoding a block, conditioned on ``condition`` if it is given, as tuples of an operation, its qubits and its clbits.
+        """
+        clbits1 = list(creg1) if creg1 != None else []
+        if not self._flat:
+            retry = self._retryInstruction()
+            return [(retry.c_if(*condition) if condition != None else retry, list(qbits1), clbits1)]
+
+        encoderCircuit = self._encoder._encoderCircuit
+        qubitMap = dict(zip(encoderCircuit.qubits, qbits1))
+        clbitMap = dict(zip(encoderCircuit.clbits, clbits1))
+        operations = [(Reset(), [qbit], []) for qbit in qbits1]
+        operations += [(instruction.operation, [qubitMap[qbit] for qbit in instruction.qubits], [clbitMap[cbit] for cbit in instruction.clbits]) for instruction in encoderCircuit.data]
+
+        if condition == None:
+            return operations
+        if any(getattr(operation, "condition", None) != None for operation, qargs, cargs in operations):
+            raise ValueError("A flat fault tolerant encoder cannot retry an encoder with conditional gates")
+        return [(operation.to_mutable().c_if(*condition), qargs, cargs) for operation, qargs, cargs in operations]
+
+    @_operation
     def createEncoderCircuit(self, numQubits):
         """
         Creates a circuit fault-tolerantly encoding the specified number of qubits to the encoded :math:`|0\\rangle` state.
@@ -313,30 +940,16 @@ class FaultTolerantEncoder:
         """
         circuit = QuantumCircuit()
 
-        qregs = _makeQregsCircuit(circuit,numQubits,self._encoder._encoderCircuit.num_qubits()-self._encoder._numAncillas)
+        qregs = _makeQregsCircuit(circuit,numQubits,self._encoder._encoderCircuit.num_qubits-self._encoder._numAncillas)
         ancillas1 = _makeAncillasCircuit(circuit, numQubits, self._encoder._numAncillas)
-        cregs1 = _makeCregsCircuit(circuit, numQubits, self._encoder._encoderCircuit.num_clbits())
-        
-        ancillas2 = _makeAncillasCircuit(circuit, numQubits, self._numAncillas)
-        cregs2 = _makeCregsCircuit(circuit, numQubits, self._checkerCircuit.num_clbits())
-
-        qbits1 = _combineQregsAncillas(qregs,ancillas1)
-        qbits2 = _combineQregsAncillas(qregs,ancillas2)
+        cregs1 = _makeCregsCircuit(circuit, numQubits, self._encoder._encoderCircuit.num_clbits)
 
-        circuit = self._encoder.getEncoderCircuit(circuit, qregs, cregs1, ancillas1)
-        for i in range(self._numRepeats-1):
-            for j in range(len(qregs)):
-                circuit = circuit.compose(self._checkerCircuit, qbits2[j], cregs2[j])
-                for k in range(2**self._checkerCircuit.num_clbits()):
-                    if k != self._correctVal:
-                        circuit.reset(qbits1[j]).c_if(cregs2[j],k)
-                        circuit = circuit.compose(self._encoder._encoderCircuit.c_if(cregs2[j],k), qbits1[j], cregs1[j])
-        
-        for j in range(len(qregs)):
-            circuit = circuit.compose(self._checkerCircuit, qbits2[j], cregs2[j])
+        ancillas2 = _makeAncillasCircuit(circuit, numQubits, self._numAncillas)
+        cregs2 = _makeCregsCircuit(circuit, numQubits, self._checkerCircuit.num_clbits)
 
-        return circuit
+        return self.getEncoderCircuit(circuit, qregs, cregs1, ancillas1, cregs2, ancillas2)
 
+    @_operation
     def createEncoderDag(self, numQubits):
         """
         Creates a DAG fault-tolerantly encoding the specified number of qubits to the encoded :math:`|0\\rangle` state.
@@ -355,69 +968,111 @@ class FaultTolerantEncoder:
         ancillas2 = _makeAncillasDag(dag, numQubits, self._numAncillas)
         cregs2 = _makeCregsDag(dag, numQubits, self._checkerDag.num_clbits())
 
-        qbits1 = _combineQregsAncillas(qregs,ancillas1)
-        qbits2 = _combineQregsAncillas(qregs,ancillas2)
+        return self.getEncoderDag(dag, qregs, cregs1, ancillas1, cregs2, ancillas2)
 
-        dag = self._encoder.getEncoderDag(dag, qregs, cregs1, ancillas1)
-        for i in range(self._numRepeats-1):
-            for j in range(len(qregs)):
-                dag.compose(self._checkerDag, qubits = qbits2[j], clbits = cregs2[j])
-                for k in range(2**self._checkerDag.num_clbits()):
-                    if k != self._correctVal:
-                        dag.apply_operation_back(Reset().c_if(cregs2[j],k),qbits1[j])
-                        dag.apply_operation_back(self._encoder._encoderCircuit.to_instruction().c_if(cregs2[j],k), qbits1[j], cregs1[j])
-        
-        for j in range(len(qregs)):
-            dag.compose(self._checkerDag, qubits = qbits2[j], clbits = cregs2[j])
+    def _checkCircuit(self, circuit, qbits2, creg2, ancillas2):
+        _timed("compose", circuit.compose, self._checkerCircuit, qbits2, creg2, inplace=True)
+        for ancilla in ancillas2:
+            circuit.reset(ancilla)
 
-        return dag
+    def _failureCircuit(self, circuit, creg2, flagQubit, flagCreg):
+        if not self._needsFlag:
+            return (creg2, self._failVals[0])
+
+        for k in self._failVals:
+            circuit.x(flagQubit[0]).c_if(creg2, k)
+        circuit.measure(flagQubit[0], flagCreg[0])
+        circuit.reset(flagQubit[0])
+        return (flagCreg, 1)
 
-    def getEncoderCircuit(self, circuit, qregs, cregs1 = None, ancillas1 = None, cregs2 = None, ancillas2 = None):
+    def _repeatCircuit(self, circuit, qbits1, creg1, qbits2, creg2, ancillas2, flagQubit, flagCreg):
+        """
+        Adds the checks and attempts after the first encoding of a single block.
+        """
+        if self._form == "loop":
+            self._checkCircuit(circuit, qbits2, creg2, ancillas2)
+            if self._numRepeats > 1 and self._failVals:
+                condition = self._failureCircuit(circuit, creg2, flagQubit, flagCreg)
+                with circuit.for_loop(range(self._numRepeats-1)):
+                    with circuit.if_test(condition):
+                        for operation, qargs, cargs in self._retryOperations(qbits1, creg1):
+                            circuit.append(operation, qargs, cargs)
+                        self._checkCircuit(circuit, qbits2, creg2, ancillas2)
+                        self._failureCircuit(circuit, creg2, flagQubit, flagCreg)
+            return
+
+        encoderInstruction = self._encoder._encoderCircuit.to_instruction()
+        for i in range(self._numRepeats-1):
+            self._checkCircuit(circuit, qbits2, creg2, ancillas2)
+            if self._form == "unrolled" and self._flat:
+                for k in self._failVals:
+                    for operation, qargs, cargs in self._retryOperations(qbits1, creg1, (creg2,k)):
+                        circuit.append(operation, qargs, cargs)
+            elif self._form == "unrolled":
+                for k in self._failVals:
+                    circuit.reset(qbits1).c_if(creg2,k)
+                    circuit.append(encoderInstruction.copy().c_if(creg2,k), qbits1, creg1)
+            elif self._failVals:
+                condition = self._failureCircuit(circuit, creg2, flagQubit, flagCreg)
+                for operation, qargs, cargs in self._retryOperations(qbits1, creg1, condition):
+                    circuit.append(operation, qargs, cargs)
+        self._checkCircuit(circuit, qbits2, creg2, ancillas2)
+
+    @_operation
+    def getEncoderCircuit(self, circuit, qregs, cregs1 = None, ancillas1 = None, cregs2 = None, ancillas2 = None, copy = False):
         """
         Fault-tolerantly encodes the specified Quantum Registers to the encoded :math:`|0\\rangle` state for the given circuit.
 
         Parameters
         ----------
-        dag : DAGCircuit
+        circuit : QuantumCircuit
             The circuit for which to create the encoding.
         qregs : list(QuantumRegister)
             The Quantum Registers to encode to the :math:`|0\\rangle`.
         cregs : list(ClassicalRegister), Optional
             The Classical Registers used to encode to the :math:`|0\\rangle`, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
         ancillas : list(AncillaRegister), list(QuantumRegister), Optional
-            The Ancilla Registers used to encode to the :math:`|0\\rangle`, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register.
+            The Ancilla Registers used to encode to the :math:`|0\\rangle`, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register. By default, the checker's ancillas, and the flag qubits of the compact and loop forms, are leased from the :class:`AncillaPool` of ``circuit`` and are reset and returned to it afterwards.
+        copy : bool, Optional
+            If ``True``, the encoding is added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the encoding is added to ``circuit`` in place.
         """
-        circuit = QuantumCircuit()
+        if copy:
+            circuit = _timed("copy", circuit.copy)
 
         if ancillas1 == None:
-            ancillas1 = _makeAncillasCircuit(circuit, numQubits, self._encoder._numAncillas)
-        
+            ancillas1 = _makeAncillasCircuit(circuit, len(qregs), self._encoder._numAncillas)
+
         if cregs1 == None:
-            cregs1 = _makeCregsCircuit(circuit, numQubits, self._encoder._encoderCircuit.num_clbits())
-        
-        if ancillas2 == None:
-            ancillas2 = _makeAncillasCircuit(circuit, numQubits, self._numAncillas)
-        
+            cregs1 = _makeCregsCircuit(circuit, len(qregs), self._encoder._encoderCircuit.num_clbits)
+
+        leased = ancillas2 == None
+        if leased:
+            ancillas2 = _leaseAncillasCircuit(circuit, len(qregs), self._numAncillas, [[qreg] for qreg in qregs])
+
         if cregs2 == None:
-            cregs2 = _makeCregsCircuit(circuit, numQubits, self._checkerCircuit.num_clbits())
+            cregs2 = _makeCregsCircuit(circuit, len(qregs), self._checkerCircuit.num_clbits)
+
+        flagQubits = [None]*len(qregs)
+        flagCregs = [None]*len(qregs)
+        if self._needsFlag:
+            flagQubits = _leaseAncillasCircuit(circuit, len(qregs), 1, [[qreg] for qreg in qregs])
+            flagCregs = _makeCregsCircuit(circuit, len(qregs), 1, name="flag")
 
         qbits1 = _combineQregsAncillas(qregs,ancillas1)
         qbits2 = _combineQregsAncillas(qregs,ancillas2)
 
-        circuit = self._encoder.getEncoderCircuit(circuit, qregs, cregs1, ancillas1)
-        for i in range(self._numRepeats-1):
-            for j in range(len(qregs)):
-                circuit = circuit.compose(self._checkerCircuit, qbits2[j], cregs2[j])
-                for k in range(2**self._checkerCircuit.num_clbits()):
-                    if k != self._correctVal:
-                        circuit.reset(qbits1[j]).c_if(cregs2[j],k)
-                        circuit = circuit.compose(self._encoder._encoderCircuit.c_if(cregs2[j],k), qbits1[j], cregs1[j])
-        
+        self._encoder.getEncoderCircuit(circuit, qregs, cregs1, ancillas1)
         for j in range(len(qregs)):
-            circuit = circuit.compose(self._checkerCircuit, qbits2[j], cregs2[j])
+            self._repeatCircuit(circuit, qbits1[j], cregs1[j], qbits2[j], cregs2[j], ancillas2[j], flagQubits[j], flagCregs[j])
+
+        if leased:
+            ancillaPool(circuit).release(ancillas2, [[qreg] for qreg in qregs])
+        if self._needsFlag:
+            ancillaPool(circuit).release(flagQubits, [[qreg] for qreg in qregs])
 
         return circuit
 
+    @_operation
     def getEncoderDag(self, dag, qregs, cregs1 = None, ancillas1 = None, cregs2 = None, ancillas2 = None):
         """
         Fault-tolerantly encodes the specified Quantum Registers to the encoded :math:`|0\\rangle` state for the given DAG.
@@ -431,38 +1086,114 @@ class FaultTolerantEncoder:
         cregs : list(ClassicalRegister), Optional
             The Classical Registers used to encode to the :math:`|0\\rangle`, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
         ancillas : list(AncillaRegister), list(QuantumRegister), Optional
-            The Ancilla Registers used to encode to the :math:`|0\\rangle`, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register.
+            The Ancilla Registers used to encode to the :math:`|0\\rangle`, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the encoding process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register. By default, the checker's ancillas, and the flag qubits of the compact and loop forms, are leased from the :class:`AncillaPool` of ``dag`` and are reset and returned to it afterwards.
         """
         if ancillas1 == None:
-            ancillas1 = _makeAncillasDag(dag, numQubits, self._encoder._numAncillas)
-        
+            ancillas1 = _makeAncillasDag(dag, len(qregs), self._encoder._numAncillas)
+
         if cregs1 == None:
-            cregs1 = _makeCregsDag(dag, numQubits, self._encoder._encoderDag.num_clbits())
-        
-        if ancillas2 == None:
-            ancillas2 = _makeAncillasDag(dag, numQubits, self._numAncillas)
-        
+            cregs1 = _makeCregsDag(dag, len(qregs), self._encoder._encoderDag.num_clbits())
+
+        leased = ancillas2 == None
+        if leased:
+            ancillas2 = _leaseAncillasDag(dag, len(qregs), self._numAncillas, [[qreg] for qreg in qregs])
+
         if cregs2 == None:
-            cregs2 = _makeCregsDag(dag, numQubits, self._checkerDag.num_clbits())
+            cregs2 = _makeCregsDag(dag, len(qregs), self._checkerDag.num_clbits())
+
+        flagQubits = [None]*len(qregs)
+        flagCregs = [None]*len(qregs)
+        if self._needsFlag:
+            flagQubits = _leaseAncillasDag(dag, len(qregs), 1, [[qreg] for qreg in qregs])
+            flagCregs = _makeCregsDag(dag, len(qregs), 1, name="flag")
 
         qbits1 = _combineQregsAncillas(qregs,ancillas1)
         qbits2 = _combineQregsAncillas(qregs,ancillas2)
 
         dag = self._encoder.getEncoderDag(dag, qregs, cregs1, ancillas1)
-        for i in range(self._numRepeats-1):
+
+        if self._form == "loop":
+            # The loop is built on a circuit over the block's bits, whose operations are then moved onto the DAG.
             for j in range(len(qregs)):
-                dag.compose(self._checkerDag, qubits = qbits2[j], clbits = cregs2[j])
-                for k in range(2**self._checkerDag.num_clbits()):
-                    if k != self._correctVal:
-                        dag.apply_operation_back(Reset().c_if(cregs2[j],k),qbits1[j])
-                        dag.compose(self._encoder._encoderCircuit.to_instruction().c_if(cregs2[j],k), qbits1[j], cregs1[j])
-        
-        for j in range(len(qregs)):
-            dag.compose(self._checkerDag, qubits = qbits2[j], clbits = cregs2[j])
+                qubits = list(dict.fromkeys(qbits1[j] + qbits2[j] + list(flagQubits[j] or [])))
+                registers = [register for register in (cregs1[j], cregs2[j], flagCregs[j]) if isinstance(register, ClassicalRegister)]
+                circuit = QuantumCircuit(qubits, *registers)
+                self._repeatCircuit(circuit, qbits1[j], cregs1[j], qbits2[j], cregs2[j], ancillas2[j], flagQubits[j], flagCregs[j])
+                for instruction in circuit.data:
+                    dag.apply_operation_back(instruction.operation, instruction.qubits, instruction.clbits, check=False)
+        else:
+            for i in range(self._numRepeats-1):
+                for j in range(len(qregs)):
+                    templateCache.expand(dag, self, "checker", self._checkerDag, [qbits2[j]], [cregs2[j]])
+                    for ancilla in ancillas2[j]:
+                        dag.apply_operation_back(Reset(),[ancilla])
+
+                    if self._form == "unrolled" and self._flat:
+                        for k in self._failVals:
+                            for operation, qargs, cargs in self._retryOperations(qbits1[j], cregs1[j], (cregs2[j],k)):
+                                dag.apply_operation_back(operation, qargs, cargs)
+                    elif self._form == "unrolled":
+                        for k in self._failVals:
+                            for qbit in qbits1[j]:
+                                dag.apply_operation_back(Reset().c_if(cregs2[j],k),[qbit])
+                            dag.apply_operation_back(self._encoder._encoderCircuit.to_instruction().c_if(cregs2[j],k), qbits1[j], cregs1[j])
+                    elif self._failVals:
+                        condition = (cregs2[j], self._failVals[0])
+                        if self._needsFlag:
+                            for k in self._failVals:
+                                dag.apply_operation_back(XGate().c_if(cregs2[j],k), [flagQubits[j][0]])
+                            dag.apply_operation_back(Measure(), [flagQubits[j][0]], [flagCregs[j][0]])
+                            dag.apply_operation_back(Reset(), [flagQubits[j][0]])
+                            condition = (flagCregs[j], 1)
+                        for operation, qargs, cargs in self._retryOperations(qbits1[j], cregs1[j], condition):
+                            dag.apply_operation_back(operation, qargs, cargs)
+
+            templateCache.expand(dag, self, "checker", self._checkerDag, qbits2, cregs2)
+            for j in range(len(qregs)):
+                for ancilla in ancillas2[j]:
+                    dag.apply_operation_back(Reset(),[ancilla])
+
+        if leased:
+            ancillaPool(dag).release(ancillas2, [[qreg] for qreg in qregs])
+        if self._needsFlag:
+            ancillaPool(dag).release(flagQubits, [[qreg] for qreg in qregs])
 
         return dag
 
 
+class _SyndromeHistory:
+    """
+    The number of rounds of syndrome detection applied to each code block of a single circuit or DAG, together with the classical registers reused by each block.
+    """
+    def __init__(self, owner):
+        self._rounds = {}
+        self._rings = {}
+
+    def registers(self, qregs, numBits, ringSize, keepRounds, allocate):
+        cregs = [None]*len(qregs)
+        rings = [None]*len(qregs)
+        for i in range(len(qregs)):
+            index = self._rounds.get(qregs[i], 0)
+            self._rounds[qregs[i]] = index+1
+            if index in keepRounds:
+                continue
+
+            ring = self._rings.setdefault((qregs[i], numBits), [])
+            if len(ring) < ringSize:
+                rings[i] = ring
+            else:
+                cregs[i] = ring.pop(0)
+                ring.append(cregs[i])
+
+        missing = [i for i in range(len(qregs)) if cregs[i] == None]
+        for i, creg in zip(missing, allocate(len(missing)) if missing else []):
+            cregs[i] = creg
+            if rings[i] != None:
+                rings[i].append(creg)
+        return cregs
+
+_syndromeHistories = {}
+
 class SyndromeDetector:
     """
     A class for implementing non-fault tolerant syndrome detection for an arbitrary error correction scheme.
@@ -473,6 +1204,10 @@ class SyndromeDetector:
         A Quantum Circuit implementing non-fault tolerant syndrome detection.
     numAncillas : int
         The number of ancilla qubits used in the syndrome detection.
+    ringSize : int, Optional
+        If given, the syndromes of each code block are measured into a ring of ``ringSize >= 1`` classical registers which are reused round after round, so the number of clbits no longer grows with the number of rounds. Since the syndrome correction of a round only reads the syndrome of that round, correction is unaffected, but only the syndromes of the last ``ringSize`` rounds of each block remain in the results. By default, every round uses new classical registers.
+    keepRounds : list(int), Optional
+        The rounds, counted from 0 for each code block of a circuit or DAG, whose syndromes are measured into new classical registers which are never reused, so they remain in the results for decoding. Only used if ``ringSize`` is given.
 
     Methods
     -------
@@ -481,13 +1216,33 @@ class SyndromeDetector:
     syndromeDetectDag :
         Implements syndrome detection for the given DAG.
     """
-    def __init__(self, detectorCircuit, numAncillas):
+    def __init__(self, detectorCircuit, numAncillas, ringSize = None, keepRounds = ()):
+        if ringSize != None and ringSize < 1:
+            raise ValueError("The ring of syndrome registers of a code block must hold at least one register, but ringSize = " + str(ringSize))
         self._detectorCircuit = detectorCircuit
-        self._detectorDag = circuit_to_dag(detectorCircuit)
         self._numMeasurements = detectorCircuit.num_clbits
         self._numAncillas = numAncillas
-
-    def syndromeDetectCircuit(self, circuit, qregs, cregs=None, ancillas=None):
+        self._ringSize = ringSize
+        self._keepRounds = frozenset(keepRounds)
+
+    def _syndromeCregsCircuit(self, circuit, qregs):
+        if self._ringSize == None or self._numMeasurements < 1:
+            return _makeCregsCircuit(circuit,len(qregs),self._numMeasurements)
+        history = _attached(_syndromeHistories, circuit, _SyndromeHistory)
+        return history.registers(qregs, self._numMeasurements, self._ringSize, self._keepRounds, lambda n: _makeCregsCircuit(circuit,n,self._numMeasurements))
+
+    def _syndromeCregsDag(self, dag, qregs):
+        if self._ringSize == None or self._numMeasurements < 1:
+            return _makeCregsDag(dag,len(qregs),self._numMeasurements)
+        history = _attached(_syndromeHistories, dag, _SyndromeHistory)
+        return history.registers(qregs, self._numMeasurements, self._ringSize, self._keepRounds, lambda n: _makeCregsDag(dag,n,self._numMeasurements))
+
+    @property
+    def _detectorDag(self):
+        return _templateDag(self._detectorCircuit)
+
+    @_operation
+    def syndromeDetectCircuit(self, circuit, qregs, cregs=None, ancillas=None, copy=False):
         """
         Creates gates implementing non-fault tolerant syndrome detection for the given qubits in the given circuit.
 
@@ -500,29 +1255,37 @@ class SyndromeDetector:
         cregs : list(ClassicalRegister), Optional
             The Classical Registers used to perform syndrome detection, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
         ancillas : list(AncillaRegister), list(QuantumRegister), Optional
-            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register.
+            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register. By default, the ancillas are leased from the :class:`AncillaPool` of ``circuit`` and are reset and returned to it afterwards.
+        copy : bool, Optional
+            If ``True``, the gates are added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the gates are added to ``circuit`` in place.
         """
         if type(self._detectorCircuit) == type(None):
             return None
 
-        circuit = circuit.copy()
+        if copy:
+            circuit = _timed("copy", circuit.copy)
 
         if cregs == None:
-            cregs = _makeCregsCircuit(circuit,len(qregs),self._numMeasurements)
+            cregs = self._syndromeCregsCircuit(circuit,qregs)
         
-        if ancillas == None:
-            ancillas = _makeAncillasCircuit(circuit,len(qregs),self._numAncillas)
+        leased = ancillas == None
+        if leased:
+            ancillas = _leaseAncillasCircuit(circuit,len(qregs),self._numAncillas,[[qreg] for qreg in qregs])
         
         qbits = _combineQregsAncillas(qregs,ancillas)
 
         for i in range(len(qregs)):
-            circuit = circuit.compose(self._detectorCircuit, qbits[i], cregs[i])
+            _timed("compose", circuit.compose, self._detectorCircuit, qbits[i], cregs[i], inplace=True)
 
         for i in range(len(ancillas)):
             circuit.reset(ancillas[i])
+
+        if leased:
+            ancillaPool(circuit).release(ancillas, [[qreg] for qreg in qregs])
         
         return circuit
 
+    @_operation
     def syndromeDetectDag(self, dag, qregs, cregs=None, ancillas=None):
         """
         Creates gates implementing non-fault tolerant syndrome detection for the given qubits in the given DAG.
@@ -536,7 +1299,7 @@ class SyndromeDetector:
         cregs : list(ClassicalRegister), Optional
             The Classical Registers used to perform syndrome detection, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
         ancillas : list(AncillaRegister), list(QuantumRegister), Optional
-            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register.
+            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(cregs) == len(qregs)`` and the syndrome detection process for the ``qregs[i]`` quantum register will use the ``ancillas[i]`` ancilla register. By default, the ancillas are leased from the :class:`AncillaPool` of ``dag`` and are reset and returned to it afterwards.
         """
 
         if type(self._detectorDag) == type(None):
@@ -545,21 +1308,171 @@ class SyndromeDetector:
         #dag = dag.copy()
 
         if cregs == None:
-            cregs = _makeCregsDag(dag,len(qregs),self._numMeasurements)
+            cregs = self._syndromeCregsDag(dag,qregs)
 
-        if ancillas == None:
-            ancillas = _makeAncillasDag(dag,len(qregs),self._numAncillas)
+        leased = ancillas == None
+        if leased:
+            ancillas = _leaseAncillasDag(dag,len(qregs),self._numAncillas,[[qreg] for qreg in qregs])
 
         qbits = _combineQregsAncillas(qregs,ancillas)
 
-        for i in range(len(qregs)):
-            dag.compose(self._detectorDag, qubits = qbits[i], clbits = cregs[i])
+        templateCache.expand(dag, self, "detector", self._detectorDag, qbits, cregs)
         
         for i in range(len(ancillas)):
-            dag.apply_operation_back(Reset(),ancillas[i])
+            for ancilla in ancillas[i]:
+                dag.apply_operation_back(Reset(),[ancilla])
+
+        if leased:
+            ancillaPool(dag).release(ancillas, [[qreg] for qreg in qregs])
         
         return dag
-            
+
+def scheduleChecks(xChecks, zChecks):
+    """
+    Schedules the ancilla-data interactions which measure the stabilizers of a CSS code into as few parallel layers as possible, using the ancilla layout of :class:`SteaneSyndromeDetector`.
+    Z-type check ``k`` is measured by ancilla ``len(xChecks)+len(zChecks)-1-k`` using CZ gates, and X-type check ``k`` by ancilla ``len(xChecks)-1-k`` using CNOT gates controlled by the ancilla. On every data qubit, the CZ gates are scheduled before the CNOT gates, so the scheduled circuit is the same unitary as measuring all Z-type checks followed by all X-type checks.
+    Each layer is filled greedily, giving priority to the interactions of the ancillas and data qubits with the most interactions left, which is optimal for the Steane code (7 layers).
+
+    Parameters
+    ----------
+    xChecks : list(list(int))
+        The parity-check matrix of the X-type stabilizers, which detect :math:`Z` errors. Each row gives the qubits on which a stabilizer acts.
+    zChecks : list(list(int))
+        The parity-check matrix of the Z-type stabilizers, which detect :math:`X` errors.
+
+    Returns
+    -------
+    list(list((str, int, int)))
+        The layers, each giving the name of the gate (``"cz"`` or ``"cx"``), the ancilla and the data qubit of every interaction in the layer. No qubit is used twice in a layer.
+    """
+    numX = len(xChecks)
+    numZ = len(zChecks)
+    numQubits = len((xChecks or zChecks)[0])
+
+    pending = [("cz", numX+numZ-1-k, qubit) for k in range(numZ) for qubit in range(numQubits) if zChecks[k][qubit]]
+    pending += [("cx", numX-1-k, qubit) for k in range(numX) for qubit in range(numQubits) if xChecks[k][qubit]]
+
+    ancillaLeft = collections.Counter(ancilla for gate, ancilla, qubit in pending)
+    qubitLeft = collections.Counter(qubit for gate, ancilla, qubit in pending)
+    zLeft = collections.Counter(qubit for gate, ancilla, qubit in pending if gate == "cz")
+
+    layers = []
+    while pending:
+        ready = [interaction for interaction in pending if interaction[0] == "cz" or zLeft[interaction[2]] == 0]
+        ready.sort(key = lambda interaction: (-max(ancillaLeft[interaction[1]], qubitLeft[interaction[2]]), -min(ancillaLeft[interaction[1]], qubitLeft[interaction[2]])))
+
+        layer = []
+        usedAncillas = set()
+        usedQubits = set()
+        for gate, ancilla, qubit in ready:
+            if ancilla not in usedAncillas and qubit not in usedQubits:
+                usedAncillas.add(ancilla)
+                usedQubits.add(qubit)
+                layer.append((gate, ancilla, qubit))
+
+        for gate, ancilla, qubit in layer:
+            pending.remove((gate, ancilla, qubit))
+            ancillaLeft[ancilla] -= 1
+            qubitLeft[qubit] -= 1
+            if gate == "cz":
+                zLeft[qubit] -= 1
+        layers.append(layer)
+
+    return layers
+
+def parityCheckDetector(xChecks, zChecks, name = None):
+    """
+    Creates a syndrome detection circuit for a CSS code from its parity-check matrices, for use with :class:`SyndromeDetector`.
+    The interactions are emitted in the layers given by :func:`scheduleChecks` and are not wrapped in a gate, so when syndrome detection is applied to several blocks, the layers of every block run in parallel.
+
+    Parameters
+    ----------
+    xChecks : list(list(int))
+        The parity-check matrix of the X-type stabilizers, which detect :math:`Z` errors.
+    zChecks : list(list(int))
+        The parity-check matrix of the Z-type stabilizers, which detect :math:`X` errors.
+    name : str, Optional
+        The name of the circuit.
+
+    Returns
+    -------
+    QuantumCircuit
+        The syndrome detection circuit, acting on a register of data qubits and a register of ``len(xChecks)+len(zChecks)`` ancillas, and measuring ancilla ``i`` into bit ``i`` of a syndrome register.
+    """
+    qreg = QuantumRegister(len((xChecks or zChecks)[0]))
+    ancilla = QuantumRegister(len(xChecks)+len(zChecks))
+    creg = ClassicalRegister(len(xChecks)+len(zChecks))
+    detectorCircuit = QuantumCircuit(qreg, ancilla, creg, name = name)
+
+    detectorCircuit.h(ancilla)
+    for layer in scheduleChecks(xChecks, zChecks):
+        for gate, a, qubit in layer:
+            getattr(detectorCircuit, gate)(ancilla[a], qreg[qubit])
+    detectorCircuit.h(ancilla)
+    detectorCircuit.measure(ancilla, creg)
+
+    return detectorCircuit
+
+def singleErrorSyndromes(xChecks, zChecks):
+    """
+    Computes the decode table of a CSS code for single-qubit errors, as read from a syndrome register.
+    The syndrome register holds the outcome of X-type check ``k`` in bit ``len(xChecks)-1-k`` and the outcome of Z-type check ``k`` in bit ``len(xChecks)+len(zChecks)-1-k``, matching the layout of :class:`SteaneSyndromeDetector`.
+    If several errors give the same syndrome, the error on the lowest qubit is used, and :math:`X` errors are preferred to :math:`Z` errors, which are preferred to :math:`Y` errors.
+
+    Parameters
+    ----------
+    xChecks : list(list(int))
+        The parity-check matrix of the X-type stabilizers, which detect :math:`Z` errors. Each row gives the qubits on which a stabilizer acts.
+    zChecks : list(list(int))
+        The parity-check matrix of the Z-type stabilizers, which detect :math:`X` errors.
+
+    Returns
+    -------
+    dict(int, (str, int))
+        A map from each correctable syndrome value to the correction, given by the name of a Pauli gate and the qubit to apply it to.
+    """
+    numX = len(xChecks)
+    numZ = len(zChecks)
+    numQubits = len((xChecks or zChecks)[0])
+
+    xSyndromes = [sum(1 << (numX+numZ-1-k) for k in range(numZ) if zChecks[k][qubit]) for qubit in range(numQubits)]
+    zSyndromes = [sum(1 << (numX-1-k) for k in range(numX) if xChecks[k][qubit]) for qubit in range(numQubits)]
+
+    table = {}
+    for pauli, syndromes in (("x", xSyndromes), ("z", zSyndromes), ("y", [x|z for x, z in zip(xSyndromes, zSyndromes)])):
+        for qubit, syndrome in enumerate(syndromes):
+            if syndrome != 0 and syndrome not in table:
+                table[syndrome] = (pauli, qubit)
+    return table
+
+def parityCheckCorrector(xChecks, zChecks, name = None):
+    """
+    Creates a syndrome correction circuit for a CSS code from its parity-check matrices, for use with :class:`SyndromeCorrector`.
+    The circuit applies the correction given by :func:`singleErrorSyndromes` for each correctable syndrome, using a single gate conditioned on the syndrome register, so a :math:`Y` correction is one conditional :math:`Y` gate rather than a conditional :math:`X` gate and a conditional :math:`Z` gate.
+
+    Parameters
+    ----------
+    xChecks : list(list(int))
+        The parity-check matrix of the X-type stabilizers, which detect :math:`Z` errors.
+    zChecks : list(list(int))
+        The parity-check matrix of the Z-type stabilizers, which detect :math:`X` errors.
+    name : str, Optional
+        The name of the circuit.
+
+    Returns
+    -------
+    QuantumCircuit
+        The syndrome correction circuit, acting on a register of data qubits and a syndrome register of ``len(xChecks)+len(zChecks)`` bits.
+    """
+    qreg = QuantumRegister(len((xChecks or zChecks)[0]))
+    creg = ClassicalRegister(len(xChecks)+len(zChecks))
+    correctorCircuit = QuantumCircuit(qreg, creg, name = name)
+
+    for syndrome, (pauli, qubit) in singleErrorSyndromes(xChecks, zChecks).items():
+        getattr(correctorCircuit, pauli)(qreg[qubit]).c_if(creg, syndrome)
+
+    return correctorCircuit
+
 class SyndromeCorrector:
     """
     A class for implementing fault tolerant syndrome correction for an arbitrary error correction scheme.
@@ -578,9 +1491,13 @@ class SyndromeCorrector:
     """
     def __init__(self, correctorCircuit):
         self._correctorCircuit = correctorCircuit
-        self._correctorDag = circuit_to_dag(correctorCircuit)
 
-    def syndromeCorrectCircuit(self, circuit, qregs, cregs):
+    @property
+    def _correctorDag(self):
+        return _templateDag(self._correctorCircuit)
+
+    @_operation
+    def syndromeCorrectCircuit(self, circuit, qregs, cregs, copy=False):
         """
         Creates gates implementing fault tolerant syndrome correction for the given qubits in the given circuit.
 
@@ -592,18 +1509,22 @@ class SyndromeCorrector:
             The Quantum Registers to on which to perform syndrome correction.
         cregs : list(ClassicalRegister)
             The Classical Registers used to perform syndrome correction, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the syndrome correction process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
+        copy : bool, Optional
+            If ``True``, the gates are added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the gates are added to ``circuit`` in place.
         """
 
         if type(self._correctorCircuit) == type(None):
             return None
 
-        circuit = circuit.copy()
+        if copy:
+            circuit = _timed("copy", circuit.copy)
 
         for i in range(len(qregs)):
-            circuit = circuit.compose(self._correctorCircuit, qregs[i], cregs[i])
+            _timed("compose", circuit.compose, self._correctorCircuit, qregs[i], cregs[i], inplace=True)
 
         return circuit
 
+    @_operation
     def syndromeCorrectDag(self, dag, qregs, cregs):
         """
         Creates gates implementing fault tolerant syndrome correction for the given qubits in the given DAG.
@@ -622,8 +1543,7 @@ class SyndromeCorrector:
 
         #dag = dag.copy()
 
-        for i in range(len(qregs)):
-            dag.compose(self._correctorDag, qubits = qregs[i], clbits = cregs[i])
+        templateCache.expand(dag, self, "corrector", self._correctorDag, qregs, cregs)
         return dag
 
 class ErrorCorrector:
@@ -651,7 +1571,8 @@ class ErrorCorrector:
         self._numMeasurements = syndromeDetector._numMeasurements
         self._numAncillas = syndromeDetector._numAncillas
 
-    def errorCorrectCircuit(self, circuit, qregs, cregs=None, ancillas=None):
+    @_operation
+    def errorCorrectCircuit(self, circuit, qregs, cregs=None, ancillas=None, copy=False):
         """
         Creates gates implementing fault tolerant error correction for the given qubits in the given circuit.
 
@@ -663,23 +1584,24 @@ class ErrorCorrector:
             The Quantum Registers to on which to perform error correction.
         cregs : list(ClassicalRegister)
             The Classical Registers used to perform error correction, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs)`` and the syndrome correction process for the ``qregs[i]`` quantum register will use the ``cregs[i]`` classical register.
+        copy : bool, Optional
+            If ``True``, the gates are added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the gates are added to ``circuit`` in place.
         """
         if type(self._syndromeDetector) == type(None) or type(self._syndromeCorrector) == type(None):
             return None
 
-        circuit = circuit.copy()
+        if copy:
+            circuit = _timed("copy", circuit.copy)
 
         if cregs == None:
-            cregs = _makeCregsCircuit(circuit,len(qregs),self._numMeasurements)
-        
-        if ancillas == None:
-            ancillas = _makeAncillasCircuit(circuit,len(qregs),self._numAncillas)
+            cregs = self._syndromeDetector._syndromeCregsCircuit(circuit,qregs)
 
-        circuit = self._syndromeDetector.syndromeDetectCircuit(circuit,qregs,cregs,ancillas)
-        circuit = self._syndromeCorrector.syndromeCorrectCircuit(circuit,qregs,cregs)
+        self._syndromeDetector.syndromeDetectCircuit(circuit,qregs,cregs,ancillas)
+        self._syndromeCorrector.syndromeCorrectCircuit(circuit,qregs,cregs)
 
         return circuit
 
+    @_operation
     def errorCorrectDag(self, dag, qregs, cregs=None, ancillas=None):
         """
         Creates gates implementing non-fault tolerant error correction for the given qubits in the given DAG.
@@ -697,25 +1619,81 @@ class ErrorCorrector:
             return None
 
         if cregs == None:
-            cregs = _makeCregsDag(dag,len(qregs),self._numMeasurements)
-
-        if ancillas == None:
-            ancillas = _makeAncillasDag(dag,len(qregs),self._numAncillas)
+            cregs = self._syndromeDetector._syndromeCregsDag(dag,qregs)
 
         dag = self._syndromeDetector.syndromeDetectDag(dag,qregs,cregs,ancillas)
         dag = self._syndromeCorrector.syndromeCorrectDag(dag,qregs,cregs)
         
         return dag
 
+@functools.lru_cache(maxsize=None)
+def _gateName(key):
+    """
+    Returns the name of the gates matched by a key of :class:`FaultTolerantGates`, instantiating a gate class with zero parameters to find it.
+    The name of each class is only found once, so creating a :class:`FaultTolerantGates` does not instantiate any gate after the first time.
+    """
+    if isinstance(key, str):
+        return key
+    parameters = [parameter for parameter in inspect.signature(key).parameters.values() if parameter.default is inspect.Parameter.empty and parameter.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+    try:
+        return key(*[0]*len(parameters)).name
+    except Exception as error:
+        raise TranspilerError("Cannot find the name of the gate class " + key.__name__ + " by instantiating it with zero parameters; key its fault tolerant implementation by the name of the gate instead") from error
+
+_boundTemplates = {}
+
+def _boundTemplate(circuit, params):
+    """
+    Returns ``circuit`` with its parameters, in the order of ``circuit.parameters``, assigned the values ``params``.
+    The most recently used assignments of each template are kept, so a parameterized gate applied with the same values again reuses the same circuit and the same cached expansion.
+    """
+    bound = _attached(_boundTemplates, circuit, lambda circuit: collections.OrderedDict())
+    key = tuple(params)
+    if key not in bound:
+        bound[key] = circuit.assign_parameters(list(params))
+        if len(bound) > 256:
+            bound.popitem(last=False)
+    else:
+        bound.move_to_end(key)
+    return bound[key]
+
+
+def _gateBlocks(qregs):
+    """
+    Returns the code blocks each copy of a fault tolerant gate acts on, given the registers of each of its inputs.
+    """
+    return [[inputs[i] for inputs in qregs] for i in range(len(qregs[0]))]
+
+_templateInstructions = {}
+
+def _shallowCopy(operation):
+    """
+    Copies an operation of a template along with its parameters, so that setting the condition, label or parameters of the copy leaves the template unchanged, but shares its definition, which must not be modified.
+    """
+    operation = copy.copy(operation)
+    operation._params = copy.copy(operation._params)
+    return operation
+
+def _instructionIndices(circuit):
+    """
+    Returns the operations of a template circuit along with the indices of their qubits, so the template can be added to a circuit without going through ``QuantumCircuit.compose``, which copies every operation, including immutable ones.
+    """
+    qubitIndices = {qbit: i for i, qbit in enumerate(circuit.qubits)}
+    return [(instruction.operation, [qubitIndices[qbit] for qbit in instruction.qubits]) for instruction in circuit.data]
+
+
 class FaultTolerantGates:
     """
     A class for implementing fault tolerant gates for an arbitrary quantum error correction code.
 
+    Gates are looked up in a table built once, first by their class, as given by ``gate.base_class``, and then by their name, so no string is built for each gate and parameterized gates are found whatever the values of their parameters.
+    If the circuit implementing a gate has parameters, they are assigned the parameters of the gate, in the order of ``circuit.parameters``.
+
     Parameters
     ----------
-    gatesToCircuit : map(str, (QuantumCircuit, int))
+    gatesToCircuit : map(str or type, (QuantumCircuit, int))
         A map representing conversions between gates and circuits implementing fault tolerant versions of those gates. 
-        The keys of the map are the QASM label for the gate in question, given by ``gate.qasm()``.
+        The keys of the map are either the name of the gate in question, given by ``gate.name``, or a gate class such as ``CXGate``, which matches every gate of exactly that class.
         The outputs of the map are tuples of the form ``(circuit, numAncillas)``, where ``circuit`` is a fault-tolerant implementation of a gate and ``numAncillas`` is the number of ancillas qubits used in the fault-tolerant implementation of the gate.
 
     Methods
@@ -724,17 +1702,91 @@ class FaultTolerantGates:
         Adds a fault tolerant gate to the given circuit.
     addGateDag :
         Adds a fault tolerant gate to the given DAG.
+    addGatesCircuit :
+        Adds a list of fault tolerant gates to the given circuit.
+    addGatesDag :
+        Adds a list of fault tolerant gates to the given DAG.
     """
     def __init__(self, gatesToCircuit):
         self._gatesToCircuit = gatesToCircuit
-        self._gatesToDag = {}
+        self._table = {key: (circuit, numAncillas, _gateName(key)) for key, (circuit, numAncillas) in gatesToCircuit.items()}
+
+        # Gates of a class in the table are found by name too, which also covers subclasses, but a name given explicitly takes precedence.
+        self._byName = {entry[2]: entry for key, entry in self._table.items() if not isinstance(key, str)}
+        self._byName.update((key, entry) for key, entry in self._table.items() if isinstance(key, str))
+        for name, entry in self._byName.items():
+            self._table.setdefault(name, entry)
+        self._gates = list(self._byName)
+
+    def _lookup(self, gate):
+        """
+        Returns the circuit implementing ``gate``, with its parameters assigned, along with the number of ancillas and the name of the template.
+        """
+        entry = self._table.get(getattr(gate, "base_class", type(gate)))
+        if entry == None:
+            entry = self._table.get(gate.name)
+            if entry == None:
+                raise TranspilerError("No fault tolerant implementation of the gate " + gate.name)
+
+        circuit, numAncillas, name = entry
+        if circuit.num_parameters > 0:
+            circuit = _boundTemplate(circuit, gate.params)
+        return circuit, numAncillas, name
+
+    def _addCircuit(self, circuit, gate, qregs, cregs, ancillas):
+        if cregs == None:
+            cregs = _makeCregsCircuit(circuit,len(qregs[0]),gate[0].num_clbits,name="classical")
+        
+        leased = ancillas == None and gate[1] > 0
+        if ancillas == None:
+            ancillas = _leaseAncillasCircuit(circuit,len(qregs[0]),gate[1],_gateBlocks(qregs))
+        
+        qbits = _combineQregsAncillas(qregs,ancillas,singleQbit=False)
+
+        if gate[0].num_clbits > 0:
+            for i in range(len(qbits)):
+                _timed("compose", circuit.compose, gate[0], qbits[i], cregs[i], inplace=True)
+        else:
+            # Templates without clbits have no conditions to remap, so immutable operations such as unlabelled standard gates are shared, and mutable ones are copied without their definitions, which are shared as they are by the TemplateCache.
+            instructions = _attached(_templateInstructions, gate[0], _instructionIndices)
+            for i in range(len(qbits)):
+                for operation, indices in instructions:
+                    if getattr(operation, "mutable", True):
+                        operation = _shallowCopy(operation)
+                    circuit.append(operation, [qbits[i][index] for index in indices])
+                circuit.global_phase += gate[0].global_phase
+
+        if leased:
+            for i in range(len(ancillas)):
+                circuit.reset(ancillas[i])
+            ancillaPool(circuit).release(ancillas, _gateBlocks(qregs))
+
+    def _addDag(self, dag, gate, qregs, cregs, ancillas):
+        template = _templateDag(gate[0])
+        name = gate[2]
+
+        if cregs == None:
+            cregs = _makeCregsDag(dag,len(qregs[0]),template.num_clbits(),name="classical")
+        
+        leased = ancillas == None and gate[1] > 0
+        if ancillas == None:
+            ancillas = _leaseAncillasDag(dag,len(qregs[0]),gate[1],_gateBlocks(qregs))
+        
+        qbits = _combineQregsAncillas(qregs,ancillas,singleQbit=False)
 
-        for gate in gatesToCircuit:
-            self._gatesToDag[gate] = (circuit_to_dag(gatesToCircuit[gate][0]),gatesToCircuit[gate][1])
+        if template.num_clbits() > 0:
+            templateCache.expand(dag, self, name, template, qbits, cregs)
+        else:
+            templateCache.expand(dag, self, name, template, qbits)
 
-        self._gates = [gate for gate in gatesToCircuit]
+        if leased:
+            for i in range(len(ancillas)):
+                for ancilla in ancillas[i]:
+                    dag.apply_operation_back(Reset(),[ancilla])
+            ancillaPool(dag).release(ancillas, _gateBlocks(qregs))
 
-    def addGateCircuit(self, circuit, gate, qregs, cregs = None, ancillas = None):
+    @_operation
+    def addGateCircuit(self, circuit, gate, qregs, cregs = None, ancillas = None, copy = False):
         """
         Adds the specified number of fault tolerant implementations of a quantum gate to the given circuit.
 
@@ -749,31 +1801,22 @@ class FaultTolerantGates:
         cregs : list(list(ClassicalRegister)), Optional
             The Classical Registers used to perform syndrome detection, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``cregs[j]`` classical register.
         ancillas : list(list(AncillaRegister)), list(list(QuantumRegister)), Optional
-            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``ancillas[j]`` ancilla register.
+            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``ancillas[j]`` ancilla register. By default, the ancillas are leased from the :class:`AncillaPool` of ``circuit`` and are reset and returned to it afterwards.
+        copy : bool, Optional
+            If ``True``, the gates are added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the gates are added to ``circuit`` in place.
         """
         if self._gates == None or self._gatesToCircuit == None:
             return None
 
-        gate = self._gatesToCircuit[gate.qasm()]
-        
-        circuit = circuit.copy()
-
-        if cregs == None:
-            cregs = _makeCregsCircuit(circuit,len(qregs[0]),gate[0].num_clbits,name="classical")
-        
-        if ancillas == None:
-            ancillas = _makeAncillasCircuit(circuit,len(qregs[0]),gate[1])
-        
-        qbits = _combineQregsAncillas(qregs,ancillas,singleQbit=False)
+        gate = self._lookup(gate)
 
-        for i in range(len(qbits)):
-            if gate[0].num_clbits > 0:
-                circuit = circuit.compose(gate[0], qbits[i], cregs[i])
-            else:
-                circuit = circuit.compose(gate[0], qbits[i])
+        if copy:
+            circuit = _timed("copy", circuit.copy)
 
+        self._addCircuit(circuit, gate, qregs, cregs, ancillas)
         return circuit
 
+    @_operation
     def addGateDag(self, dag, gate, qregs, cregs = None, ancillas = None):
         """
         Adds the specified number of fault tolerant implementations of a quantum gate to the given DAG.
@@ -789,27 +1832,64 @@ class FaultTolerantGates:
         cregs : list(list(ClassicalRegister)), Optional
             The Classical Registers used to perform syndrome detection, if classical registers are needed. If ``cregs`` is provided, it must satisfy ``len(cregs) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``cregs[j]`` classical register.
         ancillas : list(list(AncillaRegister)), list(list(QuantumRegister)), Optional
-            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``ancillas[j]`` ancilla register.
+            The Ancilla Registers used to perform syndrome detection,, if ancilla registers are needed. If ``ancillas`` is provided, it must satisfy ``len(ancillas) == len(qregs[0])`` and the syndrome detection process for the ``qregs[i][j]`` quantum register will use the ``ancillas[j]`` ancilla register. By default, the ancillas are leased from the :class:`AncillaPool` of ``dag`` and are reset and returned to it afterwards.
         """
-        if self._gates == None or self._gatesToDag == None:
+        if self._gates == None or self._gatesToCircuit == None:
             return None
-        
-        gate = self._gatesToDag[gate.qasm()]
 
-        if cregs == None:
-            cregs = _makeCregsDag(dag,len(qregs[0]),gate[0].num_clbits(),name="classical")
-        
-        if ancillas == None:
-            ancillas = _makeAncillasDag(dag,len(qregs[0]),gate[1])
-        
-        qbits = _combineQregsAncillas(qregs,ancillas,singleQbit=False)
+        self._addDag(dag, self._lookup(gate), qregs, cregs, ancillas)
+        return dag
 
-        for i in range(len(qbits)):
-            if gate[0].num_clbits() > 0:
-                dag.compose(gate[0], qubits = qbits[i], clbits = cregs[i])
-            else:
-                dag.compose(gate[0], qubits = qbits[i])
+    @_operation
+    def addGatesCircuit(self, circuit, gates, copy = False):
+        """
+        Adds the fault tolerant implementations of a list of quantum gates to the given circuit, in order.
+
+        Parameters
+        ----------
+        circuit : QuantumCircuit
+            The circuit on which to perform the fault tolerant gates.
+        gates : list((Gate, list(QuantumRegister)))
+            The gates to implement, each given with the code blocks it acts on, one block for each qubit of the gate.
+        copy : bool, Optional
+            If ``True``, the gates are added to a copy of ``circuit`` and ``circuit`` is left unchanged. By default the gates are added to ``circuit`` in place.
+        """
+        if copy:
+            circuit = _timed("copy", circuit.copy)
+
+        for gate, qregs in gates:
+            self._addCircuit(circuit, self._lookup(gate), [[qreg] for qreg in qregs], None, None)
+        return circuit
+
+    @_operation
+    def addGatesDag(self, dag, gates):
+        """
+        Adds the fault tolerant implementations of a list of quantum gates to the given DAG, in order.
+        Consecutive gates with the same implementation acting on different code blocks are expanded together, in a single lookup of the :class:`TemplateCache`.
 
+        Parameters
+        ----------
+        dag : DAGCircuit
+            The dag on which to perform the fault tolerant gates.
+        gates : list((Gate, list(QuantumRegister)))
+            The gates to implement, each given with the code blocks it acts on, one block for each qubit of the gate.
+        """
+        run = None
+        runQregs = []
+        runBlocks = set()
+        for gate, qregs in gates:
+            entry = self._lookup(gate)
+            if run == None or entry[0] is not run[0] or not runBlocks.isdisjoint(qregs):
+                if run != None:
+                    self._addDag(dag, run, list(zip(*runQregs)), None, None)
+                run = entry
+                runQregs = []
+                runBlocks = set()
+            runQregs.append(qregs)
+            runBlocks.update(qregs)
+
+        if run != None:
+            self._addDag(dag, run, list(zip(*runQregs)), None, None)
         return dag
         
 
@@ -0,0 +1,385 @@
+"""
+The Benchmarks module contains timing and memory benchmarks for the construction routines in :mod:`BaseFaultTolerance`.
+The benchmarks are plain functions returning lists of dictionaries, so that they can be printed, plotted, or saved and compared between releases.
+"""
+
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import qiskit
+from qiskit.circuit import QuantumCircuit
+from qiskit.circuit.library import HGate, CXGate, get_standard_gate_name_mapping
+from qiskit.dagcircuit import DAGCircuit
+
+from BaseFaultTolerance import _makeCregsCircuit,_makeCregsDag,_registerIndexCircuit,_registerIndexDag
+
+
+def benchmarkRegisterAllocation(maxRegisters = 10000, step = 1000, numBits = 6):
+    """
+    Times the allocation of syndrome registers, ``step`` registers at a time, for a circuit and for a DAG.
+    Since every allocator shares an index of the register names, the cost of finding a fresh name stays flat as the number of registers grows.
+    The total cost per register also includes adding the register to the circuit or DAG, which Qiskit itself does in time proportional to the number of existing bits.
+
+    Parameters
+    ----------
+    maxRegisters : int, Optional
+        The total number of registers to allocate.
+    step : int, Optional
+        The number of registers allocated between measurements.
+    numBits : int, Optional
+        The size of each register.
+
+    Returns
+    -------
+    list(dict)
+        One entry per measurement, giving the number of registers allocated so far and the mean time per register, in seconds, of the last ``step`` allocations.
+        The ``Name`` entries time finding a fresh name only, while the ``Total`` entries time the whole allocation.
+    """
+    circuit = QuantumCircuit()
+    dag = DAGCircuit()
+
+    results = []
+    for numRegisters in range(step, maxRegisters+1, step):
+        start = time.perf_counter()
+        _makeCregsCircuit(circuit, step, numBits)
+        circuitTotal = time.perf_counter()-start
+
+        start = time.perf_counter()
+        _makeCregsDag(dag, step, numBits)
+        dagTotal = time.perf_counter()-start
+
+        start = time.perf_counter()
+        for i in range(step):
+            _registerIndexCircuit(circuit).freshName("benchmark")
+        circuitName = time.perf_counter()-start
+
+        start = time.perf_counter()
+        for i in range(step):
+            _registerIndexDag(dag).freshName("benchmark")
+        dagName = time.perf_counter()-start
+
+        results.append({
+            "registers": numRegisters,
+            "circuitName": circuitName/step,
+            "circuitTotal": circuitTotal/step,
+            "dagName": dagName/step,
+            "dagTotal": dagTotal/step
+        })
+
+    return results
+
+
+IMPORT_TIME_BUDGET = 0.1
+"""The budget, in seconds, for importing :mod:`Steane` on top of an already imported Qiskit."""
+
+CONSTRUCTION_TIME_BUDGET = 1e-4
+"""The budget, in seconds, for creating a Steane component once the shared templates have been built."""
+
+
+def _timeImport(statement):
+    script = "import sys, time\nsys.path.insert(0, %r)\nimport qiskit\nstart = time.perf_counter()\n%s\nprint(time.perf_counter()-start)" % (os.path.dirname(os.path.abspath(__file__)), statement)
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+def benchmarkStartup(repeats = 1000):
+    """
+    Measures the time taken to import :mod:`Steane` in a fresh interpreter and to create each Steane component, and compares them to :data:`IMPORT_TIME_BUDGET` and :data:`CONSTRUCTION_TIME_BUDGET`.
+
+    Parameters
+    ----------
+    repeats : int, Optional
+        The number of times each component is created to measure its mean construction time.
+
+    Returns
+    -------
+    dict
+        The import time (``"import"``), the time taken to create each component for the first time (``"firstConstruction"``) and the mean time taken to create it afterwards (``"construction"``), all in seconds, along with a list of the measurements exceeding their budget (``"overBudget"``).
+    """
+    import Steane
+
+    components = {
+        "SteaneEncoder": Steane.SteaneEncoder,
+        "SteaneFaultTolerantEncoder": lambda: Steane.SteaneFaultTolerantEncoder(2),
+        "SteaneSyndromeDetector": Steane.SteaneSyndromeDetector,
+        "SteaneSyndromeCorrector": Steane.SteaneSyndromeCorrector,
+        "SteaneErrorCorrector": Steane.SteaneErrorCorrector,
+        "SteaneFaultTolerantGates": Steane.SteaneFaultTolerantGates
+    }
+
+    results = {"import": _timeImport("import Steane"), "firstConstruction": {}, "construction": {}, "overBudget": []}
+
+    for name, component in components.items():
+        start = time.perf_counter()
+        component()
+        results["firstConstruction"][name] = time.perf_counter()-start
+
+        start = time.perf_counter()
+        for i in range(repeats):
+            component()
+        results["construction"][name] = (time.perf_counter()-start)/repeats
+
+        if results["construction"][name] > CONSTRUCTION_TIME_BUDGET:
+            results["overBudget"].append(name)
+
+    if results["import"] > IMPORT_TIME_BUDGET:
+        results["overBudget"].append("import")
+
+    return results
+
+
+def _constructionBenchmarks():
+    """
+    Returns the construction benchmarks as a map from the benchmark name to a pair of functions, for the circuit path and the DAG path.
+    Each function takes a number of blocks and returns a function performing the timed construction, so that any setup is excluded from the measurement.
+    """
+    import Steane
+
+    encoder = Steane.SteaneEncoder()
+    faultTolerantEncoder = Steane.SteaneFaultTolerantEncoder(2)
+    errorCorrector = Steane.SteaneErrorCorrector()
+    gates = Steane.SteaneFaultTolerantGates()
+
+    def encodedCircuit(numBlocks):
+        circuit = encoder.createEncoderCircuit(numBlocks)
+        return circuit, circuit.qregs[:numBlocks]
+
+    def encodedDag(numBlocks):
+        dag = encoder.createEncoderDag(numBlocks)
+        return dag, list(dag.qregs.values())[:numBlocks]
+
+    def errorCorrectCircuit(numBlocks):
+        circuit, qregs = encodedCircuit(numBlocks)
+        return lambda: errorCorrector.errorCorrectCircuit(circuit, qregs)
+
+    def errorCorrectDag(numBlocks):
+        dag, qregs = encodedDag(numBlocks)
+        return lambda: errorCorrector.errorCorrectDag(dag, qregs)
+
+    def addGateCircuit(gate):
+        def setup(numBlocks):
+            circuit, qregs = encodedCircuit(numBlocks)
+            inputs = [qregs[i::gate.num_qubits][:numBlocks//gate.num_qubits] for i in range(gate.num_qubits)]
+            return lambda: gates.addGateCircuit(circuit, gate, inputs)
+        return setup
+
+    def addGateDag(gate):
+        def setup(numBlocks):
+            dag, qregs = encodedDag(numBlocks)
+            inputs = [qregs[i::gate.num_qubits][:numBlocks//gate.num_qubits] for i in range(gate.num_qubits)]
+            return lambda: gates.addGateDag(dag, gate, inputs)
+        return setup
+
+    return {
+        "createEncoder": (lambda numBlocks: lambda: encoder.createEncoderCircuit(numBlocks), lambda numBlocks: lambda: encoder.createEncoderDag(numBlocks)),
+        "createFaultTolerantEncoder": (lambda numBlocks: lambda: faultTolerantEncoder.createEncoderCircuit(numBlocks), lambda numBlocks: lambda: faultTolerantEncoder.createEncoderDag(numBlocks)),
+        "errorCorrect": (errorCorrectCircuit, errorCorrectDag),
+        "addGateH": (addGateCircuit(HGate()), addGateDag(HGate())),
+        "addGateCX": (addGateCircuit(CXGate()), addGateDag(CXGate()))
+    }
+
+def benchmarkConstruction(blockCounts = (1, 10, 100, 1000), repeats = 3, benchmarks = None):
+    """
+    Times and memory-profiles the construction of encoders, error correction and fault tolerant gates for the Steane code, for both the circuit path and the DAG path.
+
+    Each benchmark is timed ``repeats`` times with fresh inputs, keeping the fastest time, and is then run once more under ``tracemalloc`` to find the peak memory it allocates.
+    The ``addGateCX`` benchmark applies the gate to ``numBlocks//2`` pairs of blocks, and is skipped for a single block.
+
+    Parameters
+    ----------
+    blockCounts : list(int), Optional
+        The numbers of logical blocks to construct.
+    repeats : int, Optional
+        The number of times each benchmark is timed.
+    benchmarks : list(str), Optional
+        The names of the benchmarks to run, out of ``createEncoder``, ``createFaultTolerantEncoder``, ``errorCorrect``, ``addGateH`` and ``addGateCX``. By default, all of them.
+
+    Returns
+    -------
+    list(dict)
+        One entry per benchmark, path (``"circuit"`` or ``"dag"``) and number of blocks, giving the fastest time in seconds (``"time"``) and the peak memory allocated in bytes (``"peakMemory"``).
+    """
+    allBenchmarks = _constructionBenchmarks()
+    if benchmarks == None:
+        benchmarks = list(allBenchmarks)
+
+    results = []
+    for name in benchmarks:
+        for path, setup in zip(("circuit", "dag"), allBenchmarks[name]):
+            for numBlocks in blockCounts:
+                if name == "addGateCX" and numBlocks < 2:
+                    continue
+
+                best = float("inf")
+                for i in range(repeats):
+                    construct = setup(numBlocks)
+                    start = time.perf_counter()
+                    construct()
+                    best = min(best, time.perf_counter()-start)
+
+                construct = setup(numBlocks)
+                tracemalloc.start()
+                construct()
+                peakMemory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                results.append({"benchmark": name, "path": path, "blocks": numBlocks, "time": best, "peakMemory": peakMemory})
+
+    return results
+
+
+_STANDARD_OPERATIONS = set(get_standard_gate_name_mapping())
+
+def _countOperations(circuit):
+    """
+    Counts the operations of a circuit, expanding composite instructions such as the encoder and checker through their definitions, and counting the body of a control flow operation once.
+    """
+    count = 0
+    for instruction in circuit.data:
+        operation = instruction.operation
+        blocks = getattr(operation, "blocks", ())
+        if blocks:
+            count += 1 + sum(_countOperations(block) for block in blocks if block != None)
+        elif operation.name not in _STANDARD_OPERATIONS and operation.definition != None:
+            count += _countOperations(operation.definition)
+        else:
+            count += 1
+    return count
+
+def benchmarkEncoderForms(numRepeats = (2, 3, 5), numBlocks = 10, shots = 10000, forms = ("unrolled", "compact", "loop"), faultTolerantEncoder = None):
+    """
+    Compares the forms of :class:`FaultTolerantEncoder` by the size of the circuits they build, the time taken to build them and the time taken to simulate them with :class:`StabilizerSimulator`.
+
+    Parameters
+    ----------
+    numRepeats : list(int), Optional
+        The numbers of attempts to compare.
+    numBlocks : int, Optional
+        The number of blocks encoded by each circuit.
+    shots : int, Optional
+        The number of shots simulated for each circuit.
+    forms : list(str), Optional
+        The forms to compare.
+    faultTolerantEncoder : function, Optional
+        A function taking a number of attempts and a form and returning a :class:`FaultTolerantEncoder`. By default, :class:`SteaneFaultTolerantEncoder`.
+
+    Returns
+    -------
+    list(dict)
+        One entry per form and number of attempts, giving the number of top level operations (``"operations"``), the number of operations once the encoder, checker and retry instructions are expanded (``"expandedOperations"``), the time taken to build the circuit (``"constructionTime"``) and to simulate it (``"simulationTime"``), in seconds.
+    """
+    from StabilizerSimulator import StabilizerSimulator
+
+    if faultTolerantEncoder == None:
+        import Steane
+        faultTolerantEncoder = Steane.SteaneFaultTolerantEncoder
+
+    results = []
+    for repeats in numRepeats:
+        for form in forms:
+            encoder = faultTolerantEncoder(repeats, form)
+
+            start = time.perf_counter()
+            circuit = encoder.createEncoderCircuit(numBlocks)
+            constructionTime = time.perf_counter()-start
+
+            start = time.perf_counter()
+            StabilizerSimulator(0).sample(circuit, shots)
+            simulationTime = time.perf_counter()-start
+
+            results.append({
+                "form": form,
+                "numRepeats": repeats,
+                "operations": len(circuit.data),
+                "expandedOperations": _countOperations(circuit),
+                "constructionTime": constructionTime,
+                "simulationTime": simulationTime
+            })
+
+    return results
+
+
+def saveBenchmarks(results, path):
+    """
+    Saves benchmark results as JSON, along with the versions of Python and Qiskit and the time at which they were saved.
+
+    Parameters
+    ----------
+    results : list(dict)
+        The results, as returned by :func:`benchmarkConstruction`.
+    path : str
+        The file to write.
+    """
+    metadata = {
+        "python": platform.python_version(),
+        "qiskit": qiskit.__version__,
+        "platform": platform.platform(),
+        "saved": datetime.datetime.now().isoformat()
+    }
+    with open(path, "w") as file:
+        json.dump({"metadata": metadata, "results": results}, file, indent=1)
+
+def loadBenchmarks(path):
+    """
+    Loads benchmark results saved by :func:`saveBenchmarks`.
+
+    Parameters
+    ----------
+    path : str
+        The file to read.
+
+    Returns
+    -------
+    list(dict)
+        The results.
+    """
+    with open(path) as file:
+        return json.load(file)["results"]
+
+def compareBenchmarks(baseline, current, tolerance = 0.2):
+    """
+    Compares two sets of benchmark results, matching entries by benchmark, path and number of blocks.
+
+    Parameters
+    ----------
+    baseline : list(dict) or str
+        The baseline results, or the file they were saved to.
+    current : list(dict) or str
+        The results to compare, or the file they were saved to.
+    tolerance : float, Optional
+        The relative increase in time or peak memory above which an entry is reported as a regression.
+
+    Returns
+    -------
+    list(dict)
+        One entry per benchmark present in both sets, giving the ratios of the current time and peak memory to the baseline ones (``"timeRatio"`` and ``"memoryRatio"``), and whether either exceeds ``1 + tolerance`` (``"regression"``).
+    """
+    if isinstance(baseline, str):
+        baseline = loadBenchmarks(baseline)
+    if isinstance(current, str):
+        current = loadBenchmarks(current)
+
+    key = lambda entry: (entry["benchmark"], entry["path"], entry["blocks"])
+    baselineEntries = {key(entry): entry for entry in baseline}
+
+    comparison = []
+    for entry in current:
+        if key(entry) not in baselineEntries:
+            continue
+        old = baselineEntries[key(entry)]
+        timeRatio = entry["time"]/old["time"] if old["time"] > 0 else float("inf")
+        memoryRatio = entry["peakMemory"]/old["peakMemory"] if old["peakMemory"] > 0 else float("inf")
+        comparison.append({
+            "benchmark": entry["benchmark"],
+            "path": entry["path"],
+            "blocks": entry["blocks"],
+            "timeRatio": timeRatio,
+            "memoryRatio": memoryRatio,
+            "regression": timeRatio > 1+tolerance or memoryRatio > 1+tolerance
+        })
+    return comparison
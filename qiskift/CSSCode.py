@@ -0,0 +1,424 @@
+"""
+The CSSCode module builds the components of :mod:`BaseFaultTolerance` for any CSS code from its parity-check matrices.
+The circuits are derived by Gaussian elimination over GF(2), so codes such as the Golay code or the quantum Reed-Muller codes do not need their gates to be written by hand.
+For the Steane code, the generated circuits are the same as those of :mod:`Steane`.
+"""
+
+import itertools
+
+import numpy as np
+from qiskit.circuit import QuantumCircuit,QuantumRegister
+from qiskit.circuit.library import CXGate,HGate,XGate,SGate
+
+from BaseFaultTolerance import Encoder,SyndromeDetector,SyndromeCorrector,ErrorCorrector,FaultTolerantGates,parityCheckDetector,parityCheckCorrector,_addBody
+
+
+def rowReduce(matrix):
+    """
+    Brings a binary matrix to reduced row echelon form over GF(2).
+    Each elimination step clears a column from every other row at once.
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        A binary matrix.
+
+    Returns
+    -------
+    (numpy.ndarray, list(int))
+        The reduced matrix, without its zero rows, and the pivot column of each of its rows.
+    """
+    matrix = np.array(matrix, dtype=np.uint8) & 1
+    pivots = []
+    row = 0
+    for column in range(matrix.shape[1]):
+        if row == matrix.shape[0]:
+            break
+        candidates = np.flatnonzero(matrix[row:, column])
+        if candidates.size == 0:
+            continue
+        pivot = row + candidates[0]
+        matrix[[row, pivot]] = matrix[[pivot, row]]
+
+        others = matrix[:, column].astype(bool)
+        others[row] = False
+        matrix[others] ^= matrix[row]
+
+        pivots.append(column)
+        row += 1
+    return matrix[:row], pivots
+
+def rank(matrix):
+    """
+    Computes the rank of a binary matrix over GF(2).
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        A binary matrix.
+
+    Returns
+    -------
+    int
+        The rank of ``matrix``.
+    """
+    return len(rowReduce(matrix)[1])
+
+def nullSpace(matrix):
+    """
+    Computes a basis of the null space of a binary matrix over GF(2).
+
+    Parameters
+    ----------
+    matrix : numpy.ndarray
+        A binary matrix with ``n`` columns.
+
+    Returns
+    -------
+    numpy.ndarray
+        A matrix whose rows form a basis of the vectors ``v`` of length ``n`` with ``matrix @ v == 0`` modulo 2.
+    """
+    reduced, pivots = rowReduce(matrix)
+    free = [column for column in range(reduced.shape[1]) if column not in pivots]
+    basis = np.zeros((len(free), reduced.shape[1]), dtype=np.uint8)
+    for i, column in enumerate(free):
+        basis[i, column] = 1
+        basis[i, pivots] = reduced[:, column]
+    return basis
+
+
+def _syndromeValues(checks, errors):
+    """
+    Returns the syndrome of each row of ``errors`` as an integer, with the outcome of check ``k`` in bit ``len(checks)-1-k``.
+    """
+    bits = (errors.astype(np.int64) @ checks.T.astype(np.int64)) & 1
+    return bits @ (np.int64(1) << np.arange(len(checks)-1, -1, -1, dtype=np.int64))
+
+def _lookupTable(checks, maxErrors):
+    """
+    Finds a minimum weight error for every syndrome of ``checks``, trying errors of increasing weight until every syndrome is found or more than ``maxErrors`` errors of the next weight would be needed.
+    Returns the errors packed 8 qubits to a byte, and whether each syndrome was found.
+    """
+    numChecks, numQubits = checks.shape
+    table = np.zeros((2**numChecks, (numQubits+7)//8), dtype=np.uint8)
+    found = np.zeros(2**numChecks, dtype=bool)
+    found[0] = True
+
+    for weight in range(1, numQubits+1):
+        if found.all() or _binomial(numQubits, weight) > maxErrors:
+            break
+        supports = np.array(list(itertools.combinations(range(numQubits), weight)), dtype=np.int64)
+        errors = np.zeros((len(supports), numQubits), dtype=np.uint8)
+        errors[np.arange(len(supports))[:, None], supports] = 1
+
+        syndromes, first = np.unique(_syndromeValues(checks, errors), return_index=True)
+        new = ~found[syndromes]
+        table[syndromes[new]] = np.packbits(errors[first[new]], axis=1, bitorder="little")
+        found[syndromes[new]] = True
+
+    return table, found
+
+def _binomial(n, k):
+    result = 1
+    for i in range(k):
+        result = result*(n-i)//(i+1)
+    return result
+
+
+class CSSCode:
+    """
+    A CSS code, given by the parity-check matrices of its X-type and Z-type stabilizers.
+
+    The syndrome register of a code block holds the outcome of X-type check ``k`` in bit ``len(xChecks)-1-k`` and the outcome of Z-type check ``k`` in bit ``len(xChecks)+len(zChecks)-1-k``, as for the Steane code.
+    The circuits of :meth:`syndromeCorrector` and :meth:`errorCorrector` only correct single-qubit errors, even for codes of distance greater than 3 such as the Golay and Reed-Muller codes. Errors of higher weight can be corrected from measured syndromes with :meth:`lookup`.
+
+    Parameters
+    ----------
+    xChecks : numpy.ndarray
+        The parity-check matrix :math:`H_X` of the X-type stabilizers, which detect :math:`Z` errors. Each row gives the qubits on which a stabilizer acts.
+    zChecks : numpy.ndarray
+        The parity-check matrix :math:`H_Z` of the Z-type stabilizers, which detect :math:`X` errors. It must satisfy :math:`H_X H_Z^T = 0` over GF(2).
+    name : str, Optional
+        The name of the code, used to name its circuits.
+    maxTableChecks : int, Optional
+        The largest number of checks of a single type for which a syndrome lookup table is precomputed.
+    maxTableErrors : int, Optional
+        The largest number of errors of a single weight searched when precomputing a syndrome lookup table.
+
+    Attributes
+    ----------
+    numQubits : int
+        The number of physical qubits of a code block.
+    numLogical : int
+        The number of logical qubits of a code block.
+    xLookup : numpy.ndarray
+        A minimum weight :math:`X` error for each syndrome of the Z-type checks, packed 8 qubits to a byte, or ``None`` if there are more than ``maxTableChecks`` Z-type checks.
+    zLookup : numpy.ndarray
+        A minimum weight :math:`Z` error for each syndrome of the X-type checks, as for ``xLookup``.
+
+    Methods
+    -------
+    encoder :
+        Creates an encoder for the logical :math:`|0\\rangle` state.
+    syndromeDetector :
+        Creates a syndrome detector measuring every check.
+    syndromeCorrector :
+        Creates a syndrome corrector for single-qubit errors.
+    errorCorrector :
+        Creates an error corrector combining the syndrome detector and corrector.
+    faultTolerantGates :
+        Creates the transversal gates of the code.
+    lookup :
+        Finds the corrections for an array of syndrome register values.
+    """
+    def __init__(self, xChecks, zChecks, name = "CSS", maxTableChecks = 24, maxTableErrors = 2**20):
+        self.xChecks = np.array(xChecks, dtype=np.uint8) & 1
+        self.zChecks = np.array(zChecks, dtype=np.uint8) & 1
+        self.name = name
+
+        if self.xChecks.shape[1] != self.zChecks.shape[1]:
+            raise ValueError("The X and Z parity-check matrices must have the same number of columns")
+        if ((self.xChecks.astype(np.int64) @ self.zChecks.T.astype(np.int64)) & 1).any():
+            raise ValueError("The X-type and Z-type stabilizers do not commute")
+
+        self.numQubits = self.xChecks.shape[1]
+        self.numLogical = self.numQubits - rank(self.xChecks) - rank(self.zChecks)
+
+        self.xLookup = self.zLookup = None
+        self._xFound = self._zFound = None
+        if len(self.zChecks) <= maxTableChecks:
+            self.xLookup, self._xFound = _lookupTable(self.zChecks, maxTableErrors)
+        if len(self.xChecks) <= maxTableChecks:
+            self.zLookup, self._zFound = _lookupTable(self.xChecks, maxTableErrors)
+
+        self._templates = {}
+
+    def _template(self, name, build):
+        if name not in self._templates:
+            self._templates[name] = build()
+        return self._templates[name]
+
+    def _encoderTemplate(self, flat):
+        # The logical |0> state is the uniform superposition over the X-type stabilizers applied to |0...0>, prepared by putting each pivot qubit of H_X in the |+> state and copying it onto the rest of its row.
+        reduced, pivots = rowReduce(self.xChecks)
+
+        qregister = QuantumRegister(size = self.numQubits)
+        encoder = QuantumCircuit(qregister, name = self.name + " Encoder")
+        encoder.h([qregister[pivot] for pivot in pivots])
+        for row in reversed(range(len(pivots))):
+            for target in np.flatnonzero(reduced[row]):
+                if target != pivots[row]:
+                    encoder.cx(qregister[pivots[row]], qregister[int(target)])
+
+        qregister = QuantumRegister(size = self.numQubits)
+        encoderCircuit = QuantumCircuit(qregister)
+        _addBody(encoderCircuit, encoder, qregister, flat)
+        return encoderCircuit
+
+    def _detectorTemplate(self):
+        return parityCheckDetector(self.xChecks.tolist(), self.zChecks.tolist(), name = self.name + " Syndrome Detection")
+
+    def _transversalTemplate(self, name, apply, flat, numBlocks = 1):
+        gateRegs = [QuantumRegister(self.numQubits) for i in range(numBlocks)]
+        gate = QuantumCircuit(*gateRegs, name = name)
+        apply(gate, *gateRegs)
+
+        regs = [QuantumRegister(self.numQubits) for i in range(numBlocks)]
+        circuit = QuantumCircuit(*regs)
+        _addBody(circuit, gate, [qbit for reg in regs for qbit in reg], flat)
+        return circuit
+
+    def _isStabilizer(self, checks, vector):
+        return rank(np.vstack([checks, vector])) == rank(checks)
+
+    def transversalGates(self):
+        """
+        Finds which gates of :class:`FaultTolerantGates` are transversal for this code.
+        The CNOT gate is transversal for every CSS code. The X gate is transversal if :math:`X^{\\otimes n}` commutes with the stabilizers without being one.
+        The H gate is transversal if, in addition, the code is self-dual, so that :math:`H_X` and :math:`H_Z` have the same row space. The S gate is transversal if, in addition, every X-type stabilizer has a weight divisible by 4, and is implemented by :math:`S^{\\otimes n}` or :math:`(S^\\dagger)^{\\otimes n}` depending on :math:`n` modulo 4.
+
+        Returns
+        -------
+        list(str)
+            The names of the transversal gates.
+        """
+        gates = [CXGate().name]
+        ones = np.ones(self.numQubits, dtype=np.uint8)
+        if self.numLogical != 1 or (self.zChecks.sum(axis=1) % 2).any() or self._isStabilizer(self.xChecks, ones):
+            return gates
+        gates.append(XGate().name)
+
+        if not rank(self.xChecks) == rank(self.zChecks) == rank(np.vstack([self.xChecks, self.zChecks])):
+            return gates
+        gates.append(HGate().name)
+
+        # The stabilizers of a self-dual code are self-orthogonal, so they all have weights divisible by 4 if the generators do.
+        if self.numQubits % 2 == 1 and not (self.xChecks.sum(axis=1) % 4).any():
+            gates.append(SGate().name)
+        return gates
+
+    def _gateTemplates(self, flat):
+        gates = self.transversalGates()
+        templates = {CXGate: (self._transversalTemplate("CNOT", lambda circuit, control, target: circuit.cx(control, target), flat, 2), 0)}
+
+        if XGate().name in gates:
+            templates[XGate] = (self._transversalTemplate("X", lambda circuit, qreg: circuit.x(qreg), flat), 0)
+        if HGate().name in gates:
+            templates[HGate] = (self._transversalTemplate("H", lambda circuit, qreg: circuit.h(qreg), flat), 0)
+        if SGate().name in gates:
+            def s(circuit, qreg):
+                circuit.s(qreg)
+                if self.numQubits % 4 == 3:
+                    circuit.z(qreg)
+            templates[SGate] = (self._transversalTemplate("S", s, flat), 0)
+        return templates
+
+    def encoder(self, flat = False):
+        """
+        Creates an encoder for the logical :math:`|0\\rangle` state of every logical qubit of a block.
+
+        Parameters
+        ----------
+        flat : bool, Optional
+            If ``True``, the encoder is made of native gates rather than wrapped in a single labelled gate, so circuits using it can be run without ``decompose``.
+
+        Returns
+        -------
+        Encoder
+            The encoder.
+        """
+        return Encoder(self._template(("encoder", flat), lambda: self._encoderTemplate(flat)), 0)
+
+    def syndromeDetector(self, ringSize = None, keepRounds = ()):
+        """
+        Creates a syndrome detector measuring every check with its own ancilla qubit, with the interactions scheduled into parallel layers by :func:`scheduleChecks`.
+
+        Parameters
+        ----------
+        ringSize : int, Optional
+            If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`.
+        keepRounds : list(int), Optional
+            The rounds whose syndromes are measured into classical registers which are never reused.
+
+        Returns
+        -------
+        SyndromeDetector
+            The syndrome detector.
+        """
+        return SyndromeDetector(self._template("detector", self._detectorTemplate), len(self.xChecks)+len(self.zChecks), ringSize, keepRounds)
+
+    def syndromeCorrector(self):
+        """
+        Creates a syndrome corrector for single-qubit errors, as generated by :func:`parityCheckCorrector`.
+
+        Returns
+        -------
+        SyndromeCorrector
+            The syndrome corrector.
+        """
+        return SyndromeCorrector(self._template("corrector", lambda: parityCheckCorrector(self.xChecks.tolist(), self.zChecks.tolist(), name = self.name + " Syndrome Correction")))
+
+    def errorCorrector(self, ringSize = None, keepRounds = ()):
+        """
+        Creates an error corrector combining :meth:`syndromeDetector` and :meth:`syndromeCorrector`.
+
+        Parameters
+        ----------
+        ringSize : int, Optional
+            If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`.
+        keepRounds : list(int), Optional
+            The rounds whose syndromes are measured into classical registers which are never reused.
+
+        Returns
+        -------
+        ErrorCorrector
+            The error corrector.
+        """
+        return ErrorCorrector(self.syndromeDetector(ringSize, keepRounds), self.syndromeCorrector())
+
+    def faultTolerantGates(self, flat = False):
+        """
+        Creates the transversal gates found by :meth:`transversalGates`.
+
+        Parameters
+        ----------
+        flat : bool, Optional
+            If ``True``, each gate is made of native gates rather than wrapped in a single labelled gate, so circuits using it can be run without ``decompose``.
+
+        Returns
+        -------
+        FaultTolerantGates
+            The gates.
+        """
+        return FaultTolerantGates(dict(self._template(("gates", flat), lambda: self._gateTemplates(flat))))
+
+    def lookup(self, syndromes):
+        """
+        Finds the minimum weight corrections for an array of syndrome register values.
+
+        Parameters
+        ----------
+        syndromes : numpy.ndarray
+            An integer array of syndrome register values.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            The :math:`X` and :math:`Z` corrections for each value, packed 8 qubits to a byte along an extra last axis, and whether a correction was found for both halves of each value.
+        """
+        if self.xLookup is None or self.zLookup is None:
+            raise ValueError("The syndrome lookup tables of the " + self.name + " code were not precomputed")
+
+        syndromes = np.asarray(syndromes, dtype=np.int64)
+        xSyndromes = syndromes >> len(self.xChecks)
+        zSyndromes = syndromes & ((1 << len(self.xChecks)) - 1)
+        return self.xLookup[xSyndromes], self.zLookup[zSyndromes], self._xFound[xSyndromes] & self._zFound[zSyndromes]
+
+
+def steaneCode():
+    """
+    Creates the Steane [[7,1,3]] code.
+
+    Returns
+    -------
+    CSSCode
+        The code.
+    """
+    checks = [[1,0,0,0,1,1,1],[0,1,0,1,0,1,1],[0,0,1,1,1,0,1]]
+    return CSSCode(checks, checks, name = "Steane")
+
+def golayCode():
+    """
+    Creates the Golay [[23,1,7]] code, whose X-type and Z-type stabilizers both form the doubly even [23,11,8] dual of the cyclic Golay code with generator polynomial :math:`1+x^2+x^4+x^5+x^6+x^{10}+x^{11}`.
+
+    Returns
+    -------
+    CSSCode
+        The code.
+    """
+    polynomial = [1,0,1,0,1,1,1,0,0,0,1,1]
+    generator = np.zeros((12, 23), dtype=np.uint8)
+    for i in range(12):
+        generator[i, i:i+12] = polynomial
+    checks = nullSpace(generator)
+    return CSSCode(checks, checks, name = "Golay")
+
+def reedMullerCode(m = 4):
+    """
+    Creates the quantum Reed-Muller :math:`[[2^m-1,1,3]]` code.
+    Its X-type stabilizers are the degree one monomials of the punctured Reed-Muller code on :math:`m` variables, and its Z-type stabilizers are the monomials of degree one to :math:`m-2`.
+
+    Parameters
+    ----------
+    m : int, Optional
+        The number of variables, at least 3.
+
+    Returns
+    -------
+    CSSCode
+        The code.
+    """
+    points = (np.arange(1, 2**m)[None, :] >> np.arange(m)[:, None]) & 1
+    xChecks = points.astype(np.uint8)
+    zChecks = [np.bitwise_and.reduce(points[list(monomial)], axis=0) for degree in range(1, m-1) for monomial in itertools.combinations(range(m), degree)]
+    return CSSCode(xChecks, np.array(zChecks, dtype=np.uint8), name = "Reed-Muller")
@@ -0,0 +1,417 @@
+"""
+The Concatenation module builds concatenated codes, in which every qubit of a code block is itself a code block of the same code one level down.
+The components of a level :math:`L` code are built from the components of the level 1 code: each template of the level 1 code is lifted to level :math:`L` by replacing each of its qubits with a level :math:`L-1` block and each of its gates with the level :math:`L-1` implementation of that gate.
+Every lifted gadget is a single instruction whose definition refers to the gadgets one level down, so each distinct gadget is built once and shared by reference. Building a level :math:`L` component takes time and memory proportional to the number of distinct gadgets rather than to the :math:`7^L` qubits of a Steane block, and the physical circuit is only written out by :func:`flatten`.
+"""
+
+import copy
+
+from qiskit.circuit import QuantumCircuit, QuantumRegister, AncillaRegister, ClassicalRegister, Instruction, Clbit, CircuitInstruction
+
+from BaseFaultTolerance import Encoder, FaultTolerantEncoder, SyndromeDetector, SyndromeCorrector, ErrorCorrector, FaultTolerantGates, _registerIndexCircuit
+
+
+# The operations left in place by flatten, which every simulator and noise model in qiskift understands.
+PHYSICAL_OPERATIONS = frozenset(["id", "x", "y", "z", "h", "s", "sdg", "cx", "cz", "swap", "measure", "reset", "barrier"])
+
+_PAULIS = frozenset(["x", "y", "z"])
+
+# Logical gates without a template of their own, written in terms of other logical gates on the blocks given by index.
+_DERIVED = {
+    "sdg": [("s", (0,)), ("s", (0,)), ("s", (0,))],
+    "cz": [("h", (1,)), ("cx", (0, 1)), ("h", (1,))],
+    "swap": [("cx", (0, 1)), ("cx", (1, 0)), ("cx", (0, 1))]
+}
+
+
+class _Gadget(Instruction):
+    """
+    An instruction whose definition is shared by every copy of it.
+    Qiskit copies the instructions of a circuit whenever it composes the circuit into another, and copying an ordinary instruction copies its whole definition, so the definitions of nested gadgets are shared rather than copied. As for the templates of :mod:`BaseFaultTolerance`, a definition must not be modified once the gadget is in use.
+    """
+    def __deepcopy__(self, memo = None):
+        gadget = copy.copy(self)
+        gadget._params = copy.copy(self._params)
+        return gadget
+
+def _gadget(name, definition):
+    gadget = _Gadget(name, definition.num_qubits, definition.num_clbits, [])
+    gadget.definition = definition
+    return gadget
+
+
+def flatten(circuit, basis = PHYSICAL_OPERATIONS):
+    """
+    Writes out a circuit in terms of physical operations, by recursively replacing every other instruction with its definition.
+
+    Conditions within definitions are mapped onto the classical bits the instruction acts on. A condition on a whole register of a definition is mapped onto a register of the flattened circuit with the same bits, which is added to the circuit if it does not have one.
+
+    Parameters
+    ----------
+    circuit : QuantumCircuit
+        The circuit to flatten.
+    basis : set(str), Optional
+        The names of the operations to leave in place.
+
+    Returns
+    -------
+    QuantumCircuit
+        The flattened circuit, on the same qubits, clbits and registers as ``circuit``.
+    """
+    flat = QuantumCircuit(circuit.qubits, circuit.clbits, *circuit.qregs, *circuit.cregs, name = circuit.name, global_phase = circuit.global_phase, metadata = circuit.metadata)
+    registers = {tuple(register): register for register in flat.cregs}
+
+    def mapCondition(condition, clbitMap):
+        target, value = condition
+        if isinstance(target, Clbit):
+            return (clbitMap[target], value)
+
+        bits = tuple(clbitMap[clbit] for clbit in target)
+        if bits not in registers:
+            index = _registerIndexCircuit(flat)
+            registers[bits] = ClassicalRegister(bits = list(bits), name = index.freshName("condition"))
+            flat.add_register(registers[bits])
+            index.added(False)
+        return (registers[bits], value)
+
+    def add(definition, qubits, clbits):
+        qubitMap = dict(zip(definition.qubits, qubits))
+        clbitMap = dict(zip(definition.clbits, clbits))
+        for instruction in definition.data:
+            operation = instruction.operation
+            mappedQubits = [qubitMap[qubit] for qubit in instruction.qubits]
+            mappedClbits = [clbitMap[clbit] for clbit in instruction.clbits]
+
+            if operation.name in basis or operation.definition == None:
+                condition = getattr(operation, "condition", None)
+                if condition != None:
+                    operation = copy.copy(operation)
+                    operation.condition = mapCondition(condition, clbitMap)
+                flat._append(CircuitInstruction(operation, mappedQubits, mappedClbits))
+            elif getattr(operation, "condition", None) != None:
+                raise ValueError("Cannot flatten the conditional instruction " + operation.name)
+            else:
+                add(operation.definition, mappedQubits, mappedClbits)
+
+    add(circuit, circuit.qubits, circuit.clbits)
+    return flat
+
+
+class ConcatenatedCode:
+    """
+    A concatenated code, built from the components of a level 1 code.
+
+    A level :math:`l` block consists of :math:`n` level :math:`l-1` blocks, where :math:`n` is the size of a level 1 block, so it has :math:`n^l` physical qubits. Qubit ``q`` of a level :math:`l` block belongs to the level :math:`l-1` block ``q//n**(l-1)``.
+    Each template of the level 1 code is lifted to level :math:`l` by applying the level :math:`l-1` implementation of each of its gates to the level :math:`l-1` blocks its qubits are replaced with. The qubits of the encoder and the ancillas of the syndrome detector are first encoded into level :math:`l-1` blocks, and measuring an ancilla block measures the parity of its qubits into a single clbit, through an extra ancilla qubit.
+
+    Error correction at level :math:`l` first corrects each of the :math:`n` level :math:`l-1` blocks with the level :math:`l-1` error corrector, then measures and corrects the level :math:`l` syndrome. The syndrome register of a level :math:`l` block holds the level :math:`l` syndrome in its first bits, followed by the syndromes of the lower levels, which the lower level correctors use and overwrite for each level :math:`l-1` block in turn.
+    The ancillas of a level :math:`l` syndrome detector are, in order, the level :math:`l-1` blocks replacing the ancillas of the level 1 syndrome detector, the parity qubit, and the ancillas of the level :math:`l-1` syndrome detector. Every gadget resets the ancillas it uses before it ends.
+
+    The level 1 code must have an :class:`Encoder` without ancillas or measurements, gates without ancillas, and a syndrome corrector made of conditional Pauli gates, as the codes of :mod:`Steane` and :mod:`CSSCode` do. Its logical :math:`X`, :math:`Y` and :math:`Z` operators must be the transversal Pauli operators wherever the gates do not give them, and its logical :math:`Z` operator must act on every qubit, so that the parity of a block is its logical outcome.
+    Reading out an ancilla block through its parity is not fault tolerant, so, as for the level 1 error correctors of :mod:`Steane`, the error correction of every level above the first is not fault tolerant either.
+
+    Parameters
+    ----------
+    encoder : Encoder
+        The encoder of the level 1 code.
+    errorCorrector : ErrorCorrector
+        The error corrector of the level 1 code.
+    gates : FaultTolerantGates
+        The gates of the level 1 code.
+    level : int
+        The level of concatenation.
+
+    Attributes
+    ----------
+    level : int
+        The level of concatenation.
+    numQubits : int
+        The number of physical qubits of a block.
+
+    Methods
+    -------
+    encoder :
+        Creates an encoder for the logical :math:`|0\\rangle` state.
+    syndromeDetector :
+        Creates a syndrome detector correcting the lower levels and measuring the syndrome of the top level.
+    syndromeCorrector :
+        Creates a syndrome corrector for the top level.
+    errorCorrector :
+        Creates an error corrector combining the syndrome detector and corrector.
+    faultTolerantGates :
+        Creates the gates of the code.
+
+    Examples
+    --------
+    >>> code = ConcatenatedCode(SteaneEncoder(), SteaneErrorCorrector(), SteaneFaultTolerantGates(), 3)
+    >>> ftDag = FaultTolerance(code.encoder(), code.errorCorrector(), code.faultTolerantGates()).run(dag)
+    """
+    def __init__(self, encoder, errorCorrector, gates, level):
+        if level < 1:
+            raise ValueError("The level of concatenation must be at least 1")
+        if isinstance(encoder, FaultTolerantEncoder) or encoder._numAncillas > 0 or encoder._encoderCircuit.num_clbits > 0:
+            raise ValueError("Concatenation needs an encoder without ancillas or measurements")
+        if any(numAncillas > 0 for template, numAncillas, name in gates._byName.values()):
+            raise ValueError("Concatenation needs gates without ancillas")
+
+        self.level = level
+        self._blockSize = encoder._encoderCircuit.num_qubits
+        self.numQubits = self._blockSize**level
+
+        self._encoder = flatten(encoder._encoderCircuit)
+        self._detector = flatten(errorCorrector._syndromeDetector._detectorCircuit)
+        self._numDetectorAncillas = errorCorrector._numAncillas
+        self._corrector = flatten(errorCorrector._syndromeCorrector._correctorCircuit)
+        self._gates = {name: flatten(template) for name, (template, numAncillas, key) in gates._byName.items()}
+
+        self._gadgets = {}
+        self._templates = {}
+
+    def _size(self, level):
+        return self._blockSize**level
+
+    def _numAncillas(self, level):
+        if level == 1:
+            return self._numDetectorAncillas
+        return self._numDetectorAncillas*self._size(level-1) + 1 + self._numAncillas(level-1)
+
+    def _numClbits(self, level):
+        return self._detector.num_clbits*level
+
+    def _memoized(self, key, build):
+        if key not in self._gadgets:
+            self._gadgets[key] = build()
+        return self._gadgets[key]
+
+    def _blocks(self, register, level, indices):
+        size = self._size(level)
+        return [qubit for index in indices for qubit in register[index*size:(index+1)*size]]
+
+    def _lift(self, template, level, prepare = ()):
+        """
+        Lifts a physical level 1 template to ``level``, replacing each of its qubits with a block of the level below.
+        The blocks of the qubits in ``prepare`` are first encoded, and a parity qubit is added after the blocks if the template measures any qubit.
+        """
+        indices = {qubit: i for i, qubit in enumerate(template.qubits)}
+        blocks = QuantumRegister(template.num_qubits*self._size(level-1), "blocks")
+        measures = any(instruction.operation.name == "measure" for instruction in template.data)
+        parity = [QuantumRegister(1, "parity")] if measures else []
+        lifted = QuantumCircuit(blocks, *parity, list(template.clbits), *template.cregs)
+
+        for qubit in prepare:
+            lifted._append(CircuitInstruction(self._encoderGadget(level-1), self._blocks(blocks, level-1, [indices[qubit]]), []))
+
+        for instruction in template.data:
+            operation = instruction.operation
+            qubits = self._blocks(blocks, level-1, [indices[qubit] for qubit in instruction.qubits])
+
+            if operation.name in ("barrier", "id"):
+                continue
+            elif operation.name == "measure":
+                lifted._append(CircuitInstruction(self._parityGadget(level-1), qubits + [parity[0][0]], instruction.clbits))
+            elif getattr(operation, "condition", None) != None:
+                if operation.name not in _PAULIS:
+                    raise ValueError("Only conditional Pauli gates can be lifted, not " + operation.name)
+                for qubit in qubits:
+                    lifted._append(CircuitInstruction(operation, [qubit], []))
+            elif operation.name == "reset":
+                raise ValueError("Resets cannot be lifted")
+            else:
+                lifted._append(CircuitInstruction(self._gateGadget(level-1, operation.name), qubits, []))
+
+        return lifted
+
+    def _gateGadget(self, level, name):
+        def build():
+            size = self._size(level)
+            if name in self._gates:
+                definition = self._gates[name] if level == 1 else self._lift(self._gates[name], level)
+            elif name in _PAULIS:
+                definition = QuantumCircuit(size)
+                getattr(definition, name)(range(size))
+            elif name in _DERIVED:
+                numBlocks = 1 + max(max(blocks) for gate, blocks in _DERIVED[name])
+                qreg = QuantumRegister(numBlocks*size)
+                definition = QuantumCircuit(qreg)
+                for gate, blocks in _DERIVED[name]:
+                    definition._append(CircuitInstruction(self._gateGadget(level, gate), self._blocks(qreg, level, blocks), []))
+            else:
+                raise ValueError("The concatenated code has no implementation of the gate " + name)
+            return _gadget(name + "_L" + str(level), definition)
+        return self._memoized(("gate", level, name), build)
+
+    def _parityGadget(self, level):
+        def build():
+            qreg = QuantumRegister(self._size(level))
+            parity = QuantumRegister(1, "parity")
+            creg = ClassicalRegister(1)
+            definition = QuantumCircuit(qreg, parity, creg)
+            for qubit in qreg:
+                definition.cx(qubit, parity[0])
+            definition.measure(parity[0], creg[0])
+            definition.reset(parity[0])
+            return _gadget("parity_L" + str(level), definition)
+        return self._memoized(("parity", level), build)
+
+    def _encoderGadget(self, level):
+        def build():
+            definition = self._encoder if level == 1 else self._lift(self._encoder, level, self._encoder.qubits)
+            return _gadget("encoder_L" + str(level), definition)
+        return self._memoized(("encoder", level), build)
+
+    def _correctorGadget(self, level):
+        def build():
+            definition = self._corrector if level == 1 else self._lift(self._corrector, level)
+            return _gadget("corrector_L" + str(level), definition)
+        return self._memoized(("corrector", level), build)
+
+    def _detectorGadget(self, level):
+        def build():
+            data = QuantumRegister(self._size(level), "data")
+            ancillas = QuantumRegister(self._numAncillas(level), "ancilla")
+            syndrome = ClassicalRegister(self._detector.num_clbits, "syndrome")
+
+            if level == 1:
+                definition = QuantumCircuit(data, ancillas, syndrome)
+                definition.compose(self._detector, data[:] + ancillas[:], syndrome, inplace = True)
+                definition.reset(ancillas)
+                return _gadget("detector_L1", definition)
+
+            inner = ClassicalRegister(self._numClbits(level-1), "inner")
+            definition = QuantumCircuit(data, ancillas, syndrome, inner)
+
+            numLifted = self._numDetectorAncillas*self._size(level-1)
+            innerAncillas = ancillas[numLifted+1:]
+            for block in range(self._blockSize):
+                qubits = self._blocks(data, level-1, [block])
+                definition._append(CircuitInstruction(self._detectorGadget(level-1), qubits + innerAncillas, inner[:]))
+                definition._append(CircuitInstruction(self._correctorGadget(level-1), qubits, inner[:self._detector.num_clbits]))
+
+            prepare = self._detector.qubits[self._blockSize:]
+            lifted = self._lift(self._detector, level, prepare)
+            definition.compose(lifted, data[:] + ancillas[:numLifted+1], syndrome, inplace = True)
+            definition.reset(ancillas)
+            return _gadget("detector_L" + str(level), definition)
+        return self._memoized(("detector", level), build)
+
+    def _template(self, name, build):
+        if name not in self._templates:
+            self._templates[name] = build()
+        return self._templates[name]
+
+    def _encoderTemplate(self):
+        qreg = QuantumRegister(self.numQubits)
+        circuit = QuantumCircuit(qreg)
+        circuit._append(CircuitInstruction(self._encoderGadget(self.level), qreg[:], []))
+        return circuit
+
+    def _detectorTemplate(self):
+        qreg = QuantumRegister(self.numQubits)
+        areg = AncillaRegister(self._numAncillas(self.level))
+        creg = ClassicalRegister(self._numClbits(self.level))
+        circuit = QuantumCircuit(qreg, areg, creg)
+        circuit._append(CircuitInstruction(self._detectorGadget(self.level), qreg[:] + areg[:], creg[:]))
+        return circuit
+
+    def _correctorTemplate(self):
+        qreg = QuantumRegister(self.numQubits)
+        creg = ClassicalRegister(self._numClbits(self.level))
+        circuit = QuantumCircuit(qreg, creg)
+        circuit._append(CircuitInstruction(self._correctorGadget(self.level), qreg[:], creg[:self._detector.num_clbits]))
+        return circuit
+
+    def _gateTemplates(self):
+        templates = {}
+        for key, template in self._gates.items():
+            regs = [QuantumRegister(self.numQubits) for i in range(template.num_qubits//self._blockSize)]
+            circuit = QuantumCircuit(*regs)
+            circuit._append(CircuitInstruction(self._gateGadget(self.level, key), [qubit for reg in regs for qubit in reg], []))
+            templates[key] = (circuit, 0)
+        return templates
+
+    def encoder(self):
+        """
+        Creates an encoder for the logical :math:`|0\\rangle` state of a block.
+
+        Returns
+        -------
+        Encoder
+            The encoder.
+        """
+        return Encoder(self._template("encoder", self._encoderTemplate), 0)
+
+    def syndromeDetector(self, ringSize = None, keepRounds = ()):
+        """
+        Creates a syndrome detector which corrects every lower level block and then measures the syndrome of the top level.
+
+        Parameters
+        ----------
+        ringSize : int, Optional
+            If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`.
+        keepRounds : list(int), Optional
+            The rounds whose syndromes are measured into classical registers which are never reused.
+
+        Returns
+        -------
+        SyndromeDetector
+            The syndrome detector.
+        """
+        return SyndromeDetector(self._template("detector", self._detectorTemplate), self._numAncillas(self.level), ringSize, keepRounds)
+
+    def syndromeCorrector(self):
+        """
+        Creates a syndrome corrector for the top level, applying the lower level logical Pauli operators chosen by the level 1 syndrome corrector.
+
+        Returns
+        -------
+        SyndromeCorrector
+            The syndrome corrector.
+        """
+        return SyndromeCorrector(self._template("corrector", self._correctorTemplate))
+
+    def errorCorrector(self, ringSize = None, keepRounds = ()):
+        """
+        Creates an error corrector combining :meth:`syndromeDetector` and :meth:`syndromeCorrector`.
+
+        Parameters
+        ----------
+        ringSize : int, Optional
+            If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`.
+        keepRounds : list(int), Optional
+            The rounds whose syndromes are measured into classical registers which are never reused.
+
+        Returns
+        -------
+        ErrorCorrector
+            The error corrector.
+        """
+        return ErrorCorrector(self.syndromeDetector(ringSize, keepRounds), self.syndromeCorrector())
+
+    def faultTolerantGates(self):
+        """
+        Creates the gates of the code, one for each gate of the level 1 code.
+
+        Returns
+        -------
+        FaultTolerantGates
+            The gates.
+        """
+        return FaultTolerantGates(dict(self._template("gates", self._gateTemplates)))
+
+
+def concatenatedSteaneCode(level):
+    """
+    Creates the Steane code concatenated ``level`` times, with :math:`7^{level}` qubits per block.
+
+    Parameters
+    ----------
+    level : int
+        The level of concatenation.
+
+    Returns
+    -------
+    ConcatenatedCode
+        The code.
+    """
+    from Steane import SteaneEncoder, SteaneErrorCorrector, SteaneFaultTolerantGates
+    return ConcatenatedCode(SteaneEncoder(), SteaneErrorCorrector(), SteaneFaultTolerantGates(), level)
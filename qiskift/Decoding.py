@@ -0,0 +1,305 @@
+"""
+The Decoding module interprets the measurement results of error corrected circuits.
+The decoders are built from the same syndrome table that a :class:`SyndromeCorrector` applies in the circuit, and work on whole arrays of shots at once using NumPy.
+"""
+
+import numpy as np
+from qiskit.circuit import ClassicalRegister
+
+
+class SyndromeTable:
+    """
+    A lookup table of the corrections a syndrome corrector applies for each syndrome value.
+    Only the syndrome values the corrector acts on are stored, in sorted order, so the size of the table is proportional to the size of the corrector circuit rather than to the :math:`2^{numBits}` possible syndrome values.
+
+    Parameters
+    ----------
+    syndromeCorrector : SyndromeCorrector
+        The syndrome corrector to read the table from. Its circuit must consist of X, Y and Z gates conditioned on the value of its classical register, which may have at most 63 bits.
+
+    Attributes
+    ----------
+    values : numpy.ndarray
+        The sorted ``int64`` syndrome values for which the corrector applies a correction.
+    xCorrections : numpy.ndarray
+        A boolean array of shape ``(len(values), numQubits)``. ``xCorrections[i, q]`` is ``True`` if the corrector applies an X (or Y) correction to qubit ``q`` for the syndrome value ``values[i]``.
+    zCorrections : numpy.ndarray
+        The same as ``xCorrections``, for Z (or Y) corrections.
+    xSyndromes : numpy.ndarray
+        An array of shape ``(numQubits, numBits)`` giving, for each qubit, the syndrome bits for which the corrector applies an X correction to that qubit alone.
+
+    Methods
+    -------
+    lookup :
+        Finds the corrections for an array of syndrome values.
+    """
+    MAX_SYNDROME_BITS = 63
+
+    def __init__(self, syndromeCorrector):
+        circuit = syndromeCorrector._correctorCircuit
+        self.numQubits = circuit.num_qubits
+        self.numBits = circuit.num_clbits
+        if self.numBits > self.MAX_SYNDROME_BITS:
+            raise ValueError("A syndrome table can only hold syndromes of at most " + str(self.MAX_SYNDROME_BITS) + " bits, but the syndrome corrector has " + str(self.numBits))
+
+        corrections = {}
+        for instruction in circuit.data:
+            operation = instruction.operation
+            if operation.condition == None or not isinstance(operation.condition[0], ClassicalRegister) or operation.name not in ("x", "y", "z"):
+                raise ValueError("The syndrome corrector may only contain X, Y and Z gates conditioned on its register, not " + operation.name)
+
+            value = int(operation.condition[1])
+            qubit = circuit.find_bit(instruction.qubits[0]).index
+            xCorrection, zCorrection = corrections.setdefault(value, (np.zeros(self.numQubits, dtype=bool), np.zeros(self.numQubits, dtype=bool)))
+            if operation.name in ("x", "y"):
+                xCorrection[qubit] ^= True
+            if operation.name in ("z", "y"):
+                zCorrection[qubit] ^= True
+
+        self.values = np.array(sorted(corrections), dtype=np.int64)
+        self.xCorrections = np.array([corrections[value][0] for value in self.values], dtype=bool).reshape(len(self.values), self.numQubits)
+        self.zCorrections = np.array([corrections[value][1] for value in self.values], dtype=bool).reshape(len(self.values), self.numQubits)
+
+        self.xSyndromes = np.zeros((self.numQubits, self.numBits), dtype=np.uint8)
+        for i in np.flatnonzero(self.xCorrections.sum(axis=1) == 1):
+            if not self.zCorrections[i].any():
+                qubit = np.flatnonzero(self.xCorrections[i])[0]
+                self.xSyndromes[qubit] = (int(self.values[i]) >> np.arange(self.numBits)) & 1
+
+    def lookup(self, syndromes):
+        """
+        Finds the corrections for an array of syndrome values.
+
+        Parameters
+        ----------
+        syndromes : numpy.ndarray
+            An integer array of syndrome values.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            The X and Z corrections for each syndrome value, as boolean arrays with an extra last axis of length ``numQubits``. Syndrome values the corrector does not act on have no correction.
+        """
+        syndromes = np.asarray(syndromes, dtype=np.int64)
+        if len(self.values) == 0:
+            empty = np.zeros(syndromes.shape + (self.numQubits,), dtype=bool)
+            return empty, empty.copy()
+
+        index = np.minimum(np.searchsorted(self.values, syndromes), len(self.values)-1)
+        found = (self.values[index] == syndromes)[..., None]
+        return self.xCorrections[index] & found, self.zCorrections[index] & found
+
+
+def countsToBits(counts):
+    """
+    Converts a counts dictionary into an array of bits, with one row per distinct outcome.
+
+    Parameters
+    ----------
+    counts : dict(str, int)
+        A counts dictionary, as returned by ``Result.get_counts``. The keys must be binary strings, optionally split into registers by spaces.
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        A ``uint8`` array of shape ``(numOutcomes, numClbits)`` whose column ``i`` holds clbit ``i`` of each outcome, and the number of times each outcome occurred.
+    """
+    first = next(iter(counts))
+    columns = [i for i in range(len(first)-1, -1, -1) if first[i] != " "]
+    characters = np.frombuffer("".join(counts).encode("ascii"), dtype=np.uint8).reshape(len(counts), len(first))
+    return characters[:, columns] - ord("0"), np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+
+def registerBits(bits, circuit, register):
+    """
+    Selects the columns of an array of bits belonging to a classical register.
+
+    Parameters
+    ----------
+    bits : numpy.ndarray
+        An array of bits, as returned by :func:`countsToBits`.
+    circuit : QuantumCircuit
+        The circuit which produced the bits.
+    register : ClassicalRegister
+        The register to select.
+
+    Returns
+    -------
+    numpy.ndarray
+        An array of shape ``(numOutcomes, register.size)`` whose column ``i`` holds bit ``i`` of the register.
+    """
+    return bits[:, [circuit.find_bit(clbit).index for clbit in register]]
+
+def splitCounts(counts, circuit):
+    """
+    Splits a counts dictionary into the values of each classical register of a circuit.
+
+    Parameters
+    ----------
+    counts : dict(str, int)
+        A counts dictionary for ``circuit``.
+    circuit : QuantumCircuit
+        The circuit which produced the counts.
+
+    Returns
+    -------
+    (dict(str, numpy.ndarray), numpy.ndarray)
+        The bits of each register, keyed by register name, as returned by :func:`registerBits`, and the number of times each outcome occurred.
+    """
+    bits, weights = countsToBits(counts)
+    return {register.name: registerBits(bits, circuit, register) for register in circuit.cregs}, weights
+
+def bitsToValues(bits):
+    """
+    Converts rows of bits into integers, with bit ``i`` of each row as the coefficient of ``2**i``.
+
+    Parameters
+    ----------
+    bits : numpy.ndarray
+        An array of shape ``(numRows, numBits)``.
+
+    Returns
+    -------
+    numpy.ndarray
+        An integer array of shape ``(numRows,)``.
+    """
+    return bits.astype(np.int64) @ (np.int64(1) << np.arange(bits.shape[1], dtype=np.int64))
+
+
+class SyndromeDecoder:
+    """
+    A class for decoding transversal measurements of encoded qubits into logical measurement outcomes.
+    The measured bits of each code block are corrected with the syndrome table of the given syndrome corrector, and the logical outcome is the parity of the corrected bits on the support of the logical :math:`Z` operator.
+
+    Parameters
+    ----------
+    syndromeCorrector : SyndromeCorrector
+        The syndrome corrector whose table is used for decoding.
+    logicalSupport : list(int), Optional
+        The qubits of a code block on which the logical :math:`Z` operator acts. By default, every qubit of the block.
+
+    Attributes
+    ----------
+    MAX_TABLE_QUBITS : int
+        The largest block size for which the logical outcome of every possible measurement of a block is tabulated in advance, so that decoding is a single lookup.
+
+    Methods
+    -------
+    decode :
+        Decodes arrays of measured bits into logical outcomes.
+    decodeCounts :
+        Decodes a counts dictionary into a histogram of logical outcomes.
+    decodeShots :
+        Decodes packed per-shot results into the logical outcome of each shot.
+    """
+    MAX_TABLE_QUBITS = 20
+
+    def __init__(self, syndromeCorrector, logicalSupport = None):
+        self._table = SyndromeTable(syndromeCorrector)
+        if logicalSupport == None:
+            logicalSupport = range(self._table.numQubits)
+        self._logicalSupport = np.asarray(list(logicalSupport))
+
+        self._logicalTable = None
+        if self._table.numQubits <= self.MAX_TABLE_QUBITS:
+            words = np.arange(2**self._table.numQubits, dtype=np.int64)
+            self._logicalTable = self._decodeBits((words[:, None] >> np.arange(self._table.numQubits)) & 1)
+
+    def _decodeBits(self, dataBits):
+        dataBits = dataBits.astype(bool)
+        syndromes = bitsToValues((dataBits.astype(np.uint8) @ self._table.xSyndromes) & 1)
+        corrected = dataBits ^ self._table.lookup(syndromes)[0]
+        return (corrected[:, self._logicalSupport].sum(axis=1) & 1).astype(np.uint8)
+
+    def decode(self, dataBits, syndromes = None):
+        """
+        Decodes the transversal measurements of a code block into logical outcomes.
+
+        Parameters
+        ----------
+        dataBits : numpy.ndarray
+            An array of shape ``(numShots, numQubits)`` holding the measured bits of the block.
+        syndromes : numpy.ndarray, Optional
+            The syndrome values measured on the block before the transversal measurement whose corrections were not applied in the circuit. If provided, their X corrections are applied to ``dataBits`` before decoding.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` array of shape ``(numShots,)`` holding the logical outcome of each shot.
+        """
+        if self._logicalTable is None:
+            if syndromes is not None:
+                dataBits = dataBits.astype(bool) ^ self._table.lookup(syndromes)[0]
+            return self._decodeBits(dataBits)
+
+        words = bitsToValues(dataBits)
+        if syndromes is not None:
+            words ^= bitsToValues(self._table.lookup(syndromes)[0])
+        return self._logicalTable[words]
+
+    def decodeCounts(self, counts, circuit, dataRegisters, syndromeRegisters = None):
+        """
+        Decodes a counts dictionary into a histogram of logical outcomes.
+
+        Parameters
+        ----------
+        counts : dict(str, int)
+            A counts dictionary for ``circuit``.
+        circuit : QuantumCircuit
+            The circuit which produced the counts.
+        dataRegisters : list(ClassicalRegister)
+            The registers holding the transversal measurement of each code block.
+        syndromeRegisters : list(ClassicalRegister), Optional
+            The registers holding the last syndrome measurement of each code block, if its corrections were not applied in the circuit. If provided, it must satisfy ``len(syndromeRegisters) == len(dataRegisters)``.
+
+        Returns
+        -------
+        dict(str, int)
+            The number of shots giving each logical outcome. As for Qiskit counts, the outcome of ``dataRegisters[0]`` is the rightmost character of each key.
+        """
+        bits, weights = countsToBits(counts)
+
+        logical = np.zeros(len(weights), dtype=np.int64)
+        for i, register in enumerate(dataRegisters):
+            syndromes = None
+            if syndromeRegisters != None:
+                syndromes = bitsToValues(registerBits(bits, circuit, syndromeRegisters[i]))
+            logical |= self.decode(registerBits(bits, circuit, register), syndromes).astype(np.int64) << i
+
+        outcomes, inverse = np.unique(logical, return_inverse=True)
+        totals = np.bincount(inverse, weights=weights)
+        return {format(outcome, "0" + str(len(dataRegisters)) + "b"): int(total) for outcome, total in zip(outcomes, totals)}
+
+    def decodeShots(self, shots, dataRegisters, syndromeRegisters = None):
+        """
+        Decodes packed per-shot results into the logical outcome of each shot.
+        When the logical outcomes of the block are tabulated, the packed bytes of each register are looked up directly, without unpacking them into bits.
+
+        Parameters
+        ----------
+        shots : PackedShots
+            The packed results of the circuit.
+        dataRegisters : list(ClassicalRegister)
+            The registers holding the transversal measurement of each code block.
+        syndromeRegisters : list(ClassicalRegister), Optional
+            The registers holding the last syndrome measurement of each code block, if its corrections were not applied in the circuit. If provided, it must satisfy ``len(syndromeRegisters) == len(dataRegisters)``.
+
+        Returns
+        -------
+        numpy.ndarray
+            An ``int64`` array of shape ``(numShots,)`` whose bit ``i`` is the logical outcome of ``dataRegisters[i]`` in each shot.
+        """
+        logical = np.zeros(shots.numShots, dtype=np.int64)
+        for i, register in enumerate(dataRegisters):
+            syndromes = None
+            if syndromeRegisters != None:
+                syndromes = shots.registerValues(syndromeRegisters[i])
+
+            if self._logicalTable is None:
+                outcomes = self.decode(shots.registerBits(register), syndromes)
+            else:
+                words = shots.registerValues(register)
+                if syndromes is not None:
+                    words ^= bitsToValues(self._table.lookup(syndromes)[0])
+                outcomes = self._logicalTable[words]
+            logical |= outcomes.astype(np.int64) << i
+        return logical
@@ -0,0 +1,304 @@
+"""
+The EncodingCache module keeps fault tolerant circuits on disk, so that encoding the same logical circuit with the same components again only loads a file.
+Each encoded circuit is pickled under a hash of the logical circuit and of the configuration of the components used to encode it.
+"""
+
+import gc
+import hashlib
+import io
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import qiskit
+from qiskit import qpy
+from qiskit.circuit import QuantumCircuit
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+
+from BaseFaultTolerance import FaultTolerance, _attached
+
+
+# Bump when the format of the stored circuits or the way keys are computed changes.
+FORMAT_VERSION = 2
+
+_LAYOUT_KEY = "qiskiftEncodingLayout"
+
+
+def _qpyBytes(circuit):
+    buffer = io.BytesIO()
+    qpy.dump(circuit, buffer)
+    return buffer.getvalue()
+
+def _update(digest, value):
+    """
+    Feeds the configuration held by ``value`` into ``digest``.
+    Circuits are hashed through their QPY serialization, classes, such as the gate classes keying :class:`FaultTolerantGates`, through their qualified name, components through their class and attributes, and containers through their items.
+    Any other object raises a ``TypeError``, rather than being skipped, so that two different configurations never share a key.
+    """
+    if isinstance(value, QuantumCircuit):
+        digest.update(b"circuit")
+        digest.update(_circuitDigest(value))
+    elif value is None or isinstance(value, (bool, int, float, str)):
+        digest.update(repr(value).encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"list%d" % len(value))
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, (set, frozenset)):
+        digest.update(b"set")
+        digest.update(repr(sorted(repr(item) for item in value)).encode())
+    elif isinstance(value, dict):
+        digest.update(b"dict%d" % len(value))
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, type):
+        digest.update(b"class")
+        digest.update((value.__module__ + "." + value.__qualname__).encode())
+    elif hasattr(value, "__dict__") and type(value).__module__ != "builtins" and not type(value).__module__.startswith("qiskit"):
+        digest.update(b"component")
+        digest.update(_componentDigest(value))
+    else:
+        raise TypeError("Cannot compute an encoding cache key for a configuration holding a " + type(value).__qualname__)
+
+_circuitDigests = {}
+
+def _circuitDigest(circuit):
+    return _attached(_circuitDigests, circuit, lambda circuit: hashlib.sha256(_qpyBytes(circuit)).digest())
+
+def _componentDigest(component):
+    digest = hashlib.sha256()
+    digest.update((type(component).__module__ + "." + type(component).__qualname__).encode())
+    for name in sorted(vars(component)):
+        digest.update(name.encode())
+        _update(digest, vars(component)[name])
+    return digest.digest()
+
+
+class EncodingCache:
+    """
+    A size bounded on-disk cache of fault tolerant circuits.
+
+    Each entry is a pickled circuit named after the SHA-256 hash of the logical circuit, the components used to encode it and any options, along with the versions of Qiskit and of the cache format.
+    Components are hashed through their class and the circuits and values they hold, so two separately created components with the same templates and options share their entries. Components holding any other kind of object cannot be hashed and raise a ``TypeError``.
+    Logical circuits are hashed through their QPY serialization, so circuits with parameters only share entries if they use the same :class:`Parameter` objects.
+    Entries are pickled rather than written in QPY, which reads each instruction in time proportional to the number of classical bits of the circuit and so loads a fault tolerant circuit more slowly than encoding it again. Pickling keeps every register, including :class:`AncillaRegister` objects, so a circuit loaded from the cache is the same as the one encoded. Since loading a pickle can run arbitrary code, the cache directory must only be writable by trusted users.
+    Files are written to a temporary file first and then moved into place, so several processes can share a cache directory. Whenever the total size of the entries exceeds ``maxBytes``, the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : str
+        The directory holding the entries. It is created if it does not exist.
+    maxBytes : int, Optional
+        The largest total size of the entries, in bytes.
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups which found an entry.
+    misses : int
+        The number of lookups which did not find an entry.
+
+    Methods
+    -------
+    key :
+        Computes the key of a logical circuit encoded with given components.
+    load :
+        Loads the circuit stored under a key.
+    store :
+        Stores a circuit under a key.
+    encode :
+        Encodes a logical circuit with the :class:`FaultTolerance` pass, loading the result from the cache when possible.
+    clear :
+        Removes every entry.
+
+    Examples
+    --------
+    >>> cache = EncodingCache("encoded")
+    >>> ftCircuit, blockLayout, logicalMeasurements = cache.encode(circuit, SteaneEncoder(), SteaneErrorCorrector(), SteaneFaultTolerantGates())
+    """
+    def __init__(self, directory, maxBytes = 2**30):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def key(self, circuit, *components, **options):
+        """
+        Computes the key of a logical circuit encoded with the given components and options.
+
+        Parameters
+        ----------
+        circuit : QuantumCircuit, DAGCircuit
+            The logical circuit.
+        components : object
+            The components used to encode the circuit, such as an encoder, an error corrector and fault tolerant gates.
+        options : int, float, str, bool
+            Any other options affecting the encoding, such as the number of rounds of error correction.
+
+        Returns
+        -------
+        str
+            The key, as a hexadecimal string.
+        """
+        if not isinstance(circuit, QuantumCircuit):
+            circuit = dag_to_circuit(circuit)
+
+        digest = hashlib.sha256()
+        _update(digest, (FORMAT_VERSION, qiskit.__version__))
+        digest.update(hashlib.sha256(_qpyBytes(circuit)).digest())
+        for component in components:
+            _update(digest, component)
+        _update(digest, options)
+        return digest.hexdigest()
+
+    def load(self, key):
+        """
+        Loads the circuit stored under a key, marking the entry as recently used.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+
+        Returns
+        -------
+        QuantumCircuit
+            The stored circuit, or ``None`` if there is no entry for ``key``.
+        """
+        path = self._path(key)
+        # Unpickling a circuit creates an object for every instruction, and the garbage collector would otherwise traverse the growing circuit again and again while it is loaded.
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, "rb") as file:
+                circuit = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError, AttributeError, ImportError):
+            self.misses += 1
+            return None
+        finally:
+            if collecting:
+                gc.enable()
+
+        os.utime(path)
+        self.hits += 1
+        return circuit
+
+    def store(self, key, circuit):
+        """
+        Stores a circuit under a key, then removes the least recently used entries if the cache is over its size limit.
+
+        Parameters
+        ----------
+        key : str
+            The key of the entry.
+        circuit : QuantumCircuit
+            The circuit to store.
+        """
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                pickle.dump(circuit, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self._path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        self._evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Removes every entry from the cache and resets the hit and miss counters.
+        """
+        for mtime, size, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, circuit, encoder, errorCorrector, gates, numRounds = 1):
+        """
+        Converts a logical circuit into an equivalent fault tolerant circuit with the :class:`FaultTolerance` pass, or loads the result of an earlier conversion with the same circuit, components and number of rounds.
+
+        Parameters
+        ----------
+        circuit : QuantumCircuit, DAGCircuit
+            The logical computation to make fault tolerant.
+        encoder : Encoder, FaultTolerantEncoder
+            An object implementing the encoding of the :math:`|0\\rangle` state.
+        errorCorrector : ErrorCorrector
+            An object implementing error correction. If ``None``, no error correction is added.
+        gates : FaultTolerantGates
+            An object implementing the fault tolerant gates.
+        numRounds : int, Optional
+            The number of rounds of error correction to perform after each gate.
+
+        Returns
+        -------
+        (QuantumCircuit, dict(Qubit, QuantumRegister), dict(Clbit, ClassicalRegister))
+            The fault tolerant circuit, the code block of each logical qubit, and the register holding the last measurement of each logical clbit, as given by the ``blockLayout`` and ``logicalMeasurements`` properties of :class:`FaultTolerance`.
+        """
+        if not isinstance(circuit, QuantumCircuit):
+            circuit = dag_to_circuit(circuit)
+
+        key = self.key(circuit, encoder, errorCorrector, gates, numRounds=numRounds)
+        ftCircuit = self.load(key)
+
+        if ftCircuit == None:
+            faultTolerance = FaultTolerance(encoder, errorCorrector, gates, numRounds)
+            ftCircuit = dag_to_circuit(faultTolerance.run(circuit_to_dag(circuit)))
+
+            qubitIndices = {qubit: i for i, qubit in enumerate(circuit.qubits)}
+            clbitIndices = {clbit: i for i, clbit in enumerate(circuit.clbits)}
+            layout = {
+                "blocks": {qubitIndices[qubit]: register.name for qubit, register in faultTolerance.property_set["blockLayout"].items()},
+                "measurements": {clbitIndices[clbit]: register.name for clbit, register in faultTolerance.property_set["logicalMeasurements"].items()}
+            }
+
+            metadata = ftCircuit.metadata
+            ftCircuit.metadata = dict(metadata or {}, **{_LAYOUT_KEY: layout})
+            self.store(key, ftCircuit)
+        else:
+            metadata = dict(ftCircuit.metadata)
+            layout = metadata.pop(_LAYOUT_KEY)
+            metadata = metadata or circuit.metadata
+
+        ftCircuit.metadata = metadata
+
+        registers = {register.name: register for register in ftCircuit.qregs + ftCircuit.cregs}
+        blockLayout = {circuit.qubits[int(i)]: registers[name] for i, name in layout["blocks"].items()}
+        logicalMeasurements = {circuit.clbits[int(i)]: registers[name] for i, name in layout["measurements"].items()}
+        return ftCircuit, blockLayout, logicalMeasurements
@@ -0,0 +1,140 @@
+"""
+The Instrumentation module records where the builder classes of :mod:`BaseFaultTolerance` spend their time.
+Instrumentation is opt-in: while no :class:`Instrumentation` is active, every instrumented call only checks an empty list before doing its work.
+"""
+
+import collections
+import functools
+import time
+
+
+_active = []
+_context = []
+
+
+def _record(event, seconds):
+    component, operation = _context[-1] if _context else (None, None)
+    for instrumentation in _active:
+        instrumentation._record(component, operation, event, seconds)
+
+def _timed(event, function, *args, **kwargs):
+    """
+    Calls ``function(*args, **kwargs)``, recording the call as ``event`` if any instrumentation is active.
+    """
+    if not _active:
+        return function(*args, **kwargs)
+
+    start = time.perf_counter()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _record(event, time.perf_counter()-start)
+
+def _event(event):
+    """
+    A decorator recording every call of a function as ``event`` if any instrumentation is active.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            return _timed(event, function, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def _operation(method):
+    """
+    A decorator for the public methods of the builder classes. While any instrumentation is active, events recorded during the method are attributed to the class of ``self`` and the name of the method, and the method itself is recorded as a ``"call"`` event.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _active:
+            return method(self, *args, **kwargs)
+
+        _context.append((type(self).__name__, method.__name__))
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _record("call", time.perf_counter()-start)
+            _context.pop()
+    return wrapper
+
+
+class Instrumentation:
+    """
+    A context manager counting and timing the work done by the builder classes while it is active.
+
+    The recorded events are ``"compose"`` (composing a template into a circuit or DAG), ``"copy"`` (copying a circuit), ``"registers"`` (allocating registers), ``"circuitToDag"`` (converting a template to a DAG) and ``"call"`` (a call of a public method of a builder class).
+    Each event is attributed to the innermost builder method being executed, given by the name of the class of the component (such as ``"SteaneEncoder"``) and the name of the method (such as ``"getEncoderDag"``). The time of a ``"call"`` event includes the time of any builder methods it calls.
+    Instrumentation is not thread-safe.
+
+    Parameters
+    ----------
+    callback : function, Optional
+        A function called as ``callback(component, operation, event, seconds)`` for every recorded event.
+
+    Attributes
+    ----------
+    records : dict((str, str, str), list(int, float))
+        The number of occurrences of each ``(component, operation, event)`` and the total time they took, in seconds.
+
+    Methods
+    -------
+    summary :
+        Aggregates the records.
+
+    Examples
+    --------
+    >>> with Instrumentation() as instrumentation:
+    ...     SteaneFaultTolerantEncoder(2).createEncoderDag(100)
+    >>> instrumentation.summary(("component", "event"))
+    """
+    def __init__(self, callback = None):
+        self.callback = callback
+        self.records = collections.defaultdict(lambda: [0, 0.0])
+
+    def __enter__(self):
+        _active.append(self)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        _active.remove(self)
+        return False
+
+    def _record(self, component, operation, event, seconds):
+        record = self.records[(component, operation, event)]
+        record[0] += 1
+        record[1] += seconds
+        if self.callback != None:
+            self.callback(component, operation, event, seconds)
+
+    def summary(self, keys = ("component", "operation", "event")):
+        """
+        Aggregates the records over the fields not in ``keys``.
+
+        Parameters
+        ----------
+        keys : list(str), Optional
+            The fields to group by, out of ``"component"``, ``"operation"`` and ``"event"``.
+
+        Returns
+        -------
+        list(dict)
+            One entry per group, giving the value of each field in ``keys``, the number of occurrences (``"count"``) and their total time in seconds (``"time"``), sorted by decreasing time.
+        """
+        fields = ("component", "operation", "event")
+        groups = collections.defaultdict(lambda: [0, 0.0])
+        for key, (count, seconds) in self.records.items():
+            group = groups[tuple(value for field, value in zip(fields, key) if field in keys)]
+            group[0] += count
+            group[1] += seconds
+
+        rows = []
+        for group, (count, seconds) in groups.items():
+            row = dict(zip([field for field in fields if field in keys], group))
+            row["count"] = count
+            row["time"] = seconds
+            rows.append(row)
+        return sorted(rows, key=lambda row: -row["time"])
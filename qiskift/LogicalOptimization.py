@@ -0,0 +1,207 @@
+"""
+The LogicalOptimization module simplifies logical circuits before they are made fault tolerant.
+Every logical gate is replaced by a fault tolerant gate acting on whole code blocks and is followed by error correction of those blocks, so each logical gate removed saves the operations of its template and of the error correction after it.
+"""
+
+import cmath
+import collections
+import functools
+
+import numpy as np
+from qiskit.transpiler.basepasses import TransformationPass
+from qiskit.circuit.library import HGate, XGate, YGate, ZGate, SGate, SdgGate
+
+from Concatenation import flatten
+
+
+_SINGLE_QUBIT_GATES = {gate.name: gate for gate in (HGate(), XGate(), YGate(), ZGate(), SGate(), SdgGate())}
+_MATRICES = {name: np.array(gate.to_matrix()) for name, gate in _SINGLE_QUBIT_GATES.items()}
+_MATRICES["id"] = np.eye(2, dtype=complex)
+
+
+def _phase(matrix):
+    """
+    Returns the phase of the first non-zero entry of ``matrix``.
+    """
+    entry = matrix.flat[np.flatnonzero(np.abs(matrix) > 1e-9)[0]]
+    return cmath.phase(entry)
+
+def _key(matrix):
+    """
+    Returns a key identifying ``matrix`` up to a global phase.
+    """
+    normalized = matrix*cmath.exp(-1j*_phase(matrix))
+    return tuple(np.round(normalized, 6).flatten().tolist())
+
+@functools.lru_cache(maxsize=None)
+def _shortestWords(names):
+    """
+    Finds the shortest product of the gates ``names``, given as a tuple, equal to each single-qubit Clifford gate up to a global phase, by a breadth first search of the group they generate.
+    Returns a map from the key of each gate to the names of the gates of its product, in the order they are applied.
+    """
+    identity = _MATRICES["id"]
+    words = {_key(identity): []}
+    queue = collections.deque([(identity, [])])
+    while queue:
+        matrix, word = queue.popleft()
+        for name in names:
+            product = _MATRICES[name] @ matrix
+            key = _key(product)
+            if key not in words:
+                words[key] = word + [name]
+                queue.append((product, word + [name]))
+    return words
+
+def _cliffordWord(matrix, words):
+    """
+    Returns the names of the gates of the shortest product in ``words`` equal to the single-qubit gate ``matrix`` up to a global phase, along with that phase, or ``None`` if there is no such product.
+    """
+    word = words.get(_key(matrix))
+    if word == None:
+        return None
+
+    product = _MATRICES["id"]
+    for name in word:
+        product = _MATRICES[name] @ product
+    return word, _phase(matrix) - _phase(product)
+
+
+class LogicalOptimization(TransformationPass):
+    """
+    A Transpiler pass that cancels and merges logical gates, to be run on a logical circuit before the :class:`FaultTolerance` pass.
+
+    Runs of single-qubit Clifford gates on a logical qubit, such as :math:`HH`, :math:`XX` or :math:`SSSS`, are replaced by the shortest product of the gates with a fault tolerant implementation that is equal to the run up to a global phase, which is added to the phase of the circuit. Pairs of CNOT gates on the same control and target with nothing between them on either qubit are removed, after which the gates on either side of the pair are merged in turn, so that for instance :math:`H\\,\\mathrm{CX}\\,\\mathrm{CX}\\,H` cancels completely.
+    A run is only replaced by a shorter one, so circuits with nothing to simplify are left as they are. Conditional gates, measurements, resets, barriers and any other operations are left in place and are never moved past.
+
+    After the pass has run, ``property_set["logicalGatesRemoved"]`` holds the number of logical gates removed and ``property_set["encodedOperationsSaved"]`` holds the number of operations of the fault tolerant circuit saved, as counted from the templates of ``gates`` and ``errorCorrector``, or ``None`` if ``gates`` was not given. Gates without a fault tolerant implementation are counted as having no operations.
+
+    Parameters
+    ----------
+    gates : FaultTolerantGates, Optional
+        The gates the logical circuit will be made fault tolerant with. Runs of single-qubit gates are rewritten using only the gates it implements among H, X, Y, Z, S and S dagger. By default, H, X and S are used.
+    errorCorrector : ErrorCorrector, Optional
+        The error corrector applied after each gate, used to count the operations saved.
+    numRounds : int, Optional
+        The number of rounds of error correction after each gate, used to count the operations saved.
+
+    Examples
+    --------
+    >>> gates = SteaneFaultTolerantGates()
+    >>> optimization = LogicalOptimization(gates, SteaneErrorCorrector())
+    >>> dag = optimization.run(dag)
+    >>> optimization.property_set["encodedOperationsSaved"]
+    """
+    def __init__(self, gates = None, errorCorrector = None, numRounds = 1):
+        super().__init__()
+        self._gates = gates
+        self._errorCorrector = errorCorrector
+        self._numRounds = numRounds
+
+        names = ("h", "x", "s") if gates == None else tuple(name for name in _SINGLE_QUBIT_GATES if name in gates._byName)
+        self._words = _shortestWords(names)
+        self._costs = {}
+
+    def _cost(self, name, numBlocks):
+        """
+        Returns the number of operations of the fault tolerant implementation of a logical gate, including the error correction of its blocks.
+        """
+        if name not in self._gates._byName:
+            return 0
+        if name not in self._costs:
+            cost = len(flatten(self._gates._byName[name][0]).data)
+            if self._errorCorrector != None:
+                detector = self._errorCorrector._syndromeDetector
+                corrector = self._errorCorrector._syndromeCorrector
+                perBlock = len(flatten(detector._detectorCircuit).data) + detector._numAncillas
+                if corrector._correctorCircuit != None:
+                    perBlock += len(flatten(corrector._correctorCircuit).data)
+                cost += self._numRounds*numBlocks*perBlock
+            self._costs[name] = cost
+        return self._costs[name]
+
+    def _totalCost(self, names):
+        if self._gates == None:
+            return None
+        return sum(self._cost(name, 2 if name == "cx" else 1) for name in names)
+
+    def _word(self, gates):
+        """
+        Returns the gates replacing a run of single-qubit gates, along with the change in global phase.
+        """
+        matrix = _MATRICES["id"]
+        for gate in gates:
+            matrix = _MATRICES[gate.name] @ matrix
+
+        result = _cliffordWord(matrix, self._words)
+        if result == None or len(result[0]) >= len(gates):
+            return gates, 0
+
+        word, phase = result
+        return [_SINGLE_QUBIT_GATES[name] for name in word], phase
+
+    def run(self, dag):
+        """
+        Cancels and merges the gates of the given logical DAG.
+
+        Parameters
+        ----------
+        dag : DAGCircuit
+            The logical computation to simplify.
+        """
+        # Each entry is a run of single-qubit gates, a CNOT gate or any other operation, in the order they were met. Each qubit keeps a stack of the entries acting on it, so a gate only merges with or cancels the entry on top of the stacks of its qubits.
+        entries = []
+        stacks = {qubit: [] for qubit in dag.qubits}
+        before = []
+
+        for node in dag.topological_op_nodes():
+            op = node.op
+            conditional = getattr(op, "condition", None) != None
+            if op.name in _SINGLE_QUBIT_GATES and not conditional:
+                before.append(op.name)
+                stack = stacks[node.qargs[0]]
+                if stack and stack[-1][0] == "run":
+                    stack[-1][2].append(op)
+                else:
+                    entry = ["run", node.qargs, [op]]
+                    entries.append(entry)
+                    stack.append(entry)
+
+            elif op.name == "cx" and not conditional:
+                before.append(op.name)
+                control, target = node.qargs
+                top = stacks[control][-1] if stacks[control] else None
+                if top != None and top[0] == "cx" and top[1] == node.qargs and stacks[target] and stacks[target][-1] is top:
+                    top[0] = "removed"
+                    stacks[control].pop()
+                    stacks[target].pop()
+                else:
+                    entry = ["cx", node.qargs, [op]]
+                    entries.append(entry)
+                    stacks[control].append(entry)
+                    stacks[target].append(entry)
+
+            else:
+                entry = ["other", node.qargs, [op], node.cargs]
+                entries.append(entry)
+                for qubit in node.qargs:
+                    stacks[qubit].append(entry)
+
+        optimized = dag.copy_empty_like()
+        after = []
+        for entry in entries:
+            if entry[0] == "run":
+                gates, phase = self._word(entry[2])
+                optimized.global_phase += phase
+                for gate in gates:
+                    optimized.apply_operation_back(gate, entry[1], ())
+                    after.append(gate.name)
+            elif entry[0] == "cx":
+                optimized.apply_operation_back(entry[2][0], entry[1], ())
+                after.append("cx")
+            elif entry[0] == "other":
+                optimized.apply_operation_back(entry[2][0], entry[1], entry[3])
+
+        self.property_set["logicalGatesRemoved"] = len(before) - len(after)
+        saved = self._totalCost(before)
+        self.property_set["encodedOperationsSaved"] = None if saved == None else saved - self._totalCost(after)
+        return optimized
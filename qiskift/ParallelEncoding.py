@@ -0,0 +1,112 @@
+"""
+The ParallelEncoding module converts large logical circuits into fault tolerant circuits over a ``multiprocessing`` pool.
+The logical circuit is split into time windows of consecutive operations, each window is expanded in a worker process by the same machinery as the :class:`FaultTolerance` pass, and the fragments are joined back together on the code blocks of the logical qubits.
+Every fragment names its registers with its own suffix, so the fragments can be joined without remapping any bits or conditions.
+"""
+
+import multiprocessing
+import os
+
+from qiskit.circuit import QuantumCircuit, CircuitInstruction
+from qiskit.converters import circuit_to_dag
+from qiskit.dagcircuit import DAGCircuit
+
+from BaseFaultTolerance import FaultTolerance, _makeQregsCircuit, _makeQregsDag, _registerIndexDag
+
+
+_faultTolerance = None
+
+def _initWorker(faultTolerance):
+    global _faultTolerance
+    _faultTolerance = faultTolerance
+
+def _encodeSlice(task):
+    index, numQubits, operations, encode = task
+
+    ftDag = DAGCircuit()
+    blocks = _makeQregsDag(ftDag, numQubits, _faultTolerance._blockSize())
+    _registerIndexDag(ftDag).suffix = "_" + str(index)
+
+    if encode:
+        _faultTolerance._encoder.getEncoderDag(ftDag, blocks)
+
+    measurements = {}
+    for op, qubits, clbits in operations:
+        _faultTolerance._addOperationDag(ftDag, op, [blocks[qubit] for qubit in qubits], clbits, measurements)
+
+    registers = list(ftDag.qregs.values())[numQubits:] + list(ftDag.cregs.values())
+    instructions = [(node.op, node.qargs, node.cargs) for node in ftDag.topological_op_nodes()]
+    return registers, instructions, measurements
+
+
+def encodeParallel(circuit, encoder, errorCorrector, gates, numRounds = 1, processes = None, numSlices = None):
+    """
+    Converts a logical circuit into an equivalent fault tolerant circuit, as the :class:`FaultTolerance` pass does, expanding time windows of the circuit in parallel.
+
+    The operations of the logical circuit are taken in topological order and split into ``numSlices`` windows of consecutive operations, so each window only depends on the windows before it.
+    Each window is expanded on its own DAG, so the cost of adding registers to a DAG, which grows with the number of registers already in it, is paid per window rather than for the whole circuit.
+    The fragments are joined into a :class:`QuantumCircuit`, which is much cheaper than joining them into a DAG, although Qiskit still checks every new register name against the existing ones. For very large circuits, an error corrector reusing its syndrome registers (see the ``ringSize`` option of :class:`SyndromeDetector`) keeps the joining time small.
+    Ancillas are not shared between windows, so the joined circuit has one set of ancillas per window.
+
+    Parameters
+    ----------
+    circuit : QuantumCircuit, DAGCircuit
+        The logical computation to make fault tolerant.
+    encoder : Encoder, FaultTolerantEncoder
+        An object implementing the encoding of the :math:`|0\\rangle` state.
+    errorCorrector : ErrorCorrector
+        An object implementing error correction. If ``None``, no error correction is added.
+    gates : FaultTolerantGates
+        An object implementing the fault tolerant gates.
+    numRounds : int, Optional
+        The number of rounds of error correction to perform after each gate.
+    processes : int, Optional
+        The number of worker processes. By default, the number of CPUs. If ``processes == 1``, the windows are expanded in the current process.
+    numSlices : int, Optional
+        The number of windows. By default, ``processes``.
+
+    Returns
+    -------
+    (QuantumCircuit, dict(Qubit, QuantumRegister), dict(Clbit, ClassicalRegister))
+        The fault tolerant circuit, the code block of each logical qubit, and the register holding the last measurement of each logical clbit, as given by the ``blockLayout`` and ``logicalMeasurements`` properties of :class:`FaultTolerance`.
+    """
+    faultTolerance = FaultTolerance(encoder, errorCorrector, gates, numRounds)
+    dag = faultTolerance._unroll(circuit_to_dag(circuit) if isinstance(circuit, QuantumCircuit) else circuit)
+
+    qubitIndices = {qubit: i for i, qubit in enumerate(dag.qubits)}
+    clbitIndices = {clbit: i for i, clbit in enumerate(dag.clbits)}
+    operations = [(node.op, [qubitIndices[qubit] for qubit in node.qargs], [clbitIndices[clbit] for clbit in node.cargs]) for node in dag.topological_op_nodes()]
+
+    if processes == None:
+        processes = os.cpu_count()
+    if numSlices == None:
+        numSlices = processes
+    numSlices = max(1, min(numSlices, len(operations)))
+
+    bounds = [len(operations)*i//numSlices for i in range(numSlices+1)]
+    tasks = [(i, dag.num_qubits(), operations[bounds[i]:bounds[i+1]], i == 0) for i in range(numSlices)]
+
+    if processes == 1:
+        _initWorker(faultTolerance)
+        try:
+            fragments = [_encodeSlice(task) for task in tasks]
+        finally:
+            _initWorker(None)
+    else:
+        with multiprocessing.Pool(processes, _initWorker, (faultTolerance,)) as pool:
+            fragments = pool.map(_encodeSlice, tasks, chunksize=1)
+
+    ftCircuit = QuantumCircuit(name = dag.name, global_phase = dag.global_phase, metadata = dag.metadata)
+    blocks = _makeQregsCircuit(ftCircuit, dag.num_qubits(), faultTolerance._blockSize())
+
+    measurements = {}
+    for registers, instructions, sliceMeasurements in fragments:
+        for register in registers:
+            ftCircuit.add_register(register)
+        for op, qargs, cargs in instructions:
+            ftCircuit._append(CircuitInstruction(op, qargs, cargs))
+        measurements.update(sliceMeasurements)
+
+    blockLayout = dict(zip(dag.qubits, blocks))
+    logicalMeasurements = {dag.clbits[i]: register for i, register in measurements.items()}
+    return ftCircuit, blockLayout, logicalMeasurements
@@ -0,0 +1,392 @@
+"""
+The PauliFrame module contains a Monte Carlo sampler for estimating logical error rates under circuit-level Pauli noise.
+Rather than simulating the state of every shot, it simulates a single noiseless reference shot with :class:`StabilizerSimulator`, then tracks the Pauli errors of each shot relative to the reference as a Pauli frame.
+The frames of a whole batch of shots are stored as NumPy arrays packed 64 shots to a word, so each operation costs a few word operations per 64 shots.
+"""
+
+import numpy as np
+from qiskit.circuit import ClassicalRegister
+
+from StabilizerSimulator import StabilizerSimulator, _Branch, _operations
+
+
+_SINGLE_QUBIT_GATES = {"h", "s", "sdg", "x", "y", "z", "id"}
+
+_TWO_QUBIT_GATES = {"cx", "cz", "swap"}
+
+
+class PauliNoise:
+    """
+    A circuit-level noise model of independent Pauli errors.
+
+    Parameters
+    ----------
+    gate : float, Optional
+        The probability of a depolarizing error after each single-qubit gate. Each of :math:`X`, :math:`Y` and :math:`Z` occurs with probability ``gate/3``.
+    twoQubitGate : float, Optional
+        The probability of a depolarizing error after each two-qubit gate. Each of the 15 non-identity two-qubit Paulis occurs with probability ``twoQubitGate/15``. By default, the same as ``gate``.
+    idle : float, Optional
+        The probability of a depolarizing error on each qubit left idle during a layer of the circuit.
+    measure : float, Optional
+        The probability that each measurement outcome is flipped.
+    reset : float, Optional
+        The probability of an :math:`X` error after each reset.
+    """
+    def __init__(self, gate = 0, twoQubitGate = None, idle = 0, measure = 0, reset = 0):
+        self.gate = gate
+        self.twoQubitGate = gate if twoQubitGate == None else twoQubitGate
+        self.idle = idle
+        self.measure = measure
+        self.reset = reset
+
+
+class _Channel:
+    """
+    The locations at which a single kind of error can occur, each with the same probability.
+    ``numPaulis`` is 3 for single-qubit depolarizing errors, 15 for two-qubit depolarizing errors and 1 for errors of a fixed type.
+    """
+    def __init__(self, probability, numPaulis):
+        self.probability = probability
+        self.numPaulis = numPaulis
+        self.numLocations = 0
+
+    def newLocation(self):
+        self.numLocations += 1
+        return self.numLocations-1
+
+    def sample(self, numShots, rng):
+        """
+        Samples the shots hit by an error at every location at once, by drawing the gaps between consecutive hits.
+        Returns the hit shots, the Pauli drawn for each hit, and the range of hits belonging to each location.
+        """
+        total = self.numLocations*numShots
+        if self.probability <= 0 or total == 0:
+            hits = np.zeros(0, dtype=np.int64)
+        elif self.probability >= 1:
+            hits = np.arange(total, dtype=np.int64)
+        else:
+            expected = total*self.probability
+            hits = np.cumsum(rng.geometric(self.probability, int(expected + 5*np.sqrt(expected) + 10)), dtype=np.int64) - 1
+            while hits[-1] < total:
+                more = np.cumsum(rng.geometric(self.probability, int(expected/2 + 10)), dtype=np.int64) + hits[-1]
+                hits = np.concatenate((hits, more))
+            hits = hits[:np.searchsorted(hits, total)]
+
+        locations = hits//numShots
+        bounds = np.searchsorted(locations, np.arange(self.numLocations+1))
+        return hits%numShots, rng.integers(1, self.numPaulis+1, len(hits), dtype=np.uint64), bounds
+
+
+class PauliFrameSampler:
+    """
+    A class for sampling the measurement outcomes of a noisy Clifford circuit with Pauli frames.
+
+    The circuit may contain the ``id``, ``h``, ``s``, ``sdg``, ``x``, ``y``, ``z``, ``cx``, ``cz`` and ``swap`` gates, measurements, resets, barriers, instructions defined in terms of these, and Pauli gates conditioned on classical registers, such as those added by a :class:`SyndromeCorrector`.
+    Conditional Pauli gates are assumed to be applied without error. Other conditional operations, such as those of a :class:`FaultTolerantEncoder`, cannot be tracked by a Pauli frame and are rejected.
+
+    The noise of each operation is applied after it, and the idle noise after every layer of the circuit, where the layers are found by scheduling each operation as early as possible.
+
+    Parameters
+    ----------
+    circuit : QuantumCircuit or DAGCircuit
+        The circuit to sample.
+    noise : PauliNoise, Optional
+        The noise model. By default, the circuit is noiseless.
+    seed : int, Optional
+        The seed for the reference shot and the sampled errors.
+
+    Methods
+    -------
+    reseed :
+        Resets the random number generator used to sample errors.
+    sampleFlips :
+        Samples which measurement outcomes differ from the reference shot.
+    sample :
+        Samples the measurement outcomes of the circuit.
+    logicalErrors :
+        Samples which code blocks are decoded to a different logical outcome than the reference shot.
+    logicalErrorRate :
+        Estimates the probability that any code block is decoded to a different logical outcome than the reference shot.
+    """
+    def __init__(self, circuit, noise = None, seed = None):
+        if noise == None:
+            noise = PauliNoise()
+
+        self._circuit = circuit
+        self._rng = np.random.default_rng(seed)
+        self._numQubits = len(circuit.qubits)
+        self._numClbits = len(circuit.clbits)
+
+        self._gateChannel = _Channel(noise.gate, 3)
+        self._twoQubitChannel = _Channel(noise.twoQubitGate, 15)
+        self._idleChannel = _Channel(noise.idle, 3)
+        self._measureChannel = _Channel(noise.measure, 1)
+        self._resetChannel = _Channel(noise.reset, 1)
+        self._program = self._compile(circuit)
+
+    def _compile(self, circuit):
+        """
+        Schedules the operations of ``circuit`` into layers and interleaves them with the locations of their errors.
+
+        The noiseless reference shot is simulated alongside, in the order of the circuit, so that each conditional operation is compared with the values its clbits have in the reference shot when it is applied rather than at the end of the circuit, which differ if the clbits are measured again afterwards. A measurement is never scheduled before a conditional operation reading its clbit which comes earlier in the circuit.
+        """
+        layers = []
+        qubitTimes = [0]*self._numQubits
+        clbitTimes = [0]*self._numClbits
+        clbitReadTimes = [0]*self._numClbits
+
+        simulator = StabilizerSimulator(self._rng.integers(2**32))
+        reference = [_Branch.initial(self._numQubits, self._numClbits, 1)]
+
+        def schedule(operation, qubits, clbits):
+            condition = operation.condition
+            conditionBits = []
+            if condition != None:
+                if operation.name not in ("x", "y", "z"):
+                    raise ValueError("A Pauli frame cannot track the conditional operation " + operation.name)
+                registerBits = condition[0] if isinstance(condition[0], ClassicalRegister) else [condition[0]]
+                conditionBits = [clbits.mapping[clbit] for clbit in registerBits]
+
+            if operation.name in ("barrier", "delay"):
+                time = max([qubitTimes[qubit] for qubit in qubits], default=0)
+                for qubit in qubits:
+                    qubitTimes[qubit] = time
+                return
+
+            if condition == None and operation.name not in _SINGLE_QUBIT_GATES | _TWO_QUBIT_GATES | {"measure", "reset"}:
+                if operation.definition == None:
+                    raise ValueError("A Pauli frame cannot track the operation " + operation.name)
+                for subOperation, subQubits, subClbits in _operations(operation.definition, qubits, clbits):
+                    schedule(subOperation, subQubits, subClbits)
+                return
+
+            referenceBits = [int(reference[0].clbits[clbit][0] & 1) for clbit in conditionBits]
+            reference[:] = simulator._apply(reference, operation, qubits, clbits)
+
+            time = max([qubitTimes[qubit] for qubit in qubits] + [clbitTimes[clbit] for clbit in list(clbits) + conditionBits] + [clbitReadTimes[clbit] for clbit in clbits])
+            for qubit in qubits:
+                qubitTimes[qubit] = time+1
+            for clbit in clbits:
+                clbitTimes[clbit] = time+1
+            for clbit in conditionBits:
+                clbitReadTimes[clbit] = max(clbitReadTimes[clbit], time)
+            while len(layers) <= time:
+                layers.append([])
+            layers[time].append((operation, qubits, list(clbits), conditionBits, referenceBits))
+
+        for operation, qubits, clbits in _operations(circuit):
+            schedule(operation, qubits, clbits)
+        self._reference = simulator._bits(reference, 1, self._numClbits)[0]
+
+        program = []
+        for layer in layers:
+            busy = set()
+            for operation, qubits, clbits, conditionBits, referenceBits in layer:
+                busy.update(qubits)
+                name = operation.name
+                if conditionBits:
+                    value = int(operation.condition[1])
+                    expected = np.array([((value >> i) & 1) ^ referenceBit for i, referenceBit in enumerate(referenceBits)], dtype=bool)
+                    referenceTaken = not expected.any()
+                    program.append(("conditional", name, qubits[0], conditionBits, expected, referenceTaken))
+                elif name == "measure":
+                    program.append(("measure", qubits[0], clbits[0], self._measureChannel.newLocation()))
+                elif name == "reset":
+                    program.append(("reset", qubits[0], self._resetChannel.newLocation()))
+                elif name in _TWO_QUBIT_GATES:
+                    program.append((name, qubits[0], qubits[1], self._twoQubitChannel.newLocation()))
+                elif name in ("h", "s", "sdg"):
+                    program.append((name, qubits[0], self._gateChannel.newLocation()))
+                else:
+                    program.append(("pauli", qubits[0], self._gateChannel.newLocation()))
+
+            if self._idleChannel.probability > 0:
+                idle = [qubit for qubit in range(self._numQubits) if qubit not in busy]
+                program.append(("idle", idle, [self._idleChannel.newLocation() for qubit in idle]))
+        return program
+
+    def reseed(self, seed):
+        """
+        Resets the random number generator used to sample errors, so that batches of shots can be sampled reproducibly. The reference shot is unchanged.
+
+        Parameters
+        ----------
+        seed : int or numpy.random.SeedSequence
+            The new seed.
+        """
+        self._rng = np.random.default_rng(seed)
+
+    def sampleFlips(self, shots):
+        """
+        Samples which measurement outcomes differ from the reference shot.
+
+        Parameters
+        ----------
+        shots : int
+            The number of shots to sample.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint64`` array of shape ``(numClbits, ceil(shots/64))``, where bit ``j%64`` of word ``j//64`` of row ``i`` is set if clbit ``i`` of shot ``j`` differs from the reference shot.
+        """
+        rng = self._rng
+        numWords = (shots+63)//64
+
+        x = np.zeros((self._numQubits, numWords), dtype=np.uint64)
+        z = rng.integers(0, 2**64, (self._numQubits, numWords), dtype=np.uint64)
+        flips = np.zeros((self._numClbits, numWords), dtype=np.uint64)
+
+        channels = {}
+        for channel in (self._gateChannel, self._twoQubitChannel, self._idleChannel, self._measureChannel, self._resetChannel):
+            channels[channel] = channel.sample(shots, rng)
+
+        def hits(channel, location):
+            hitShots, paulis, bounds = channels[channel]
+            start, stop = bounds[location], bounds[location+1]
+            if start == stop:
+                return None
+            shotsHit = hitShots[start:stop]
+            return shotsHit >> 6, np.uint64(1) << (shotsHit & 63).astype(np.uint64), paulis[start:stop]
+
+        def inject(channel, location, qubits):
+            hit = hits(channel, location)
+            if hit == None:
+                return
+            words, bits, paulis = hit
+            for i, qubit in enumerate(qubits):
+                pauli = paulis >> np.uint64(2*i)
+                np.bitwise_xor.at(x[qubit], words, bits*(pauli & np.uint64(1)))
+                np.bitwise_xor.at(z[qubit], words, bits*((pauli >> np.uint64(1)) & np.uint64(1)))
+
+        for instruction in self._program:
+            kind = instruction[0]
+            if kind == "h":
+                qubit = instruction[1]
+                x[qubit], z[qubit] = z[qubit], x[qubit].copy()
+                inject(self._gateChannel, instruction[2], [qubit])
+            elif kind in ("s", "sdg"):
+                qubit = instruction[1]
+                z[qubit] ^= x[qubit]
+                inject(self._gateChannel, instruction[2], [qubit])
+            elif kind == "pauli":
+                inject(self._gateChannel, instruction[2], [instruction[1]])
+            elif kind == "cx":
+                control, target = instruction[1], instruction[2]
+                x[target] ^= x[control]
+                z[control] ^= z[target]
+                inject(self._twoQubitChannel, instruction[3], [control, target])
+            elif kind == "cz":
+                control, target = instruction[1], instruction[2]
+                z[control] ^= x[target]
+                z[target] ^= x[control]
+                inject(self._twoQubitChannel, instruction[3], [control, target])
+            elif kind == "swap":
+                qubitA, qubitB = instruction[1], instruction[2]
+                x[[qubitA, qubitB]] = x[[qubitB, qubitA]]
+                z[[qubitA, qubitB]] = z[[qubitB, qubitA]]
+                inject(self._twoQubitChannel, instruction[3], [qubitA, qubitB])
+            elif kind == "measure":
+                qubit, clbit = instruction[1], instruction[2]
+                flips[clbit] = x[qubit]
+                hit = hits(self._measureChannel, instruction[3])
+                if hit != None:
+                    np.bitwise_xor.at(flips[clbit], hit[0], hit[1])
+                z[qubit] = rng.integers(0, 2**64, numWords, dtype=np.uint64)
+            elif kind == "reset":
+                qubit = instruction[1]
+                x[qubit] = 0
+                z[qubit] = rng.integers(0, 2**64, numWords, dtype=np.uint64)
+                inject(self._resetChannel, instruction[2], [qubit])
+            elif kind == "conditional":
+                name, qubit, conditionBits, expected, referenceTaken = instruction[1:]
+                taken = np.full(numWords, ~np.uint64(0), dtype=np.uint64)
+                for clbit, flipped in zip(conditionBits, expected):
+                    taken &= flips[clbit] if flipped else ~flips[clbit]
+                if referenceTaken:
+                    taken = ~taken
+                if name in ("x", "y"):
+                    x[qubit] ^= taken
+                if name in ("z", "y"):
+                    z[qubit] ^= taken
+            else:
+                for qubit, location in zip(instruction[1], instruction[2]):
+                    inject(self._idleChannel, location, [qubit])
+
+        return flips
+
+    def sample(self, shots):
+        """
+        Samples the measurement outcomes of the circuit.
+
+        Parameters
+        ----------
+        shots : int
+            The number of shots to sample.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` array of shape ``(shots, numClbits)`` whose column ``i`` holds clbit ``i`` of each shot, in the format used by :mod:`Decoding`.
+        """
+        return _unpackShots(self.sampleFlips(shots), shots).T ^ self._reference
+
+    def logicalErrors(self, shots, dataRegisters, decoder = None):
+        """
+        Samples which code blocks are decoded to a different logical outcome than the reference shot.
+        Since the errors are tracked relative to the reference shot, this is only the logical error of each block if its logical outcome is deterministic in the absence of noise.
+
+        Parameters
+        ----------
+        shots : int
+            The number of shots to sample.
+        dataRegisters : list(ClassicalRegister)
+            The registers holding the transversal measurement of each code block, such as the values of the ``logicalMeasurements`` entry set by :class:`FaultTolerance`.
+        decoder : SyndromeDecoder, Optional
+            The decoder for the transversal measurements. By default, the decoder of the Steane code.
+
+        Returns
+        -------
+        numpy.ndarray
+            A boolean array of shape ``(shots, len(dataRegisters))``.
+        """
+        if decoder == None:
+            import Steane
+            from Decoding import SyndromeDecoder
+            decoder = SyndromeDecoder(Steane.SteaneSyndromeCorrector())
+
+        flips = self.sampleFlips(shots)
+        errors = np.zeros((shots, len(dataRegisters)), dtype=bool)
+        for i, register in enumerate(dataRegisters):
+            clbits = [self._circuit.find_bit(clbit).index for clbit in register]
+            errors[:, i] = decoder.decode(_unpackShots(flips[clbits], shots).T)
+        return errors
+
+    def logicalErrorRate(self, shots, dataRegisters, decoder = None, batchSize = 2**20):
+        """
+        Estimates the probability that any code block is decoded to a different logical outcome than the reference shot, as described in :meth:`logicalErrors`.
+
+        Parameters
+        ----------
+        shots : int
+            The number of shots to sample.
+        dataRegisters : list(ClassicalRegister)
+            The registers holding the transversal measurement of each code block.
+        decoder : SyndromeDecoder, Optional
+            The decoder for the transversal measurements. By default, the decoder of the Steane code.
+        batchSize : int, Optional
+            The largest number of shots sampled at once, which bounds the memory used.
+
+        Returns
+        -------
+        float
+            The fraction of shots with a logical error.
+        """
+        numErrors = 0
+        for start in range(0, shots, batchSize):
+            numErrors += int(self.logicalErrors(min(batchSize, shots-start), dataRegisters, decoder).any(axis=1).sum())
+        return numErrors/shots
+
+
+def _unpackShots(words, shots):
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1, bitorder="little")[..., :shots]
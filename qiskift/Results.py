@@ -0,0 +1,289 @@
+"""
+The Results module stores the per-shot measurement results of large jobs as a bit-packed NumPy matrix.
+Every classical register of the circuit is given its own whole bytes in each row, so the bits of a register can be read as a view of the matrix without copying, and registers of at most 8 bits can be read as their values directly.
+"""
+
+import numpy as np
+from qiskit.circuit import QuantumCircuit
+from qiskit.dagcircuit import DAGCircuit
+
+
+def _registerList(registers):
+    if isinstance(registers, QuantumCircuit):
+        return list(registers.cregs)
+    if isinstance(registers, DAGCircuit):
+        return list(registers.cregs.values())
+    return list(registers)
+
+
+class PackedShots:
+    """
+    The classical bits of every shot of a circuit, packed so that each classical register starts on a byte boundary.
+
+    Row ``s`` of ``packed`` holds shot ``s``. Register ``registers[i]`` occupies ``(registers[i].size+7)//8`` bytes starting at byte ``offsets[registers[i].name]``, and bit ``j`` of the register is bit ``j%8`` of byte ``j//8``, counting from the least significant bit, as given by ``numpy.packbits(..., bitorder="little")``.
+    The matrix can be kept on disk as a ``.npy`` file through ``numpy.memmap``, so runs of tens of millions of shots can be ingested and decoded in batches without holding them in memory.
+
+    Parameters
+    ----------
+    registers : QuantumCircuit, DAGCircuit, list(ClassicalRegister)
+        The circuit whose classical registers are stored, or the registers themselves, such as the registers of the layers yielded by :func:`encodeLayers`. Their order must be the order of the classical bits of the circuit.
+    numShots : int
+        The number of shots.
+    filename : str, Optional
+        If provided, the matrix is created as a memory-mapped ``.npy`` file at ``filename`` rather than in memory.
+
+    Attributes
+    ----------
+    registers : list(ClassicalRegister)
+        The stored registers, in order.
+    packed : numpy.ndarray
+        The ``uint8`` matrix of shape ``(numShots, numBytes)``.
+    offsets : dict(str, int)
+        The first byte of each register in a row, keyed by register name.
+
+    Methods
+    -------
+    fromMemory :
+        Packs a list of per-shot bitstrings.
+    fromBits :
+        Packs an array of bits.
+    open :
+        Opens a matrix stored on disk.
+    addMemory :
+        Packs per-shot bitstrings into a range of rows.
+    addBits :
+        Packs an array of bits into a range of rows.
+    register :
+        Gives the packed bytes of a register, as a view of the matrix.
+    registerBits :
+        Gives the bits of a register.
+    registerValues :
+        Gives the values of a register as integers.
+
+    Examples
+    --------
+    >>> shots = PackedShots.fromMemory(result.get_memory(), circuit)
+    >>> syndromes = shots.registerValues("measure0")
+    """
+    def __init__(self, registers, numShots, filename = None, _packed = None):
+        self.registers = _registerList(registers)
+        self.offsets = {}
+        self._sizes = {}
+        numBytes = 0
+        for register in self.registers:
+            self.offsets[register.name] = numBytes
+            self._sizes[register.name] = register.size
+            numBytes += (register.size+7)//8
+
+        if _packed is not None:
+            if _packed.shape[1] != numBytes:
+                raise ValueError("The stored matrix has " + str(_packed.shape[1]) + " bytes per shot, but the registers need " + str(numBytes))
+            self.packed = _packed
+        elif filename == None:
+            self.packed = np.zeros((numShots, numBytes), dtype=np.uint8)
+        else:
+            self.packed = np.lib.format.open_memmap(filename, mode="w+", dtype=np.uint8, shape=(numShots, numBytes))
+
+        self._bitColumns = None
+        self._paddingMask = None
+
+    @property
+    def numShots(self):
+        return self.packed.shape[0]
+
+    @classmethod
+    def fromMemory(cls, memory, registers, filename = None, batchSize = 2**20):
+        """
+        Packs a list of per-shot bitstrings, as returned by ``Result.get_memory``.
+
+        Parameters
+        ----------
+        memory : list(str)
+            One binary string per shot, in the format of the keys of Qiskit counts, optionally split into registers by spaces.
+        registers : QuantumCircuit, DAGCircuit, list(ClassicalRegister)
+            The circuit which produced the bitstrings, or its classical registers.
+        filename : str, Optional
+            If provided, the matrix is created as a memory-mapped ``.npy`` file at ``filename``.
+        batchSize : int, Optional
+            The largest number of bitstrings converted at once, which bounds the temporary memory used.
+
+        Returns
+        -------
+        PackedShots
+            The packed shots.
+        """
+        shots = cls(registers, len(memory), filename)
+        for start in range(0, len(memory), batchSize):
+            shots.addMemory(memory[start:start+batchSize], start)
+        return shots
+
+    @classmethod
+    def fromBits(cls, bits, registers, filename = None):
+        """
+        Packs an array of bits, such as the one returned by :meth:`StabilizerSimulator.sample`.
+
+        Parameters
+        ----------
+        bits : numpy.ndarray
+            An array of shape ``(numShots, numClbits)`` whose column ``i`` holds clbit ``i`` of each shot.
+        registers : QuantumCircuit, DAGCircuit, list(ClassicalRegister)
+            The circuit which produced the bits, or its classical registers.
+        filename : str, Optional
+            If provided, the matrix is created as a memory-mapped ``.npy`` file at ``filename``.
+
+        Returns
+        -------
+        PackedShots
+            The packed shots.
+        """
+        shots = cls(registers, len(bits), filename)
+        shots.addBits(bits, 0)
+        return shots
+
+    @classmethod
+    def open(cls, filename, registers, mode = "r"):
+        """
+        Opens a matrix stored on disk by an earlier :class:`PackedShots`, without reading it into memory.
+
+        Parameters
+        ----------
+        filename : str
+            The ``.npy`` file holding the matrix.
+        registers : QuantumCircuit, DAGCircuit, list(ClassicalRegister)
+            The circuit which produced the shots, or its classical registers, in the same order as when the matrix was created.
+        mode : str, Optional
+            The mode passed to ``numpy.load``, such as ``"r"`` for read-only access or ``"r+"`` to edit the existing shots in place. The number of shots of a memory map is fixed, so shots cannot be added to it.
+
+        Returns
+        -------
+        PackedShots
+            The packed shots, backed by the file.
+        """
+        packed = np.load(filename, mmap_mode=mode)
+        return cls(registers, packed.shape[0], _packed=packed)
+
+    def _columns(self):
+        """
+        Returns, for every bit of a packed row, the clbit it is read from, along with a mask clearing the padding bits at the end of each register.
+        """
+        if self._bitColumns is None:
+            clbitIndices = {}
+            for register in self.registers:
+                for clbit in register:
+                    clbitIndices.setdefault(clbit, len(clbitIndices))
+
+            columns = np.zeros(self.packed.shape[1]*8, dtype=np.int64)
+            padding = np.zeros(self.packed.shape[1]*8, dtype=bool)
+            for register in self.registers:
+                start = 8*self.offsets[register.name]
+                columns[start:start+register.size] = [clbitIndices[clbit] for clbit in register]
+                padding[start+register.size:start+8*((register.size+7)//8)] = True
+
+            self._numClbits = len(clbitIndices)
+            self._bitColumns = columns
+            self._paddingMask = np.packbits(~padding, bitorder="little")
+        return self._bitColumns, self._paddingMask
+
+    def _checkWidth(self, numClbits):
+        if numClbits != self._numClbits:
+            raise ValueError("The shots have " + str(numClbits) + " classical bits, but the registers have " + str(self._numClbits))
+
+    def addBits(self, bits, start):
+        """
+        Packs an array of bits into the rows starting at ``start``.
+
+        Parameters
+        ----------
+        bits : numpy.ndarray
+            An array of shape ``(numRows, numClbits)`` whose column ``i`` holds clbit ``i`` of each shot, where the clbits are numbered in the order of the registers.
+        start : int
+            The first row to fill.
+        """
+        columns, mask = self._columns()
+        self._checkWidth(bits.shape[1])
+        self.packed[start:start+len(bits)] = np.packbits(np.take(bits, columns, axis=1) != 0, axis=1, bitorder="little") & mask
+
+    def addMemory(self, memory, start):
+        """
+        Packs per-shot bitstrings into the rows starting at ``start``.
+
+        Parameters
+        ----------
+        memory : list(str)
+            One binary string per shot, in the format of the keys of Qiskit counts, optionally split into registers by spaces. Every string must have the same format.
+        start : int
+            The first row to fill.
+        """
+        if len(memory) == 0:
+            return
+
+        first = memory[0]
+        columns = np.array([i for i in range(len(first)-1, -1, -1) if first[i] != " "], dtype=np.int64)
+        characters = np.frombuffer("".join(memory).encode("ascii"), dtype=np.uint8).reshape(len(memory), len(first))
+
+        bitColumns, mask = self._columns()
+        self._checkWidth(len(columns))
+        self.packed[start:start+len(memory)] = np.packbits(np.take(characters, columns[bitColumns], axis=1) == ord("1"), axis=1, bitorder="little") & mask
+
+    def register(self, register):
+        """
+        Gives the packed bytes of a register, as a view of the matrix.
+
+        Parameters
+        ----------
+        register : ClassicalRegister, str
+            The register, or its name.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` view of shape ``(numShots, (register.size+7)//8)``. Bit ``j`` of the register is bit ``j%8`` of byte ``j//8``, counting from the least significant bit, so for registers of at most 8 bits the single byte is the value of the register.
+        """
+        name = register if isinstance(register, str) else register.name
+        start = self.offsets[name]
+        return self.packed[:, start:start+(self._sizes[name]+7)//8]
+
+    def registerBits(self, register, shots = slice(None)):
+        """
+        Gives the bits of a register, in the format used by :func:`registerBits` of :mod:`Decoding`.
+
+        Parameters
+        ----------
+        register : ClassicalRegister, str
+            The register, or its name.
+        shots : slice, numpy.ndarray, Optional
+            The shots to unpack. By default, every shot.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` array of shape ``(numShots, register.size)`` whose column ``i`` holds bit ``i`` of the register.
+        """
+        packed = self.register(register)[shots]
+        name = register if isinstance(register, str) else register.name
+        return np.unpackbits(packed, axis=1, count=self._sizes[name], bitorder="little")
+
+    def registerValues(self, register, shots = slice(None)):
+        """
+        Gives the values of a register as integers, with bit ``i`` of the register as the coefficient of ``2**i``.
+
+        Parameters
+        ----------
+        register : ClassicalRegister, str
+            The register, or its name. It must have at most 64 bits.
+        shots : slice, numpy.ndarray, Optional
+            The shots to read. By default, every shot.
+
+        Returns
+        -------
+        numpy.ndarray
+            An ``int64`` array of shape ``(numShots,)``.
+        """
+        packed = self.register(register)[shots]
+        if packed.shape[1] > 8:
+            raise ValueError("Register values are limited to 64 bits")
+
+        values = packed[:, 0].astype(np.int64)
+        for byte in range(1, packed.shape[1]):
+            values |= packed[:, byte].astype(np.int64) << (8*byte)
+        return values
@@ -0,0 +1,440 @@
+"""
+The StabilizerSimulator module contains a stabilizer (tableau) simulator for the Clifford circuits produced by qiskift.
+It follows the algorithm of Aaronson and Gottesman, storing the tableau as NumPy arrays packed 64 qubits to a word, so that its cost grows polynomially rather than exponentially with the number of qubits.
+The signs of the tableau and the classical bits are stored separately for every shot, packed 8 shots to a byte, so all shots are simulated together.
+"""
+
+import numpy as np
+from qiskit.circuit import QuantumCircuit, ClassicalRegister
+from qiskit.dagcircuit import DAGCircuit
+
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_PAULIS = {"x", "y", "z"}
+
+
+def _popcount(words):
+    return _POPCOUNT[np.ascontiguousarray(words).view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+def _productPhase(x1, z1, x2, z2):
+    """
+    Returns ``k`` such that the product of the unsigned Paulis ``(x1, z1)`` and ``(x2, z2)`` is :math:`i^k` times the unsigned Pauli ``(x1^x2, z1^z2)``, computed for every row at once.
+    """
+    x1z2 = x1 & z2
+    anticommuting = (x2 & z1) ^ x1z2
+    negative = anticommuting & (x1 ^ x2 ^ z1 ^ z2 ^ x1z2)
+    return (_popcount(anticommuting) + 2*_popcount(negative)) & 3
+
+
+class _Branch:
+    """
+    The tableau of a group of shots that have had the same Clifford operations applied to them, together with the signs of the tableau and the classical bits of each shot.
+    Rows ``0`` to ``n-1`` of the tableau are the destabilizers and rows ``n`` to ``2n-1`` are the stabilizers.
+    """
+    def __init__(self, x, z, r, clbits, shots):
+        self.x = x
+        self.z = z
+        self.r = r
+        self.clbits = clbits
+        self.shots = shots
+
+    @classmethod
+    def initial(cls, numQubits, numClbits, numShots):
+        numBytes = (numShots+7)//8
+        empty = np.zeros((0, 0), dtype=np.uint64)
+        return cls(empty, empty, np.zeros((0, numBytes), dtype=np.uint8), np.zeros((0, numBytes), dtype=np.uint8), np.arange(numShots)).extended(numQubits, numClbits)
+
+    def extended(self, numQubits, numClbits):
+        """
+        Returns the branch with new qubits in the :math:`|0\\rangle` state and new classical bits set to ``0`` added after the existing ones, so that it has ``numQubits`` qubits and ``numClbits`` classical bits.
+        """
+        n = self.x.shape[0]//2
+        numWords = (numQubits+63)//64
+        x = np.zeros((2*numQubits, numWords), dtype=np.uint64)
+        z = np.zeros((2*numQubits, numWords), dtype=np.uint64)
+        r = np.zeros((2*numQubits, self.r.shape[1]), dtype=np.uint8)
+        for new, old in ((x, self.x), (z, self.z)):
+            new[:n, :old.shape[1]] = old[:n]
+            new[numQubits:numQubits+n, :old.shape[1]] = old[n:]
+        r[:n] = self.r[:n]
+        r[numQubits:numQubits+n] = self.r[n:]
+        for qubit in range(n, numQubits):
+            word, shift = _position(qubit)
+            x[qubit, word] = np.uint64(1) << shift
+            z[numQubits+qubit, word] = np.uint64(1) << shift
+
+        clbits = np.zeros((numClbits, self.clbits.shape[1]), dtype=np.uint8)
+        clbits[:len(self.clbits)] = self.clbits
+        return _Branch(x, z, r, clbits, self.shots)
+
+    def select(self, mask):
+        shots = np.unpackbits(mask, count=len(self.shots), bitorder="little").astype(bool)
+        return _Branch(self.x.copy(), self.z.copy(), _selectShots(self.r, shots), _selectShots(self.clbits, shots), self.shots[shots])
+
+    def column(self, qubit):
+        word, shift = _position(qubit)
+        return (self.x[:, word] >> shift) & np.uint64(1), (self.z[:, word] >> shift) & np.uint64(1), word, shift
+
+    def flipSigns(self, rows, mask = None):
+        if mask is None:
+            self.r[np.flatnonzero(rows)] ^= np.uint8(0xFF)
+        else:
+            self.r[np.flatnonzero(rows)] ^= mask
+
+    def h(self, qubit):
+        xa, za, word, shift = self.column(qubit)
+        self.flipSigns(xa & za)
+        swap = (xa ^ za) << shift
+        self.x[:, word] ^= swap
+        self.z[:, word] ^= swap
+
+    def s(self, qubit):
+        xa, za, word, shift = self.column(qubit)
+        self.flipSigns(xa & za)
+        self.z[:, word] ^= xa << shift
+
+    def sdg(self, qubit):
+        self.pauli("z", qubit)
+        self.s(qubit)
+
+    def pauli(self, name, qubit, mask = None):
+        xa, za, word, shift = self.column(qubit)
+        if name == "x":
+            self.flipSigns(za, mask)
+        elif name == "z":
+            self.flipSigns(xa, mask)
+        else:
+            self.flipSigns(xa ^ za, mask)
+
+    def cx(self, control, target):
+        xa, za, wordA, shiftA = self.column(control)
+        xb, zb, wordB, shiftB = self.column(target)
+        self.flipSigns(xa & zb & (xb ^ za ^ np.uint64(1)))
+        self.x[:, wordB] ^= xa << shiftB
+        self.z[:, wordA] ^= zb << shiftA
+
+    def cz(self, control, target):
+        self.h(target)
+        self.cx(control, target)
+        self.h(target)
+
+    def swap(self, qubitA, qubitB):
+        self.cx(qubitA, qubitB)
+        self.cx(qubitB, qubitA)
+        self.cx(qubitA, qubitB)
+
+    def measure(self, qubit, rng):
+        n = self.x.shape[0]//2
+        xa, za, word, shift = self.column(qubit)
+        anticommuting = np.flatnonzero(xa[n:])
+
+        if anticommuting.size == 0:
+            rows = np.flatnonzero(xa[:n]) + n
+            xPrefix = np.bitwise_xor.accumulate(self.x[rows], axis=0)
+            zPrefix = np.bitwise_xor.accumulate(self.z[rows], axis=0)
+            phase = _productPhase(xPrefix[:-1], zPrefix[:-1], self.x[rows[1:]], self.z[rows[1:]]).sum() & 3
+
+            outcome = np.bitwise_xor.reduce(self.r[rows], axis=0)
+            if phase & 2:
+                outcome ^= np.uint8(0xFF)
+            return outcome
+
+        pivot = n + anticommuting[0]
+        rows = np.flatnonzero(xa)
+        rows = rows[rows != pivot]
+
+        phase = _productPhase(self.x[rows], self.z[rows], self.x[pivot], self.z[pivot])
+        self.x[rows] ^= self.x[pivot]
+        self.z[rows] ^= self.z[pivot]
+        self.r[rows] ^= self.r[pivot]
+        self.r[rows[(phase & 2) != 0]] ^= np.uint8(0xFF)
+
+        self.x[pivot-n] = self.x[pivot]
+        self.z[pivot-n] = self.z[pivot]
+        self.r[pivot-n] = self.r[pivot]
+
+        self.x[pivot] = 0
+        self.z[pivot] = 0
+        self.z[pivot, word] = np.uint64(1) << shift
+        self.r[pivot] = rng.integers(0, 256, self.r.shape[1], dtype=np.uint8)
+        return self.r[pivot].copy()
+
+    def reset(self, qubit, rng):
+        outcome = self.measure(qubit, rng)
+        self.pauli("x", qubit, outcome)
+
+    def conditionMask(self, clbits, value):
+        mask = np.full(self.r.shape[1], 0xFF, dtype=np.uint8)
+        for i, clbit in enumerate(clbits):
+            if (value >> i) & 1:
+                mask &= self.clbits[clbit]
+            else:
+                mask &= ~self.clbits[clbit]
+        return mask
+
+
+def _position(qubit):
+    return qubit//64, np.uint64(qubit%64)
+
+def _selectShots(packed, shots):
+    return np.packbits(np.unpackbits(packed, axis=1, count=len(shots), bitorder="little")[:, shots], axis=1, bitorder="little")
+
+def _mergeBranches(branches):
+    groups = {}
+    for branch in branches:
+        groups.setdefault((branch.x.tobytes(), branch.z.tobytes()), []).append(branch)
+
+    merged = []
+    for group in groups.values():
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+
+        counts = [len(branch.shots) for branch in group]
+        unpack = lambda packed, count: np.unpackbits(packed, axis=1, count=count, bitorder="little")
+        r = np.packbits(np.concatenate([unpack(branch.r, count) for branch, count in zip(group, counts)], axis=1), axis=1, bitorder="little")
+        clbits = np.packbits(np.concatenate([unpack(branch.clbits, count) for branch, count in zip(group, counts)], axis=1), axis=1, bitorder="little")
+        merged.append(_Branch(group[0].x, group[0].z, r, clbits, np.concatenate([branch.shots for branch in group])))
+    return merged
+
+
+class StabilizerSimulator:
+    """
+    A class for sampling the classical outputs of Clifford circuits with a stabilizer tableau.
+
+    The simulator supports the ``id``, ``h``, ``s``, ``sdg``, ``x``, ``y``, ``z``, ``cx``, ``cz`` and ``swap`` gates, along with measurements, resets, barriers and classical conditions on any of these.
+    Any other instruction is simulated through its definition, so the encoder and checker instructions created by the classes of :mod:`BaseFaultTolerance` can be simulated directly.
+
+    Conditional Pauli gates only change the signs of the tableau, so they are applied to every shot at once.
+    Other conditional operations split the shots into groups with separate tableaus, which are merged again whenever their tableaus become equal.
+    The ``if_else``, ``for_loop`` and ``while_loop`` control flow operations are simulated in the same way, as long as their conditions are on a classical register or bit rather than a classical expression, and their bodies do not use ``break_loop`` or ``continue_loop``.
+
+    Parameters
+    ----------
+    seed : int, Optional
+        The seed for the random measurement outcomes.
+
+    Methods
+    -------
+    sample :
+        Samples the classical bits of a circuit.
+    sampleStream :
+        Samples the classical bits of a circuit given as a stream of layers.
+    run :
+        Samples the counts of a circuit.
+    """
+    def __init__(self, seed = None):
+        self._rng = np.random.default_rng(seed)
+
+    def sample(self, circuit, shots = 1024):
+        """
+        Samples the classical bits of a circuit.
+
+        Parameters
+        ----------
+        circuit : QuantumCircuit or DAGCircuit
+            The circuit to simulate.
+        shots : int, Optional
+            The number of shots to sample.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` array of shape ``(shots, numClbits)`` whose column ``i`` holds clbit ``i`` of each shot, in the format used by :mod:`Decoding`.
+        """
+        branches = [_Branch.initial(len(circuit.qubits), len(circuit.clbits), shots)]
+        for operation, qubits, clbits in _operations(circuit):
+            branches = self._apply(branches, operation, qubits, clbits)
+
+        return self._bits(branches, shots, len(circuit.clbits))
+
+    def sampleStream(self, layers, shots = 1024):
+        """
+        Samples the classical bits of a circuit given as a stream of layers, such as the one produced by :func:`encodeLayers`, so the circuit never has to be held in memory as a whole.
+        The tableau grows as the layers add registers, so only the tableau and a single layer are held in memory at once.
+
+        Parameters
+        ----------
+        layers : iterable(EncodedLayer)
+            The layers of the circuit, in order. Each layer gives the registers it adds in ``layer.registers`` and its instructions in ``layer.instructions``.
+        shots : int, Optional
+            The number of shots to sample.
+
+        Returns
+        -------
+        numpy.ndarray
+            A ``uint8`` array of shape ``(shots, numClbits)`` whose column ``i`` holds the ``i``-th classical bit added by the layers of each shot, in the format used by :mod:`Decoding`.
+        """
+        qubitIndex = {}
+        clbitIndex = {}
+        branches = [_Branch.initial(0, 0, shots)]
+        for layer in layers:
+            for register in layer.registers:
+                indices = clbitIndex if isinstance(register, ClassicalRegister) else qubitIndex
+                for bit in register:
+                    indices.setdefault(bit, len(indices))
+            if 2*len(qubitIndex) != branches[0].x.shape[0] or len(clbitIndex) != len(branches[0].clbits):
+                branches = [branch.extended(len(qubitIndex), len(clbitIndex)) for branch in branches]
+
+            for instruction in layer.instructions:
+                qubits = [qubitIndex[qubit] for qubit in instruction.qubits]
+                clbits = _Clbits([clbitIndex[clbit] for clbit in instruction.clbits], clbitIndex)
+                branches = self._apply(branches, instruction.operation, qubits, clbits)
+
+        return self._bits(branches, shots, len(clbitIndex))
+
+    def _bits(self, branches, shots, numClbits):
+        bits = np.zeros((shots, numClbits), dtype=np.uint8)
+        for branch in branches:
+            bits[branch.shots] = np.unpackbits(branch.clbits, axis=1, count=len(branch.shots), bitorder="little").T
+        return bits
+
+    def run(self, circuit, shots = 1024):
+        """
+        Samples the counts of a circuit.
+
+        Parameters
+        ----------
+        circuit : QuantumCircuit or DAGCircuit
+            The circuit to simulate.
+        shots : int, Optional
+            The number of shots to sample.
+
+        Returns
+        -------
+        dict(str, int)
+            The number of times each outcome occurred, keyed in the same format as Qiskit's counts.
+        """
+        bits = self.sample(circuit, shots)
+        outcomes, counts = np.unique(bits, axis=0, return_counts=True)
+
+        cregs = circuit.cregs if isinstance(circuit, QuantumCircuit) else list(circuit.cregs.values())
+        registers = [[circuit.find_bit(clbit).index for clbit in reversed(creg)] for creg in reversed(cregs)]
+
+        result = {}
+        for outcome, count in zip(outcomes, counts):
+            key = " ".join("".join("01"[outcome[i]] for i in register) for register in registers)
+            result[key] = int(count)
+        return result
+
+    def _split(self, branches, condition, clbits):
+        if not isinstance(condition, tuple):
+            raise ValueError("The stabilizer simulator cannot simulate the condition " + str(condition))
+
+        if isinstance(condition[0], ClassicalRegister):
+            conditionBits = [clbits.mapping[clbit] for clbit in condition[0]]
+        else:
+            conditionBits = [clbits.mapping[condition[0]]]
+
+        taken = []
+        notTaken = []
+        for branch in branches:
+            mask = branch.conditionMask(conditionBits, int(condition[1]))
+            shots = np.unpackbits(mask, count=len(branch.shots), bitorder="little")
+            if shots.all():
+                taken.append(branch)
+            elif shots.any():
+                taken.append(branch.select(mask))
+                notTaken.append(branch.select(~mask))
+            else:
+                notTaken.append(branch)
+        return taken, notTaken
+
+    def _applyBlock(self, branches, block, qubits, clbits):
+        for subOperation, subQubits, subClbits in _operations(block, qubits, clbits):
+            branches = self._apply(branches, subOperation, subQubits, subClbits)
+        return branches
+
+    def _apply(self, branches, operation, qubits, clbits):
+        name = operation.name
+        if name in ("barrier", "id", "delay"):
+            return branches
+
+        if name == "if_else":
+            taken, notTaken = self._split(branches, operation.condition, clbits)
+            if taken:
+                taken = self._applyBlock(taken, operation.blocks[0], qubits, clbits)
+            if notTaken and len(operation.blocks) > 1:
+                notTaken = self._applyBlock(notTaken, operation.blocks[1], qubits, clbits)
+            applied = taken + notTaken
+            return _mergeBranches(applied) if len(applied) > 1 else applied
+
+        if name == "for_loop":
+            for index in operation.params[0]:
+                branches = self._applyBlock(branches, operation.blocks[0], qubits, clbits)
+            return branches
+
+        if name == "while_loop":
+            finished = []
+            while branches:
+                branches, notTaken = self._split(branches, operation.condition, clbits)
+                finished += notTaken
+                if branches:
+                    branches = self._applyBlock(branches, operation.blocks[0], qubits, clbits)
+            return _mergeBranches(finished) if len(finished) > 1 else finished
+
+        condition = operation.condition
+        if condition != None:
+            if name in _PAULIS:
+                if isinstance(condition[0], ClassicalRegister):
+                    conditionBits = [clbits.mapping[clbit] for clbit in condition[0]]
+                else:
+                    conditionBits = [clbits.mapping[condition[0]]]
+                for branch in branches:
+                    branch.pauli(name, qubits[0], branch.conditionMask(conditionBits, int(condition[1])))
+                return branches
+
+            unconditioned = operation.to_mutable()
+            unconditioned.condition = None
+
+            taken, applied = self._split(branches, condition, clbits)
+            for branch in taken:
+                applied.extend(self._apply([branch], unconditioned, qubits, clbits))
+            return _mergeBranches(applied) if len(applied) > 1 else applied
+
+        if name == "measure":
+            for branch in branches:
+                branch.clbits[clbits[0]] = branch.measure(qubits[0], self._rng)
+        elif name == "reset":
+            for branch in branches:
+                branch.reset(qubits[0], self._rng)
+        elif name in _PAULIS:
+            for branch in branches:
+                branch.pauli(name, qubits[0])
+        elif name in ("h", "s", "sdg"):
+            for branch in branches:
+                getattr(branch, name)(qubits[0])
+        elif name in ("cx", "cz", "swap"):
+            for branch in branches:
+                getattr(branch, name)(qubits[0], qubits[1])
+        elif operation.definition != None:
+            branches = self._applyBlock(branches, operation.definition, qubits, clbits)
+        else:
+            raise ValueError("The stabilizer simulator cannot simulate the operation " + name)
+
+        return branches
+
+
+class _Clbits(list):
+    """
+    The indices of the classical bits of an operation, along with the indices of every classical bit of the enclosing circuit, which its condition may refer to.
+    """
+    def __init__(self, indices, mapping):
+        super().__init__(indices)
+        self.mapping = mapping
+
+def _operations(circuit, qubitMap = None, clbitMap = None):
+    """
+    Iterates over the operations of a circuit or DAG, giving each operation with the indices of its qubits and clbits in the outermost circuit.
+    """
+    if isinstance(circuit, DAGCircuit):
+        instructions = ((node.op, node.qargs, node.cargs) for node in circuit.topological_op_nodes())
+    else:
+        instructions = ((instruction.operation, instruction.qubits, instruction.clbits) for instruction in circuit.data)
+
+    qubitIndex = {qubit: i if qubitMap is None else qubitMap[i] for i, qubit in enumerate(circuit.qubits)}
+    clbitIndex = {clbit: i if clbitMap is None else clbitMap[i] for i, clbit in enumerate(circuit.clbits)}
+
+    for operation, qubits, clbits in instructions:
+        yield operation, [qubitIndex[qubit] for qubit in qubits], _Clbits([clbitIndex[clbit] for clbit in clbits], clbitIndex)
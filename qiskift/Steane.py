@@ -11,12 +11,14 @@ $$N_b = Z_1Z_3Z_5Z_6,$$
 and
 $$N_c = Z_2Z_3Z_4Z_6.$$
 More details about each aspect of the Steane code are provided below.
+The circuits implementing each component are built the first time a component is created and are then shared by every component, so creating further components is nearly free.
+The encoders and gates take a ``flat`` option, which builds their circuits from native gates rather than from labelled gates, so encoded circuits can be given to a simulator without being decomposed first. The syndrome detection and correction circuits are always made of native gates.
 """
 
-from BaseFaultTolerance import Encoder,FaultTolerantEncoder,SyndromeDetector,SyndromeCorrector,ErrorCorrector,FaultTolerantGates
+from BaseFaultTolerance import Encoder,FaultTolerantEncoder,SyndromeDetector,SyndromeCorrector,ErrorCorrector,FaultTolerantGates,parityCheckDetector,parityCheckCorrector,_addBody
 from qiskit.circuit import QuantumCircuit,QuantumRegister,AncillaRegister,ClassicalRegister,Qubit
-from qiskit.converters import circuit_to_dag, dag_to_circuit
 from qiskit.circuit.library import CXGate,HGate,XGate,SGate
+import functools
 
 class SteaneEncoder(Encoder):
     """
@@ -27,6 +29,11 @@ class SteaneEncoder(Encoder):
     
     .. figure:: Images/SteaneEncoding.png
 
+    Parameters
+    ----------
+    flat : bool, Optional
+        If ``True``, the encoder is made of native gates rather than wrapped in a single labelled gate, so circuits using it can be run without ``decompose``. By default, the gates are wrapped, which keeps drawings readable.
+
     Methods
     -------
     createEncoderCircuit :
@@ -38,27 +45,32 @@ class SteaneEncoder(Encoder):
     getEncoderDag :
         Adds gates encoding the :math:`|0\\rangle` state to a DAG
     """
-    def __init__(self):
-        qregister = QuantumRegister(size = 7)
-        encoder = QuantumCircuit(qregister,name = "Steane Encoder")
+    def __init__(self, flat = False):
+        super().__init__(_encoderTemplate(flat), 0)
+
 
-        encoder.h(qregister[:3])
+@functools.lru_cache(maxsize=None)
+def _encoderTemplate(flat = False):
+    qregister = QuantumRegister(size = 7)
+    encoder = QuantumCircuit(qregister,name = "Steane Encoder")
 
-        encoder.cx(qregister[2],qregister[3])
-        encoder.cx(qregister[2],qregister[4])
-        encoder.cx(qregister[2],qregister[6])
-        encoder.cx(qregister[1],qregister[3])
-        encoder.cx(qregister[1],qregister[5])
-        encoder.cx(qregister[1],qregister[6])
-        encoder.cx(qregister[0],qregister[4])
-        encoder.cx(qregister[0],qregister[5])
-        encoder.cx(qregister[0],qregister[6])
+    encoder.h(qregister[:3])
 
-        qregister = QuantumRegister(size = 7)
-        encoderCircuit = QuantumCircuit(qregister)
-        encoderCircuit.append(encoder.to_gate(),qargs = qregister)
+    encoder.cx(qregister[2],qregister[3])
+    encoder.cx(qregister[2],qregister[4])
+    encoder.cx(qregister[2],qregister[6])
+    encoder.cx(qregister[1],qregister[3])
+    encoder.cx(qregister[1],qregister[5])
+    encoder.cx(qregister[1],qregister[6])
+    encoder.cx(qregister[0],qregister[4])
+    encoder.cx(qregister[0],qregister[5])
+    encoder.cx(qregister[0],qregister[6])
 
-        super().__init__(encoderCircuit, 0)
+    qregister = QuantumRegister(size = 7)
+    encoderCircuit = QuantumCircuit(qregister)
+    _addBody(encoderCircuit, encoder, qregister, flat)
+
+    return encoderCircuit
 
 
 class SteaneFaultTolerantEncoder(FaultTolerantEncoder):
@@ -70,6 +82,10 @@ class SteaneFaultTolerantEncoder(FaultTolerantEncoder):
     ----------
     numRepeats : int
         The number of times to try to create the $|0\\rangle$ state before giving up.
+    form : str, Optional
+        How the repeated attempts are written out, ``"compact"``, ``"loop"`` or ``"unrolled"``, as described in :class:`FaultTolerantEncoder`.
+    flat : bool, Optional
+        If ``True``, the encoder, the checker and every repeated attempt are written out as native gates, as for :class:`SteaneEncoder`.
 
     Methods
     -------
@@ -82,23 +98,28 @@ class SteaneFaultTolerantEncoder(FaultTolerantEncoder):
     getEncoderDag :
         Adds gates encoding the :math:`|0\\rangle` state to a DAG
     """
-    def __init__(self, numRepeats):
-        qreg = QuantumRegister(7)
-        areg = AncillaRegister(1)
+    def __init__(self, numRepeats, form = "compact", flat = False):
+        super().__init__(SteaneEncoder(flat),_checkerTemplate(flat),1,[0],numRepeats,form,flat)
+
 
-        c = QuantumCircuit(qreg,areg,name = "Checker")
-        c.cx(qreg[3],areg[0])
-        c.cx(qreg[4],areg[0])
-        c.cx(qreg[5],areg[0])
+@functools.lru_cache(maxsize=None)
+def _checkerTemplate(flat = False):
+    qreg = QuantumRegister(7)
+    areg = AncillaRegister(1)
 
-        qreg = QuantumRegister(7)
-        areg = AncillaRegister(1)
-        creg = ClassicalRegister(1)
-        checker = QuantumCircuit(qreg,areg,creg)
-        checker.append(c.to_gate(),qargs=[qbit for qbit in qreg]+[areg[0]])
-        checker.measure(areg[0],creg[0])
+    c = QuantumCircuit(qreg,areg,name = "Checker")
+    c.cx(qreg[3],areg[0])
+    c.cx(qreg[4],areg[0])
+    c.cx(qreg[5],areg[0])
 
-        super().__init__(SteaneEncoder(),checker,1,[0],numRepeats)
+    qreg = QuantumRegister(7)
+    areg = AncillaRegister(1)
+    creg = ClassicalRegister(1)
+    checker = QuantumCircuit(qreg,areg,creg)
+    _addBody(checker, c, [qbit for qbit in qreg]+[areg[0]], flat)
+    checker.measure(areg[0],creg[0])
+
+    return checker
 
 
 class SteaneSyndromeDetector(SyndromeDetector):
@@ -109,6 +130,15 @@ class SteaneSyndromeDetector(SyndromeDetector):
 
     .. figure:: Images/SteaneSyndromeDetection.png
 
+    The 24 CZ and CNOT gates shown are scheduled by :func:`scheduleChecks` into 7 parallel layers, rather than applied one after the other.
+
+    Parameters
+    ----------
+    ringSize : int, Optional
+        If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`. By default, every round uses new classical registers.
+    keepRounds : list(int), Optional
+        The rounds whose syndromes are measured into classical registers which are never reused.
+
     Methods
     -------
     syndromeDetectCircuit :
@@ -116,59 +146,19 @@ class SteaneSyndromeDetector(SyndromeDetector):
     syndromeDetectDag :
         Implements syndrome detection for the given DAG.
     """
-    def __init__(self):
-        qreg = QuantumRegister(size = 7)
-        ancilla = QuantumRegister(size = 6)
-        creg = ClassicalRegister(size = 6)
-
-        detectorCircuit = QuantumCircuit(qreg,ancilla,name = "Steane Syndrome Detection")
-
-        detectorCircuit.h(ancilla)
-
-        detectorCircuit.cz(ancilla[5],qreg[0])
-        detectorCircuit.cz(ancilla[5],qreg[4])
-        detectorCircuit.cz(ancilla[5],qreg[5])
-        detectorCircuit.cz(ancilla[5],qreg[6])
-
-        detectorCircuit.cz(ancilla[4],qreg[1])
-        detectorCircuit.cz(ancilla[4],qreg[3])
-        detectorCircuit.cz(ancilla[4],qreg[5])
-        detectorCircuit.cz(ancilla[4],qreg[6])
-
-        detectorCircuit.cz(ancilla[3],qreg[2])
-        detectorCircuit.cz(ancilla[3],qreg[3])
-        detectorCircuit.cz(ancilla[3],qreg[4])
-        detectorCircuit.cz(ancilla[3],qreg[6])
+    def __init__(self, ringSize = None, keepRounds = ()):
+        super().__init__(_detectorTemplate(), 6, ringSize, keepRounds)
 
 
+@functools.lru_cache(maxsize=None)
+def _detectorTemplate():
+    return parityCheckDetector(_CHECKS, _CHECKS, name = "Steane Syndrome Detection")
 
 
-        detectorCircuit.cx(ancilla[2],qreg[0])
-        detectorCircuit.cx(ancilla[2],qreg[4])
-        detectorCircuit.cx(ancilla[2],qreg[5])
-        detectorCircuit.cx(ancilla[2],qreg[6])
-
-        detectorCircuit.cx(ancilla[1],qreg[1])
-        detectorCircuit.cx(ancilla[1],qreg[3])
-        detectorCircuit.cx(ancilla[1],qreg[5])
-        detectorCircuit.cx(ancilla[1],qreg[6])
-
-        detectorCircuit.cx(ancilla[0],qreg[2])
-        detectorCircuit.cx(ancilla[0],qreg[3])
-        detectorCircuit.cx(ancilla[0],qreg[4])
-        detectorCircuit.cx(ancilla[0],qreg[6])
-
-        detectorCircuit.h(ancilla)
-        
-        measureCircuit = QuantumCircuit(qreg,ancilla,creg)
-        measureCircuit.append(detectorCircuit.to_gate(),[qbit for qbit in qreg]+[a for a in ancilla])
-        measureCircuit.measure(ancilla,creg)
-
-        super().__init__(measureCircuit, 6)
-
 class SteaneSyndromeCorrector(SyndromeCorrector):
     """
     A class for implementing fault tolerant syndrome correction for the Steane code.
+    The correction circuit is generated from the parity-check matrix of the code by :func:`parityCheckCorrector`, with a single conditional gate for each of the 21 correctable syndromes.
     The circuit representation for Syndrome Correction is shown below:
 
     .. figure:: Images/SteaneSyndromeCorrection.png
@@ -181,44 +171,14 @@ class SteaneSyndromeCorrector(SyndromeCorrector):
         Implements syndrome correction for the given DAG.
     """
     def __init__(self):
-        qreg = QuantumRegister(size = 7)
-        creg = ClassicalRegister(size = 6)
-
-        correctorCircuit = QuantumCircuit(qreg,creg,name="Steane Syndrome Correction")
-
-        correctorCircuit.x(qreg[0]).c_if(creg,32)
-        correctorCircuit.x(qreg[1]).c_if(creg,16)
-        correctorCircuit.x(qreg[2]).c_if(creg,8)
-        correctorCircuit.x(qreg[3]).c_if(creg,24)
-        correctorCircuit.x(qreg[4]).c_if(creg,40)
-        correctorCircuit.x(qreg[5]).c_if(creg,48)
-        correctorCircuit.x(qreg[6]).c_if(creg,56)
-
-        correctorCircuit.z(qreg[0]).c_if(creg,4)
-        correctorCircuit.z(qreg[1]).c_if(creg,2)
-        correctorCircuit.z(qreg[2]).c_if(creg,1)
-        correctorCircuit.z(qreg[3]).c_if(creg,3)
-        correctorCircuit.z(qreg[4]).c_if(creg,5)
-        correctorCircuit.z(qreg[5]).c_if(creg,6)
-        correctorCircuit.z(qreg[6]).c_if(creg,7)
-
-        correctorCircuit.z(qreg[0]).c_if(creg,36)
-        correctorCircuit.z(qreg[1]).c_if(creg,18)
-        correctorCircuit.z(qreg[2]).c_if(creg,9)
-        correctorCircuit.z(qreg[3]).c_if(creg,27)
-        correctorCircuit.z(qreg[4]).c_if(creg,45)
-        correctorCircuit.z(qreg[5]).c_if(creg,54)
-        correctorCircuit.z(qreg[6]).c_if(creg,63)
-        
-        correctorCircuit.x(qreg[0]).c_if(creg,36)
-        correctorCircuit.x(qreg[1]).c_if(creg,18)
-        correctorCircuit.x(qreg[2]).c_if(creg,9)
-        correctorCircuit.x(qreg[3]).c_if(creg,27)
-        correctorCircuit.x(qreg[4]).c_if(creg,45)
-        correctorCircuit.x(qreg[5]).c_if(creg,54)
-        correctorCircuit.x(qreg[6]).c_if(creg,63)
-
-        super().__init__(correctorCircuit)
+        super().__init__(_correctorTemplate())
+
+
+_CHECKS = [[1,0,0,0,1,1,1],[0,1,0,1,0,1,1],[0,0,1,1,1,0,1]]
+
+@functools.lru_cache(maxsize=None)
+def _correctorTemplate():
+    return parityCheckCorrector(_CHECKS, _CHECKS, name="Steane Syndrome Correction")
 
 
 class SteaneErrorCorrector(ErrorCorrector):
@@ -226,6 +186,13 @@ class SteaneErrorCorrector(ErrorCorrector):
     A class for implementing non-fault tolerant error correction for the Steane Code.
     This class combines :class:`SteaneSyndromeDetection` and :class:`SteaneSyndromeCorrection` into a single class for ease of use.
 
+    Parameters
+    ----------
+    ringSize : int, Optional
+        If given, the number of classical registers each code block reuses for its syndromes, as described in :class:`SyndromeDetector`. By default, every round uses new classical registers.
+    keepRounds : list(int), Optional
+        The rounds whose syndromes are measured into classical registers which are never reused.
+
     Methods
     -------
     errorCorrectCircuit :
@@ -233,8 +200,8 @@ class SteaneErrorCorrector(ErrorCorrector):
     errorCorrecDag :
         Implements error correction for the given DAG.
     """
-    def __init__(self):
-        super().__init__(SteaneSyndromeDetector(),SteaneSyndromeCorrector())
+    def __init__(self, ringSize = None, keepRounds = ()):
+        super().__init__(SteaneSyndromeDetector(ringSize, keepRounds),SteaneSyndromeCorrector())
 
 
 class SteaneFaultTolerantGates(FaultTolerantGates):
@@ -262,6 +229,11 @@ class SteaneFaultTolerantGates(FaultTolerantGates):
 
               The fault tolerant CNOT gate.
 
+    Parameters
+    ----------
+    flat : bool, Optional
+        If ``True``, each fault tolerant gate is a layer of native gates rather than a single labelled gate.
+
     Methods
     -------
     addGateCircuit :
@@ -269,43 +241,48 @@ class SteaneFaultTolerantGates(FaultTolerantGates):
     addGateDag :
         Adds a fault tolerant gate to the given DAG.
     """
-    def __init__(self):
-        cnotGateQ1 = QuantumRegister(7)
-        cnotGateQ2 = QuantumRegister(7)
-        cnotGate = QuantumCircuit(cnotGateQ1,cnotGateQ2,name = "CNOT")
-        cnotGate.cx(cnotGateQ1,cnotGateQ2)
+    def __init__(self, flat = False):
+        super().__init__(dict(_gateTemplates(flat)))
+
+
+@functools.lru_cache(maxsize=None)
+def _gateTemplates(flat = False):
+    cnotGateQ1 = QuantumRegister(7)
+    cnotGateQ2 = QuantumRegister(7)
+    cnotGate = QuantumCircuit(cnotGateQ1,cnotGateQ2,name = "CNOT")
+    cnotGate.cx(cnotGateQ1,cnotGateQ2)
 
-        cnotQ1 = QuantumRegister(7)
-        cnotQ2 = QuantumRegister(7)
-        cnot = QuantumCircuit(cnotQ1,cnotQ2)
-        cnot.append(cnotGate.to_gate(), qargs = [qbit for qbit in cnotQ1]+[qbit for qbit in cnotQ2])
+    cnotQ1 = QuantumRegister(7)
+    cnotQ2 = QuantumRegister(7)
+    cnot = QuantumCircuit(cnotQ1,cnotQ2)
+    _addBody(cnot, cnotGate, [qbit for qbit in cnotQ1]+[qbit for qbit in cnotQ2], flat)
 
 
-        hGateQ = QuantumRegister(7)
-        hGate = QuantumCircuit(hGateQ,name = "H")
-        hGate.h(hGateQ)
-        hQ = QuantumRegister(7)
-        h = QuantumCircuit(hQ)
-        h.append(hGate, qargs = hQ)
+    hGateQ = QuantumRegister(7)
+    hGate = QuantumCircuit(hGateQ,name = "H")
+    hGate.h(hGateQ)
+    hQ = QuantumRegister(7)
+    h = QuantumCircuit(hQ)
+    _addBody(h, hGate, hQ, flat)
 
-        xGateQ = QuantumRegister(7)
-        xGate = QuantumCircuit(xGateQ,name = "X")
-        xGate.x(xGateQ)
-        xQ = QuantumRegister(7)
-        x = QuantumCircuit(xQ)
-        x.append(xGate, qargs = xQ)
+    xGateQ = QuantumRegister(7)
+    xGate = QuantumCircuit(xGateQ,name = "X")
+    xGate.x(xGateQ)
+    xQ = QuantumRegister(7)
+    x = QuantumCircuit(xQ)
+    _addBody(x, xGate, xQ, flat)
 
-        sGateQ = QuantumRegister(7)
-        sGate = QuantumCircuit(sGateQ,name = "S")
-        sGate.s(sGateQ)
-        sGate.z(sGateQ)
-        sQ = QuantumRegister(7)
-        s = QuantumCircuit(sQ)
-        s.append(sGate, qargs = sQ)
+    sGateQ = QuantumRegister(7)
+    sGate = QuantumCircuit(sGateQ,name = "S")
+    sGate.s(sGateQ)
+    sGate.z(sGateQ)
+    sQ = QuantumRegister(7)
+    s = QuantumCircuit(sQ)
+    _addBody(s, sGate, sQ, flat)
 
-        super().__init__({CXGate().qasm(): (cnot,0), HGate().qasm(): (h,0), XGate().qasm(): (x,0), SGate().qasm(): (s,0)})
+    return {CXGate: (cnot,0), HGate: (h,0), XGate: (x,0), SGate: (s,0)}
 
 
 
 
-        
\ No newline at end of file
+    
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+The Streaming module converts logical circuits into fault tolerant circuits one layer at a time, so that the fault tolerant circuit never has to be held in memory as a whole.
+Each layer of the logical circuit is expanded by the same machinery as the :class:`FaultTolerance` pass into a working circuit, handed to the caller as an :class:`EncodedLayer`, and then cleared from the working circuit, which only keeps its registers.
+"""
+
+from qiskit.circuit import QuantumCircuit
+from qiskit.converters import circuit_to_dag
+from qiskit.dagcircuit import DAGOpNode
+
+from BaseFaultTolerance import FaultTolerance, _makeQregsCircuit
+
+
+class EncodedLayer:
+    """
+    A layer of a fault tolerant circuit, made of the fault tolerant implementation of one layer of the logical circuit.
+
+    Consumers of a stream of layers should add the registers of each layer before applying its instructions. Registers reused by later layers, such as reset ancillas or the syndrome registers of a ring, are only given by the layer which created them.
+
+    Attributes
+    ----------
+    index : int
+        The position of the layer in the stream. Layer ``0`` encodes every logical qubit in its code block, and layer ``i`` for ``i > 0`` implements layer ``i-1`` of the logical circuit.
+    registers : list(QuantumRegister, ClassicalRegister)
+        The registers first used by the layer, with the quantum registers first, each in the order they were created.
+    instructions : list(CircuitInstruction)
+        The instructions of the layer, in the order they should be applied.
+    blocks : dict(Qubit, QuantumRegister)
+        The code block of each logical qubit the layer acts on.
+    measurements : dict(Clbit, ClassicalRegister)
+        The register holding the measurement of each logical clbit measured by the layer.
+    """
+    def __init__(self, index, registers, instructions, blocks, measurements):
+        self.index = index
+        self.registers = registers
+        self.instructions = instructions
+        self.blocks = blocks
+        self.measurements = measurements
+
+
+def encodeLayers(circuit, encoder, errorCorrector, gates, numRounds = 1):
+    """
+    Converts a logical circuit into an equivalent fault tolerant circuit, as the :class:`FaultTolerance` pass does, yielding the fault tolerant circuit one layer at a time.
+
+    The layers of the logical circuit are those of :meth:`DAGCircuit.multigraph_layers`, so every operation of a layer acts on different logical qubits.
+    The fault tolerant implementation of each layer is built in a :class:`QuantumCircuit` which is cleared once the layer has been yielded, so only the registers of the fault tolerant circuit and a single layer of instructions are held in memory. With ancillas reused through the :class:`AncillaPool` of the working circuit and syndrome registers reused through the ``ringSize`` option of :class:`SyndromeDetector`, the number of registers stays bounded as well.
+    Joining the instructions of every layer on the registers of every layer gives the same circuit as the :class:`FaultTolerance` pass, up to the order of operations on different qubits.
+
+    Parameters
+    ----------
+    circuit : QuantumCircuit, DAGCircuit
+        The logical computation to make fault tolerant.
+    encoder : Encoder, FaultTolerantEncoder
+        An object implementing the encoding of the :math:`|0\\rangle` state.
+    errorCorrector : ErrorCorrector
+        An object implementing error correction. If ``None``, no error correction is added.
+    gates : FaultTolerantGates
+        An object implementing the fault tolerant gates.
+    numRounds : int, Optional
+        The number of rounds of error correction to perform after each gate.
+
+    Yields
+    ------
+    EncodedLayer
+        The layers of the fault tolerant circuit, in order.
+
+    Examples
+    --------
+    >>> for layer in encodeLayers(circuit, SteaneEncoder(), SteaneErrorCorrector(ringSize=1), SteaneFaultTolerantGates()):
+    ...     print(layer.index, len(layer.instructions))
+    """
+    faultTolerance = FaultTolerance(encoder, errorCorrector, gates, numRounds)
+    dag = faultTolerance._unroll(circuit_to_dag(circuit) if isinstance(circuit, QuantumCircuit) else circuit)
+
+    ftCircuit = QuantumCircuit(name = dag.name, global_phase = dag.global_phase, metadata = dag.metadata)
+    numQregs = 0
+    numCregs = 0
+    numLayers = 0
+
+    def layer(blocks, measurements):
+        nonlocal numQregs, numCregs, numLayers
+        registers = ftCircuit.qregs[numQregs:] + ftCircuit.cregs[numCregs:]
+        numQregs = len(ftCircuit.qregs)
+        numCregs = len(ftCircuit.cregs)
+        numLayers += 1
+
+        instructions = list(ftCircuit.data)
+        ftCircuit.clear()
+        return EncodedLayer(numLayers-1, registers, instructions, blocks, measurements)
+
+    blocks = dict(zip(dag.qubits, _makeQregsCircuit(ftCircuit, dag.num_qubits(), faultTolerance._blockSize())))
+    encoder.getEncoderCircuit(ftCircuit, list(blocks.values()))
+    yield layer(blocks, {})
+
+    for nodes in dag.multigraph_layers():
+        operations = [node for node in nodes if isinstance(node, DAGOpNode)]
+        if not operations:
+            continue
+
+        layerBlocks = {}
+        measurements = {}
+        for node in operations:
+            layerBlocks.update((qubit, blocks[qubit]) for qubit in node.qargs)
+            faultTolerance._addOperationCircuit(ftCircuit, node.op, [blocks[qubit] for qubit in node.qargs], node.cargs, measurements)
+        yield layer(layerBlocks, measurements)
@@ -0,0 +1,240 @@
+"""
+The Sweep module estimates logical error rates of the Steane code over a grid of physical error rates, numbers of code blocks and numbers of error correction rounds.
+The shots of every point are split into batches which are sampled with :class:`PauliFrameSampler` over a ``multiprocessing`` pool, and each finished batch is appended to a checkpoint file so that an interrupted sweep can be resumed.
+"""
+
+import functools
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import statistics
+
+import numpy as np
+from qiskit.circuit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+from PauliFrame import PauliFrameSampler, PauliNoise
+
+
+def memoryCircuit(numBlocks, numRounds):
+    """
+    Creates a circuit which encodes ``numBlocks`` Steane code blocks to the logical :math:`|0\\rangle` state, applies ``numRounds`` rounds of error correction and measures every block transversally.
+
+    Parameters
+    ----------
+    numBlocks : int
+        The number of code blocks.
+    numRounds : int
+        The number of rounds of error correction.
+
+    Returns
+    -------
+    (QuantumCircuit, list(ClassicalRegister))
+        The circuit, and the register holding the transversal measurement of each block.
+    """
+    import Steane
+
+    qregs = [QuantumRegister(7, "q"+str(i)) for i in range(numBlocks)]
+    circuit = QuantumCircuit(*qregs)
+
+    Steane.SteaneEncoder().getEncoderCircuit(circuit, qregs)
+    errorCorrector = Steane.SteaneErrorCorrector()
+    for i in range(numRounds):
+        errorCorrector.errorCorrectCircuit(circuit, qregs)
+
+    dataRegisters = [ClassicalRegister(7, "logical"+str(i)) for i in range(numBlocks)]
+    for qreg, creg in zip(qregs, dataRegisters):
+        circuit.add_register(creg)
+        circuit.measure(qreg, creg)
+
+    return circuit, dataRegisters
+
+
+def defaultNoise(errorRate):
+    """
+    The noise model used by :func:`sweep` unless another is given: every gate, measurement and reset fails with probability ``errorRate``, and idle qubits do not fail.
+
+    Parameters
+    ----------
+    errorRate : float
+        The physical error rate.
+
+    Returns
+    -------
+    PauliNoise
+        The noise model.
+    """
+    return PauliNoise(gate=errorRate, measure=errorRate, reset=errorRate)
+
+
+def wilsonInterval(errors, shots, confidence = 0.95):
+    """
+    Computes the Wilson score interval for a binomial proportion.
+
+    Parameters
+    ----------
+    errors : int
+        The number of shots with a logical error.
+    shots : int
+        The total number of shots.
+    confidence : float, Optional
+        The confidence level of the interval.
+
+    Returns
+    -------
+    (float, float)
+        The lower and upper bounds of the interval.
+    """
+    if shots == 0:
+        return 0.0, 1.0
+
+    z = statistics.NormalDist().inv_cdf((1+confidence)/2)
+    rate = errors/shots
+    denominator = 1 + z**2/shots
+    centre = (rate + z**2/(2*shots))/denominator
+    halfWidth = z*math.sqrt(rate*(1-rate)/shots + z**2/(4*shots**2))/denominator
+    return max(0.0, centre-halfWidth), min(1.0, centre+halfWidth)
+
+
+@functools.lru_cache(maxsize=None)
+def _sampler(build, noise, errorRate, numBlocks, numRounds):
+    circuit, dataRegisters = build(numBlocks, numRounds)
+    return PauliFrameSampler(circuit, noise(errorRate), seed=0), dataRegisters
+
+def _runBatch(task):
+    build, noise, seed, point, batch, shots = task
+    sampler, dataRegisters = _sampler(build, noise, *point)
+    sampler.reseed(np.random.SeedSequence([seed, batch, *repr(point).encode()]))
+    errors = int(sampler.logicalErrors(shots, dataRegisters).any(axis=1).sum())
+    return point, batch, shots, errors
+
+
+def _describe(function):
+    """
+    Returns a name for ``function`` which is the same in every run, so that the batches of a checkpoint can be matched to the functions they were sampled with.
+    """
+    if isinstance(function, functools.partial):
+        return "%s(%s)" % (_describe(function.func), ", ".join([repr(arg) for arg in function.args] + [key + "=" + repr(value) for key, value in sorted(function.keywords.items())]))
+    return getattr(function, "__module__", "") + "." + getattr(function, "__qualname__", type(function).__qualname__)
+
+def _configuration(build, noise, seed, batchSize):
+    return {"build": _describe(build), "noise": _describe(noise), "seed": seed, "batchSize": batchSize}
+
+def _readCheckpoint(checkpoint, configuration, shots):
+    """
+    Reads the batches recorded in a checkpoint file, keeping only those sampled with the given configuration and holding the number of shots expected of their batch.
+    """
+    done = {}
+    if checkpoint == None or not os.path.exists(checkpoint):
+        return done
+
+    with open(checkpoint) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be incomplete if the sweep was interrupted while writing it.
+                continue
+            if any(entry.get(key) != value for key, value in configuration.items()):
+                continue
+            batch = entry["batch"]
+            if batch < 0 or entry["shots"] != min(configuration["batchSize"], shots-batch*configuration["batchSize"]):
+                continue
+            point = (entry["errorRate"], entry["numBlocks"], entry["numRounds"])
+            done[(point, batch)] = (entry["shots"], entry["errors"])
+    return done
+
+
+def sweep(errorRates, numBlocks, numRounds, shots, batchSize = 10**5, checkpoint = None, processes = None, seed = 0, confidence = 0.95, build = memoryCircuit, noise = defaultNoise):
+    """
+    Estimates the logical error rate at every point of a grid of physical error rates, numbers of code blocks and numbers of error correction rounds.
+
+    The circuit of each configuration is built once in every worker process, and the shots of each point are split into batches of at most ``batchSize`` shots, which are spread over a ``multiprocessing`` pool.
+    Each batch has its own seed, derived from ``seed``, its point and its index, so the results do not depend on the number of processes or on how often the sweep was interrupted.
+
+    Parameters
+    ----------
+    errorRates : list(float)
+        The physical error rates.
+    numBlocks : list(int)
+        The numbers of code blocks.
+    numRounds : list(int)
+        The numbers of rounds of error correction.
+    shots : int
+        The number of shots for every point.
+    batchSize : int, Optional
+        The largest number of shots sampled by a single task.
+    checkpoint : str, Optional
+        The path of a file to which every finished batch is appended, as a line of JSON. If the file already exists, the batches recorded in it are not sampled again, provided they were sampled with the same ``batchSize``, ``seed``, ``build`` and ``noise``, which are identified by their module and qualified name. Batches recorded with any other settings are ignored.
+    processes : int, Optional
+        The number of worker processes. By default, the number of CPUs. If ``processes == 1``, the batches are sampled in the current process.
+    seed : int, Optional
+        The seed from which the seed of every batch is derived.
+    confidence : float, Optional
+        The confidence level of the intervals.
+    build : function, Optional
+        A function taking a number of code blocks and a number of rounds and returning a circuit and the registers holding the transversal measurement of each block, as :func:`memoryCircuit` does. It must be picklable if ``processes != 1``.
+    noise : function, Optional
+        A function taking a physical error rate and returning a :class:`PauliNoise`. By default, :func:`defaultNoise`. It must be picklable if ``processes != 1``.
+
+    Returns
+    -------
+    list(dict)
+        One row per point, in the order of the grid, giving the point (``"errorRate"``, ``"numBlocks"``, ``"numRounds"``), the number of shots (``"shots"``) and of shots with a logical error (``"errors"``), the logical error rate (``"logicalErrorRate"``) and the bounds of its Wilson score interval (``"lower"`` and ``"upper"``).
+    """
+    points = [(float(errorRate), int(blocks), int(rounds)) for errorRate, blocks, rounds in itertools.product(errorRates, numBlocks, numRounds)]
+    configuration = _configuration(build, noise, seed, batchSize)
+    done = _readCheckpoint(checkpoint, configuration, shots)
+
+    tasks = []
+    for point in points:
+        for batch, start in enumerate(range(0, shots, batchSize)):
+            if (point, batch) not in done:
+                tasks.append((build, noise, seed, point, batch, min(batchSize, shots-start)))
+
+    file = None
+    if checkpoint != None:
+        file = open(checkpoint, "a+")
+        if file.tell() > 0:
+            file.seek(file.tell()-1)
+            if file.read(1) != "\n":
+                file.write("\n")
+    try:
+        def record(result):
+            point, batch, batchShots, errors = result
+            done[(point, batch)] = (batchShots, errors)
+            if file != None:
+                file.write(json.dumps({"errorRate": point[0], "numBlocks": point[1], "numRounds": point[2], "batch": batch, "shots": batchShots, "errors": errors, **configuration}) + "\n")
+                file.flush()
+
+        if processes == 1:
+            for task in tasks:
+                record(_runBatch(task))
+        elif tasks:
+            with multiprocessing.Pool(processes) as pool:
+                for result in pool.imap_unordered(_runBatch, tasks):
+                    record(result)
+    finally:
+        if file != None:
+            file.close()
+
+    rows = []
+    for point in points:
+        batches = [done[(point, batch)] for batch in range(len(range(0, shots, batchSize)))]
+        pointShots = sum(batchShots for batchShots, errors in batches)
+        pointErrors = sum(errors for batchShots, errors in batches)
+        lower, upper = wilsonInterval(pointErrors, pointShots, confidence)
+        rows.append({
+            "errorRate": point[0],
+            "numBlocks": point[1],
+            "numRounds": point[2],
+            "shots": pointShots,
+            "errors": pointErrors,
+            "logicalErrorRate": pointErrors/pointShots if pointShots else 0.0,
+            "lower": lower,
+            "upper": upper
+        })
+    return rows
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from qiskit.circuit import QuantumCircuit, QuantumRegister, ClassicalRegister
+from qiskit.converters import circuit_to_dag
+
+import Steane
+from BaseFaultTolerance import ancillaPool
+from StabilizerSimulator import StabilizerSimulator
+
+
+def _correctedBlocks(numBlocks, numRounds, enabled):
+    qregs = [QuantumRegister(7, "q" + str(i)) for i in range(numBlocks)]
+    circuit = QuantumCircuit(*qregs)
+    ancillaPool(circuit).enabled = enabled
+    errorCorrector = Steane.SteaneErrorCorrector()
+    for i in range(numRounds):
+        for qreg in qregs:
+            errorCorrector.errorCorrectCircuit(circuit, [qreg])
+    return circuit
+
+
+@pytest.mark.parametrize("numRounds", [1, 3])
+def test_poolKeepsIndependentBlocksParallel(numRounds):
+    pooled = _correctedBlocks(10, numRounds, True)
+    unpooled = _correctedBlocks(10, numRounds, False)
+    assert pooled.depth() == unpooled.depth()
+    assert pooled.num_qubits == 10*7 + 10*6
+
+
+def test_poolReusesAncillasOfTheSameBlock():
+    q = QuantumRegister(7, "q")
+    circuit = QuantumCircuit(q)
+    errorCorrector = Steane.SteaneErrorCorrector()
+    for i in range(5):
+        errorCorrector.errorCorrectCircuit(circuit, [q])
+    assert circuit.num_qubits == 7 + 6
+    assert len(ancillaPool(circuit)) == 1
+
+
+def test_ringSizeMustBePositive():
+    with pytest.raises(ValueError, match="ringSize"):
+        Steane.SteaneErrorCorrector(ringSize=0)
+
+
+def _ringCircuit(numRounds, ringSize, keepRounds = (), error = None):
+    q = QuantumRegister(7, "q")
+    circuit = QuantumCircuit(q)
+    Steane.SteaneEncoder().getEncoderCircuit(circuit, [q])
+    errorCorrector = Steane.SteaneErrorCorrector(ringSize, keepRounds)
+    for i in range(numRounds):
+        if error != None and i == error[0]:
+            circuit.x(q[error[1]])
+        errorCorrector.errorCorrectCircuit(circuit, [q])
+    return circuit
+
+
+@pytest.mark.parametrize("ringSize", [1, 2, 3])
+def test_ringReusesSyndromeRegisters(ringSize):
+    circuit = _ringCircuit(6, ringSize)
+    assert len(circuit.cregs) == ringSize
+    assert circuit.num_clbits == ringSize*6
+
+
+def test_keptRoundsAreNotReused():
+    circuit = _ringCircuit(6, 1, keepRounds=[0, 4])
+    assert len(circuit.cregs) == 3
+    measured = [[circuit.find_bit(clbit).registers[0][0] for clbit in instruction.clbits] for instruction in circuit.data if instruction.operation.name == "measure"]
+    firstRound, fifthRound = circuit.cregs[0], circuit.cregs[2]
+    assert sum(firstRound in registers for registers in measured) == 6
+    assert sum(fifthRound in registers for registers in measured) == 6
+
+
+def test_ringOnDagMatchesCircuit():
+    q = QuantumRegister(7, "q")
+    dag = circuit_to_dag(QuantumCircuit(q))
+    errorCorrector = Steane.SteaneErrorCorrector(2)
+    for i in range(5):
+        errorCorrector.errorCorrectDag(dag, [q])
+    assert len(dag.cregs) == 2
+    assert dag.num_clbits() == 2*6
+
+
+@pytest.mark.parametrize("error", [(0, 0), (2, 3), (4, 6)])
+def test_ringStillCorrectsErrors(error):
+    circuit = _ringCircuit(5, 1, error=error)
+    data = ClassicalRegister(7, "data")
+    circuit.add_register(data)
+    circuit.measure(circuit.qregs[0], data)
+
+    bits = StabilizerSimulator(0).sample(circuit, shots=200)[:, -7:]
+    # Measuring the encoded |0> gives a codeword of the Steane code of even weight, so every check and the parity vanish once the error is corrected.
+    assert not (bits @ np.array(Steane._CHECKS).T % 2).any()
+    assert not (bits.sum(axis=1) % 2).any()
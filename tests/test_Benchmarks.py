@@ -0,0 +1,10 @@
+import pytest
+
+import Steane
+import Benchmarks
+
+
+@pytest.mark.benchmark
+def test_startupWithinBudget():
+    results = Benchmarks.benchmarkStartup(repeats = 200)
+    assert results["overBudget"] == [], results
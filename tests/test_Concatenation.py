@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit import CircuitInstruction
+from qiskit.circuit.library import XGate, ZGate
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+
+import Steane
+from BaseFaultTolerance import FaultTolerance
+from Concatenation import concatenatedSteaneCode, flatten, PHYSICAL_OPERATIONS
+from StabilizerSimulator import StabilizerSimulator
+
+
+CHECKS = np.array(Steane._CHECKS)
+
+
+def _logicalCircuit():
+    circuit = QuantumCircuit(3, 3)
+    circuit.x(0)
+    circuit.cx(0, 1)
+    circuit.h(2)
+    circuit.s(2)
+    circuit.s(2)
+    circuit.h(2)
+    circuit.measure([0, 1, 2], [0, 1, 2])
+    return circuit
+
+# X on block 0, copied onto block 1, and HZH = X on block 2.
+EXPECTED = [1, 1, 1]
+
+
+def _decode(bits):
+    # Decodes the measured qubits of a block level by level: each group of 7 bits is corrected for a single bit flip with the Steane parity checks, and its parity is its logical value one level up.
+    while bits.shape[1] > 1:
+        groups = bits.reshape(len(bits), -1, 7)
+        syndromes = np.einsum("sgq,cq->sgc", groups, CHECKS) % 2
+        bits = (groups.sum(axis=2) + syndromes.any(axis=2)) % 2
+    return bits[:, 0]
+
+
+def _run(level, errors = (), correct = True):
+    code = concatenatedSteaneCode(level)
+    circuit = _logicalCircuit()
+    faultTolerance = FaultTolerance(code.encoder(), code.errorCorrector(), code.faultTolerantGates())
+    ftCircuit = dag_to_circuit(faultTolerance.run(circuit_to_dag(circuit)))
+    blocks = faultTolerance.property_set["blockLayout"]
+
+    # Each error is injected on a physical qubit of a block just before a given round of error correction of that block.
+    positions = []
+    for block, correction, qubit, gate in errors:
+        register = blocks[circuit.qubits[block]]
+        rounds = [i for i, instruction in enumerate(ftCircuit.data) if instruction.operation.name.startswith("detector") and register[0] in instruction.qubits]
+        positions.append((rounds[correction], CircuitInstruction(gate(), [register[qubit]])))
+    for index, instruction in sorted(positions, key=lambda position: position[0], reverse=True):
+        ftCircuit.data.insert(index, instruction)
+    if not correct:
+        ftCircuit.data = [instruction for instruction in ftCircuit.data if not instruction.operation.name.startswith(("detector", "corrector"))]
+
+    flat = flatten(ftCircuit)
+    assert {instruction.operation.name for instruction in flat.data} <= PHYSICAL_OPERATIONS
+    bits = StabilizerSimulator(0).sample(flat, shots=50)
+    measurements = faultTolerance.property_set["logicalMeasurements"]
+    return [_decode(bits[:, [flat.find_bit(clbit).index for clbit in measurements[circuit.clbits[i]]]]) for i in range(3)], measurements
+
+
+@pytest.mark.parametrize("level", [1, 2])
+def test_logicalRoundTrip(level):
+    outcomes, measurements = _run(level)
+    assert all(register.size == 7**level for register in measurements.values())
+    assert [set(outcome) for outcome in outcomes] == [{value} for value in EXPECTED]
+
+
+# Errors as (block, round, qubit, gate). Two errors in the same level 1 block in one round are a logical error of that block, which only the level 2 correction undoes. Without error correction, the errors of each case would be too many for the readout to decode.
+ERRORS = [
+    [(0, 0, 0, XGate), (0, 0, 1, XGate), (0, 1, 7, XGate), (0, 1, 8, XGate)],
+    # Block 2 is measured after H S S H, so Z errors before the last H become X errors.
+    [(2, 0, 0, ZGate), (2, 0, 1, ZGate), (2, 2, 7, ZGate), (2, 2, 8, ZGate)],
+    # Single errors in different level 1 blocks are corrected at level 1 in the same round.
+    [(0, 0, 3, XGate), (0, 0, 10, XGate), (0, 1, 4, XGate), (0, 1, 11, XGate)]
+]
+
+
+@pytest.mark.parametrize("errors", ERRORS)
+def test_levelTwoCorrectsErrors(errors):
+    outcomes, measurements = _run(2, errors)
+    assert [set(outcome) for outcome in outcomes] == [{value} for value in EXPECTED]
+
+
+def test_errorsAreUncorrectableWithoutErrorCorrection():
+    for errors in ERRORS:
+        outcomes, measurements = _run(2, errors, correct=False)
+        assert [set(outcome) for outcome in outcomes] != [{value} for value in EXPECTED]
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from qiskit.circuit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+import Steane
+from BaseFaultTolerance import SyndromeCorrector
+from CSSCode import reedMullerCode
+from Decoding import SyndromeDecoder, SyndromeTable
+
+
+@pytest.mark.parametrize("corrector", [Steane.SteaneSyndromeCorrector(), reedMullerCode(5).syndromeCorrector()], ids=["steane", "reedMuller5"])
+def test_singleBitFlipsAreDecoded(corrector):
+    decoder = SyndromeDecoder(corrector)
+    numQubits = corrector._correctorCircuit.num_qubits
+    flips = np.eye(numQubits, dtype=np.uint8)
+    assert not decoder.decode(flips).any()
+    assert decoder.decode(flips ^ 1).all()
+
+
+def test_tableOnlyHoldsCorrectedSyndromes():
+    table = SyndromeTable(reedMullerCode(5).syndromeCorrector())
+    assert table.numBits == 30
+    assert len(table.values) <= 2*table.numQubits + table.numQubits**2
+    x, z = table.lookup(np.array([0, 2**30-1]))
+    assert x.shape == (2, 31) and not x[0].any() and not z[0].any()
+
+
+def test_tooManySyndromeBits():
+    q = QuantumRegister(1)
+    c = ClassicalRegister(64)
+    circuit = QuantumCircuit(q, c)
+    circuit.x(q[0]).c_if(c, 1)
+    with pytest.raises(ValueError, match="63 bits"):
+        SyndromeTable(SyndromeCorrector(circuit))
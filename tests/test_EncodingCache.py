@@ -0,0 +1,62 @@
+import hashlib
+import time
+
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.circuit import AncillaRegister
+
+import Steane
+from EncodingCache import EncodingCache, _update
+
+
+def _components():
+    return Steane.SteaneFaultTolerantEncoder(2), Steane.SteaneErrorCorrector(), Steane.SteaneFaultTolerantGates()
+
+
+def _logicalCircuit(numGates = 4):
+    circuit = QuantumCircuit(2, 2)
+    for i in range(numGates):
+        circuit.h(i % 2)
+        circuit.cx(i % 2, 1 - i % 2)
+    circuit.measure([0, 1], [0, 1])
+    return circuit
+
+
+def test_hitMatchesMiss(tmp_path):
+    cache = EncodingCache(str(tmp_path))
+    circuit = _logicalCircuit()
+    missCircuit, missBlocks, missMeasurements = cache.encode(circuit, *_components())
+    hitCircuit, hitBlocks, hitMeasurements = cache.encode(circuit, *_components())
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert hitCircuit == missCircuit
+    assert [type(register) for register in hitCircuit.qregs] == [type(register) for register in missCircuit.qregs]
+    assert any(isinstance(register, AncillaRegister) for register in hitCircuit.qregs)
+    assert {qubit: register.name for qubit, register in hitBlocks.items()} == {qubit: register.name for qubit, register in missBlocks.items()}
+    assert {clbit: register.name for clbit, register in hitMeasurements.items()} == {clbit: register.name for clbit, register in missMeasurements.items()}
+    assert all(register in hitCircuit.qregs for register in hitBlocks.values())
+
+
+def test_unhashableConfigurationRaises(tmp_path):
+    class Component:
+        def __init__(self):
+            self.options = {"callback": object()}
+
+    with pytest.raises(TypeError):
+        EncodingCache(str(tmp_path)).key(_logicalCircuit(), Component())
+    with pytest.raises(TypeError):
+        _update(hashlib.sha256(), [object()])
+
+
+@pytest.mark.benchmark
+def test_hitFasterThanMiss(tmp_path):
+    cache = EncodingCache(str(tmp_path))
+    circuit = _logicalCircuit(100)
+    start = time.perf_counter()
+    cache.encode(circuit, *_components())
+    miss = time.perf_counter() - start
+    start = time.perf_counter()
+    cache.encode(circuit, *_components())
+    hit = time.perf_counter() - start
+    assert cache.hits == 1
+    assert hit < miss / 2, (hit, miss)
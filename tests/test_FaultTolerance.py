@@ -0,0 +1,76 @@
+import random
+import time
+
+import pytest
+from qiskit.circuit import QuantumCircuit
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.dagcircuit import DAGCircuit
+from qiskit.quantum_info import Operator
+from qiskit.transpiler import PassManager
+from qiskit.transpiler.exceptions import TranspilerError
+
+from BaseFaultTolerance import FaultTolerance
+from Steane import SteaneEncoder, SteaneErrorCorrector, SteaneFaultTolerantGates
+
+
+def _logicalCircuit(numGates, numQubits, seed = 0):
+    rng = random.Random(seed)
+    circuit = QuantumCircuit(numQubits)
+    for i in range(numGates):
+        gate = rng.choice(["h", "x", "s", "cx"])
+        if gate == "cx":
+            circuit.cx(*rng.sample(range(numQubits), 2))
+        else:
+            getattr(circuit, gate)(rng.randrange(numQubits))
+    return circuit
+
+def _faultTolerance(errorCorrector = None):
+    return FaultTolerance(SteaneEncoder(), SteaneErrorCorrector() if errorCorrector == None else errorCorrector, SteaneFaultTolerantGates())
+
+
+def test_syndromeRegistersAddedWithoutAddCreg(monkeypatch):
+    # Templates are converted to DAGs on their first use, which is not counted. DAGCircuit.add_creg takes time proportional to the number of clbits already in the DAG, so calling it for every syndrome register makes the pass quadratic.
+    _faultTolerance().run(circuit_to_dag(_logicalCircuit(10, 2)))
+    calls = []
+    original = DAGCircuit.add_creg
+    monkeypatch.setattr(DAGCircuit, "add_creg", lambda dag, creg: calls.append(creg) or original(dag, creg))
+    out = _faultTolerance().run(circuit_to_dag(_logicalCircuit(50, 4)))
+    assert len(out.cregs) >= 50
+    assert calls == []
+
+
+def test_registersOfOutputAreConsistent():
+    out = _faultTolerance().run(circuit_to_dag(_logicalCircuit(20, 3)))
+    clbits = [clbit for creg in out.cregs.values() for clbit in creg]
+    assert len(clbits) == len(set(clbits)) == out.num_clbits()
+    for creg in out.cregs.values():
+        for j, clbit in enumerate(creg):
+            assert (creg, j) in out.find_bit(clbit).registers
+
+
+@pytest.mark.parametrize("gate", ["z", "sdg", "y", "sx", "id"])
+def test_cliffordsWithoutTemplatesAreRewritten(gate):
+    circuit = QuantumCircuit(1)
+    circuit.h(0)
+    getattr(circuit, gate)(0)
+    unrolled = _faultTolerance()._unroll(circuit_to_dag(circuit))
+    assert set(unrolled.count_ops()) <= {"h", "x", "s"}
+    assert Operator(dag_to_circuit(unrolled)) == Operator(circuit)
+
+
+def test_unsupportedGateIsNamed():
+    circuit = QuantumCircuit(1)
+    circuit.t(0)
+    with pytest.raises(TranspilerError, match="gate t"):
+        PassManager(_faultTolerance()).run(circuit)
+
+
+@pytest.mark.benchmark
+def test_runScalesLinearly():
+    times = []
+    for numGates in (1000, 4000):
+        dag = circuit_to_dag(_logicalCircuit(numGates, 20))
+        start = time.perf_counter()
+        _faultTolerance().run(dag)
+        times.append(time.perf_counter()-start)
+    assert times[1] < 6*times[0]
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.quantum_info import Operator
+
+import Steane
+from LogicalOptimization import LogicalOptimization
+
+
+def _randomCircuit(seed, numQubits = 3, numGates = 40):
+    rng = random.Random(seed)
+    circuit = QuantumCircuit(numQubits)
+    for i in range(numGates):
+        # Long runs of single-qubit gates and repeated CNOTs give the pass something to simplify, and the other gates and barriers are left in place.
+        name = rng.choice(["h", "x", "y", "z", "s", "sdg", "h", "s", "cx", "cx", "cz", "t", "barrier"])
+        if name in ("cx", "cz"):
+            qubits = rng.sample(range(numQubits), 2)
+            for repeat in range(rng.choice([1, 2])):
+                getattr(circuit, name)(*qubits)
+        elif name == "barrier":
+            circuit.barrier(rng.sample(range(numQubits), rng.randint(1, numQubits)))
+        else:
+            getattr(circuit, name)(rng.randrange(numQubits))
+    return circuit
+
+
+@pytest.mark.parametrize("gates", [None, Steane.SteaneFaultTolerantGates()], ids=["default", "steane"])
+@pytest.mark.parametrize("seed", range(25))
+def test_optimizedCircuitIsEquivalent(seed, gates):
+    circuit = _randomCircuit(seed)
+    optimization = LogicalOptimization(gates, Steane.SteaneErrorCorrector())
+    optimized = dag_to_circuit(optimization.run(circuit_to_dag(circuit)))
+
+    # The global phase dropped from merged runs is added to the circuit, so the operators are equal and not only equivalent.
+    assert Operator(optimized) == Operator(circuit)
+    assert optimization.property_set["logicalGatesRemoved"] == len(circuit.data) - len(optimized.data)
+    assert optimization.property_set["logicalGatesRemoved"] >= 0
+    if gates != None:
+        assert optimization.property_set["encodedOperationsSaved"] >= 0
+        # Runs are only rewritten with the gates the code implements, and runs with nothing shorter are kept as they are.
+        names = {instruction.operation.name for instruction in circuit.data}
+        assert {instruction.operation.name for instruction in optimized.data} <= names | set(gates._byName)
+
+
+def test_cancelsAcrossCnotPairs():
+    circuit = QuantumCircuit(2)
+    circuit.h(0)
+    circuit.cx(0, 1)
+    circuit.cx(0, 1)
+    circuit.h(0)
+    optimized = LogicalOptimization().run(circuit_to_dag(circuit))
+    assert optimized.size() == 0
+
+
+def test_conditionalGatesAreKept():
+    circuit = QuantumCircuit(1, 1)
+    circuit.h(0)
+    circuit.measure(0, 0)
+    circuit.x(0).c_if(circuit.clbits[0], 1)
+    circuit.x(0).c_if(circuit.clbits[0], 1)
+    optimized = dag_to_circuit(LogicalOptimization().run(circuit_to_dag(circuit)))
+    assert [instruction.operation.name for instruction in optimized.data] == ["h", "measure", "x", "x"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from qiskit.circuit import QuantumCircuit, QuantumRegister, ClassicalRegister
+
+import Steane
+from PauliFrame import PauliFrameSampler, PauliNoise
+from Sweep import memoryCircuit
+
+
+def _remeasuredCondition():
+    # The condition on c is applied when c holds the first measurement of q0 and q1, and c is measured again afterwards, so its final value in the reference shot differs from the value the condition reads.
+    q = QuantumRegister(4, "q")
+    c = ClassicalRegister(2, "c")
+    copy = ClassicalRegister(2, "copy")
+    flag = ClassicalRegister(1, "flag")
+    circuit = QuantumCircuit(q, c, copy, flag)
+    circuit.h(q[0])
+    circuit.h(q[1])
+    circuit.measure(q[0], c[0])
+    circuit.measure(q[1], c[1])
+    circuit.measure(q[0], copy[0])
+    circuit.measure(q[1], copy[1])
+    circuit.x(q[2]).c_if(c, 3)
+    circuit.measure(q[2], flag[0])
+    circuit.h(q[0])
+    circuit.h(q[1])
+    circuit.measure(q[0], c[0])
+    circuit.measure(q[1], c[1])
+    # A qubit idle from the start, measured into c later in the circuit, must not be measured before the condition is read.
+    circuit.x(q[3])
+    circuit.measure(q[3], c[0])
+    return circuit
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_conditionOnRemeasuredRegister(seed):
+    bits = PauliFrameSampler(_remeasuredCondition(), seed=seed).sample(4000)
+    assert np.array_equal(bits[:, 2] & bits[:, 3], bits[:, 4])
+    assert (bits[:, 0] == 1).all()
+    assert 0.2 < bits[:, 4].mean() < 0.3
+
+
+def test_noiselessMemoryHasNoLogicalErrors():
+    circuit, dataRegisters = memoryCircuit(2, 2)
+    sampler = PauliFrameSampler(circuit, seed=1)
+    assert not sampler.logicalErrors(1000, dataRegisters).any()
+
+
+def test_correctionOfNonZeroReferenceSyndrome():
+    # The reference shot itself has an X error on a data qubit, so its syndrome is not zero and the correction is conditioned on a non-zero value.
+    q = QuantumRegister(7, "q")
+    circuit = QuantumCircuit(q)
+    Steane.SteaneEncoder().getEncoderCircuit(circuit, [q])
+    circuit.x(q[3])
+    Steane.SteaneErrorCorrector().errorCorrectCircuit(circuit, [q])
+    logical = ClassicalRegister(7, "logical")
+    circuit.add_register(logical)
+    circuit.measure(q, logical)
+    sampler = PauliFrameSampler(circuit, PauliNoise(), seed=2)
+    assert not sampler.logicalErrors(500, [logical]).any()
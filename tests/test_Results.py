@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from qiskit import BasicAer, QuantumCircuit, QuantumRegister, ClassicalRegister
+
+from Results import PackedShots
+
+
+SIZES = [3, 8, 9, 1, 17]
+
+
+def _registers():
+    return [ClassicalRegister(size, "c" + str(i)) for i, size in enumerate(SIZES)]
+
+
+def _bits(numShots = 50, seed = 0):
+    return np.random.default_rng(seed).integers(0, 2, size=(numShots, sum(SIZES)), dtype=np.uint8)
+
+
+def _memory(bits):
+    # Qiskit memory lists the registers from last to first, each from its last bit to its first, separated by spaces.
+    starts = np.cumsum([0] + SIZES)
+    return [" ".join("".join(str(bit) for bit in row[starts[i]:starts[i+1]][::-1]) for i in reversed(range(len(SIZES)))) for row in bits]
+
+
+def _assertRegistersMatch(shots, bits):
+    start = 0
+    for register in _registers():
+        expected = bits[:, start:start+register.size]
+        assert (shots.registerBits(register) == expected).all()
+        assert (shots.registerBits(register.name) == expected).all()
+        assert (shots.registerValues(register) == expected.astype(np.int64) @ (1 << np.arange(register.size))).all()
+        start += register.size
+
+
+def test_bitsRoundTrip():
+    bits = _bits()
+    shots = PackedShots.fromBits(bits, _registers())
+    assert shots.packed.shape == (len(bits), sum((size+7)//8 for size in SIZES))
+    _assertRegistersMatch(shots, bits)
+
+
+def test_memoryMatchesBits():
+    bits = _bits()
+    fromMemory = PackedShots.fromMemory(_memory(bits), _registers(), batchSize=7)
+    assert (fromMemory.packed == PackedShots.fromBits(bits, _registers()).packed).all()
+    _assertRegistersMatch(fromMemory, bits)
+
+
+def test_memoryFromQiskit():
+    q = QuantumRegister(5)
+    first = ClassicalRegister(2, "first")
+    second = ClassicalRegister(3, "second")
+    circuit = QuantumCircuit(q, first, second)
+    circuit.x([0, 3, 4])
+    circuit.measure(q[:2], first)
+    circuit.measure(q[2:], second)
+    memory = BasicAer.get_backend("qasm_simulator").run(circuit, shots=5, memory=True).result().get_memory()
+
+    shots = PackedShots.fromMemory(memory, circuit)
+    assert (shots.registerValues(first) == 0b01).all()
+    assert (shots.registerValues(second) == 0b110).all()
+
+
+def test_fileRoundTrip(tmp_path):
+    filename = str(tmp_path / "shots.npy")
+    bits = _bits()
+    PackedShots.fromBits(bits, _registers(), filename)
+
+    shots = PackedShots.open(filename, _registers())
+    assert isinstance(shots.packed, np.memmap)
+    _assertRegistersMatch(shots, bits)
+    with pytest.raises(ValueError):
+        shots.packed[0, 0] = 1
+
+    edited = PackedShots.open(filename, _registers(), mode="r+")
+    edited.addBits(1 - bits[:10], 0)
+    edited.packed.flush()
+    bits[:10] = 1 - bits[:10]
+    _assertRegistersMatch(PackedShots.open(filename, _registers()), bits)
+
+
+def test_openChecksRegisters(tmp_path):
+    filename = str(tmp_path / "shots.npy")
+    PackedShots.fromBits(_bits(), _registers(), filename)
+    with pytest.raises(ValueError):
+        PackedShots.open(filename, _registers()[:-1])
+
+
+def test_widthIsChecked():
+    with pytest.raises(ValueError):
+        PackedShots.fromBits(_bits()[:, 1:], _registers())
+
+
+def test_valuesLimitedTo64Bits():
+    register = ClassicalRegister(65, "wide")
+    shots = PackedShots.fromBits(np.zeros((2, 65), dtype=np.uint8), [register])
+    with pytest.raises(ValueError):
+        shots.registerValues(register)
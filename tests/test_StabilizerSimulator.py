@@ -0,0 +1,59 @@
+import random
+
+import pytest
+from qiskit import BasicAer, QuantumCircuit, ClassicalRegister, transpile
+
+import Steane
+from StabilizerSimulator import StabilizerSimulator
+
+
+SHOTS = 1000
+
+
+def _randomCircuit(seed, numQubits = 4, numClbits = 3, numOperations = 30):
+    rng = random.Random(seed)
+    circuit = QuantumCircuit(numQubits)
+    creg = ClassicalRegister(numClbits, "c")
+    circuit.add_register(creg)
+    for i in range(numOperations):
+        kind = rng.choice(["h", "s", "sdg", "x", "y", "z", "cx", "cz", "swap", "measure", "reset", "conditional"])
+        if kind in ("cx", "cz", "swap"):
+            getattr(circuit, kind)(*rng.sample(range(numQubits), 2))
+        elif kind == "measure":
+            circuit.measure(rng.randrange(numQubits), rng.randrange(numClbits))
+        elif kind == "reset":
+            circuit.reset(rng.randrange(numQubits))
+        elif kind == "conditional":
+            gate = rng.choice(["x", "z", "h"])
+            getattr(circuit, gate)(rng.randrange(numQubits)).c_if(creg, rng.randrange(2**numClbits))
+        else:
+            getattr(circuit, kind)(rng.randrange(numQubits))
+    circuit.measure(range(numClbits), range(numClbits))
+    return circuit
+
+
+def _assertSameDistribution(circuit, seed):
+    backend = BasicAer.get_backend("qasm_simulator")
+    expected = backend.run(transpile(circuit, backend, optimization_level=0), shots=SHOTS, seed_simulator=seed).result().get_counts()
+    counts = StabilizerSimulator(seed).run(circuit, shots=SHOTS)
+
+    # Stabilizer outcomes are uniform over their support, so the supports must match exactly and the frequencies only up to sampling noise.
+    assert set(counts) == set(expected)
+    distance = sum(abs(counts.get(key, 0) - expected.get(key, 0)) for key in set(counts) | set(expected)) / (2*SHOTS)
+    assert distance < 0.15, (distance, counts, expected)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_randomCircuitsMatchBasicAer(seed):
+    _assertSameDistribution(_randomCircuit(seed), seed)
+
+
+@pytest.mark.parametrize("error", [None, 0, 3, 6])
+def test_faultTolerantEncoderMatchesBasicAer(error):
+    circuit = Steane.SteaneFaultTolerantEncoder(1).createEncoderCircuit(1)
+    if error != None:
+        circuit.x(error)
+    data = ClassicalRegister(7, "data")
+    circuit.add_register(data)
+    circuit.measure(range(7), data)
+    _assertSameDistribution(circuit, 0)
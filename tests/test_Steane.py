@@ -0,0 +1,85 @@
+import pytest
+from qiskit import QuantumCircuit
+from qiskit.quantum_info import Operator
+
+import Steane
+from BaseFaultTolerance import _gateName
+from Instrumentation import Instrumentation
+
+
+def _components():
+    return [
+        Steane.SteaneEncoder(),
+        Steane.SteaneFaultTolerantEncoder(2),
+        Steane.SteaneSyndromeDetector(),
+        Steane.SteaneSyndromeCorrector(),
+        Steane.SteaneErrorCorrector(),
+        Steane.SteaneFaultTolerantGates()
+    ]
+
+
+def test_componentsShareTemplates():
+    first = _components()
+    second = _components()
+    assert first[0]._encoderCircuit is second[0]._encoderCircuit
+    assert first[1]._checkerCircuit is second[1]._checkerCircuit
+    assert first[2]._detectorCircuit is second[2]._detectorCircuit
+    assert first[3]._correctorCircuit is second[3]._correctorCircuit
+    assert all(first[5]._byName[name][0] is second[5]._byName[name][0] for name in first[5]._byName)
+
+
+def test_constructionDoesNoWork():
+    _components()
+    misses = _gateName.cache_info().misses
+    with Instrumentation() as instrumentation:
+        _components()
+    assert dict(instrumentation.records) == {}
+    assert _gateName.cache_info().misses == misses
+
+
+def test_templatesConvertedToDagsOnce():
+    encoder = Steane.SteaneEncoder()
+    encoder.createEncoderDag(2)
+    with Instrumentation() as instrumentation:
+        Steane.SteaneEncoder().createEncoderDag(3)
+        Steane.SteaneEncoder().createEncoderDag(3)
+    assert not any(event == "circuitToDag" for component, operation, event in instrumentation.records)
+
+
+# The Steane syndrome corrector as it was written by hand, before it was generated from the parity checks: (gate, qubit, syndrome).
+HAND_WRITTEN = (
+    [("x", qubit, value) for qubit, value in enumerate([32, 16, 8, 24, 40, 48, 56])] +
+    [("z", qubit, value) for qubit, value in enumerate([4, 2, 1, 3, 5, 6, 7])] +
+    [("z", qubit, value) for qubit, value in enumerate([36, 18, 9, 27, 45, 54, 63])] +
+    [("x", qubit, value) for qubit, value in enumerate([36, 18, 9, 27, 45, 54, 63])]
+)
+
+
+def _generated():
+    corrector = Steane.SteaneSyndromeCorrector()._correctorCircuit
+    creg = corrector.cregs[0]
+    gates = []
+    for instruction in corrector.data:
+        register, value = instruction.operation.condition
+        assert register == creg
+        gates.append((instruction.operation.name, corrector.find_bit(instruction.qubits[0]).index, value))
+    return gates
+
+
+def _correction(gates, syndrome):
+    circuit = QuantumCircuit(7)
+    for name, qubit, value in gates:
+        if value == syndrome:
+            getattr(circuit, name)(qubit)
+    return circuit
+
+
+@pytest.mark.parametrize("syndrome", range(64))
+def test_generatedCorrectorMatchesHandWritten(syndrome):
+    expected = Operator(_correction(HAND_WRITTEN, syndrome))
+    actual = Operator(_correction(_generated(), syndrome))
+    assert actual.equiv(expected)
+
+
+def test_generatedCorrectorIsSmaller():
+    assert len(_generated()) == 21 < len(HAND_WRITTEN)